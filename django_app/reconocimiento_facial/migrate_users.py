@@ -4,9 +4,10 @@ Archivo: migrate_users.py
 Descripcion: Script de migracion para actualizar vectores faciales de
              usuarios existentes. Lee imagenes de perfil desde Firebase,
              genera nuevos vectores con InspireFace, y los actualiza
-             en la base de datos.
+             en la base de datos. Las imagenes se procesan en lotes con
+             get_face_embeddings_batch.
 Fecha de creacion: 30 de Octubre 2025
-Fecha de modificacion: 20 de Diciembre 2025
+Fecha de modificacion: 16 de Octubre 2026
 Autores:
     Roberto Leal
     William Tapia
@@ -30,6 +31,20 @@ django.setup()
 from usuarios.services.firebase_service import firebase_service
 from usuarios.services.inspireface_service import inspireface_service
 
+# Images per get_face_embeddings_batch call (spread over the session pool)
+BATCH_SIZE = 32
+
+
+def decode_profile_image(imagen_b64):
+    """Decodes a base64 (optionally data URL) profile image to a BGR array."""
+    # Clean base64 string if needed
+    if ',' in imagen_b64:
+        imagen_b64 = imagen_b64.split(',')[1]
+    img_bytes = base64.b64decode(imagen_b64)
+    nparr = np.frombuffer(img_bytes, np.uint8)
+    return cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+
+
 def migrate_users():
     print("🚀 Starting migration to InspireFace...")
     
@@ -40,48 +55,55 @@ def migrate_users():
     fail_count = 0
     skip_count = 0
     
-    for user in users:
-        rut = user.get('rut')
-        nombre = user.get('nombre')
-        imagen_b64 = user.get('imagen')
-        
-        print(f"\nProcessing {nombre} ({rut})...")
+    for start in range(0, len(users), BATCH_SIZE):
+        batch = []  # (user, decoded image)
         
-        if not imagen_b64:
-            print("  ⚠️ No profile image found. Skipping.")
-            skip_count += 1
-            continue
+        for user in users[start:start + BATCH_SIZE]:
+            rut = user.get('rut')
+            nombre = user.get('nombre')
+            imagen_b64 = user.get('imagen')
+            
+            print(f"\nProcessing {nombre} ({rut})...")
             
-        try:
-            # Clean base64 string if needed
-            if ',' in imagen_b64:
-                imagen_b64 = imagen_b64.split(',')[1]
-                
-            # Decode image
-            img_bytes = base64.b64decode(imagen_b64)
-            nparr = np.frombuffer(img_bytes, np.uint8)
-            img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+            if not imagen_b64:
+                print("  ⚠️ No profile image found. Skipping.")
+                skip_count += 1
+                continue
+            
+            try:
+                img = decode_profile_image(imagen_b64)
+            except Exception as e:
+                print(f"  ❌ Error: {e}")
+                fail_count += 1
+                continue
             
             if img is None:
                 print("  ❌ Failed to decode image.")
                 fail_count += 1
                 continue
-                
-            # Generate new embedding
-            embedding = inspireface_service.get_face_embedding(img)
             
-            if embedding:
+            batch.append((user, img))
+        
+        if not batch:
+            continue
+        
+        # Generate new embeddings for the whole batch
+        embeddings, valid, _ = inspireface_service.get_face_embeddings_batch([img for _, img in batch])
+        
+        for (user, _), embedding, ok in zip(batch, embeddings, valid):
+            rut = user.get('rut')
+            if not ok:
+                print(f"  ❌ {rut}: No face detected by InspireFace in profile photo.")
+                fail_count += 1
+                continue
+            try:
                 # Update Firebase
                 firebase_service.actualizar_vector_facial(rut, embedding)
-                print("  ✅ Vector updated successfully (InspireFace 512d)")
+                print(f"  ✅ {rut}: Vector updated successfully (InspireFace 512d)")
                 success_count += 1
-            else:
-                print("  ❌ No face detected by InspireFace in profile photo.")
+            except Exception as e:
+                print(f"  ❌ {rut}: Error: {e}")
                 fail_count += 1
-                
-        except Exception as e:
-            print(f"  ❌ Error: {e}")
-            fail_count += 1
             
     print(f"\nMigration Complete!")
     print(f"✅ Updated: {success_count}")
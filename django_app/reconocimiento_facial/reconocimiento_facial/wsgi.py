@@ -17,3 +17,9 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'reconocimiento_facial.settings')
 
 application = get_wsgi_application()
+
+# Los servicios se inicializan en su primer uso; con RF_CALENTAR_AL_INICIAR=1
+# cada worker carga modelos, Firestore y galería antes de su primera petición
+if os.environ.get('RF_CALENTAR_AL_INICIAR') == '1':
+    from usuarios.services.calentamiento_service import calentar_servicios
+    calentar_servicios()
@@ -6,21 +6,46 @@ Descripcion: Define las constantes de configuracion para el sistema de
              umbrales de similitud, tiempos de espera, y parametros de
              procesamiento de video e imagenes.
 Fecha de creacion: 10 de Septiembre 2025
-Fecha de modificacion: 20 de Diciembre 2025
+Fecha de modificacion: 17 de Octubre 2026
 Autores:
     Roberto Leal
     William Tapia
 -----------------------------------------------------------------------------
 """
+import os
 
 # ==========================================
 # Configuración de Cámara RTSP
 # ==========================================
 LUCKFOX_IP = '172.32.0.93'
 LUCKFOX_PORT = 8080
+# Modo grupal: los reconocidos confirman en Luckfox uno tras otro dentro de un plazo
+# total; los que no alcanzan a hacerlo quedan 'pendiente' (sin asistencia registrada)
+LUCKFOX_GRUPO_TIMEOUT = 20.0  # Segundos totales para las confirmaciones de un grupo
+LUCKFOX_GRUPO_TIMEOUT_USUARIO = 8.0  # Segundos máximos por confirmación en modo grupal
 RTSP_URL_HIGH = f'rtsp://{LUCKFOX_IP}/live/0'  # 2592x1944 (máxima calidad)
 RTSP_URL_LOW = f'rtsp://{LUCKFOX_IP}/live/1'   # Baja resolución
 
+# Capturador compartido por cámara: un hilo decodifica continuamente a un buffer circular
+CAMERA_RING_SIZE = 8  # Cuadros recientes retenidos por cámara
+CAMERA_MAX_FRAME_AGE = 0.5  # Antigüedad máxima (s) para reutilizar el último cuadro
+CAMERA_IDLE_TIMEOUT = 120  # Segundos sin consumidores antes de detener la decodificación
+CAMERA_RECONNECT_DELAY = 2.0  # Segundos entre intentos de reconexión
+
+# Modo dual: detección/seguimiento sobre RTSP_URL_LOW y recorte del flujo principal
+# solo cuando hay un rostro de tamaño suficiente (el principal no se decodifica en reposo)
+CAMERA_DUAL_STREAM = False
+CAMERA_DUAL_TIMEOUT = 0.5  # Segundos máximos esperando el cuadro del flujo principal
+CAMERA_DUAL_GRACIA = 1.0  # Segundos sin rostro en el subflujo antes de cerrar el flujo principal
+
+# Decodificador del capturador: 'opencv' (cv2.VideoCapture + cv2.resize) o 'ffmpeg'
+# (subproceso que escala y convierte a BGR al decodificar, sobre buffers preasignados)
+CAMERA_BACKEND = 'opencv'
+CAMERA_FFMPEG_BIN = 'ffmpeg'
+CAMERA_FFPROBE_BIN = 'ffprobe'  # Resolución nativa cuando no se fija una
+CAMERA_FFMPEG_ARGS_ENTRADA = ()  # Argumentos antes de -i (p. ej. ('-hwaccel', 'auto'))
+CAMERA_FFMPEG_BUFFERS_EXTRA = 4  # Buffers además de CAMERA_RING_SIZE (cuadros retenidos por consumidores)
+
 # ==========================================
 # Configuración de Procesamiento de Video
 # ==========================================
@@ -42,8 +67,92 @@ DETECTION_CONFIDENCE_THRESHOLD = 0.5  # Confianza mínima para detección
 MIN_FACE_PIXEL_SIZE = 80  # Tamaño mínimo de rostro en píxeles
 MAX_FACES_TO_DETECT = 5  # Máximo de rostros a detectar
 
-# Umbrales de calidad
-MIN_FACE_QUALITY = 0.3  # Puntaje mínimo de calidad para aceptar rostro
+# Umbrales de calidad (filtro previo a la extracción del embedding)
+MIN_FACE_QUALITY = 0.3  # Puntaje mínimo de nitidez (0-1) para aceptar rostro
+QUALITY_NITIDEZ_REFERENCIA = 100.0  # Varianza del Laplaciano que puntúa 1.0 de nitidez
+QUALITY_ANCHO_RECORTE = 112  # Ancho (px) al que se reduce el rostro para medir nitidez y brillo
+QUALITY_BRILLO_MIN = 40  # Brillo medio mínimo del rostro (0-255)
+QUALITY_BRILLO_MAX = 220  # Brillo medio máximo del rostro (0-255)
+
+# ==========================================
+# Configuración de Matching
+# ==========================================
+MATCH_TOP_K = 5  # Candidatos retornados por búsqueda 1:N
+
+# Modo de puntaje: 'plantilla' (vector_promedio/vector_facial), 'max' (mejor
+# muestra de vectores_faciales) o 'topk_media' (media de las mejores muestras)
+MATCHING_MODO = 'plantilla'
+MATCHING_TOPK_MUESTRAS = 3  # Muestras promediadas en modo 'topk_media'
+MAX_MUESTRAS_POR_USUARIO = 20  # Muestras por usuario cargadas en la galería
+
+# Almacenamiento de plantillas en memoria: 'float32', 'float16' o 'int8'
+# (int8 simétrico con escala por vector, 4x menos memoria que float32)
+GALLERY_DTYPE = 'float32'
+# Con int8: candidatos por consulta reordenados con similitud float32 exacta, leyendo
+# sus filas de referencia.npy del snapshot en disco (memmap, sin copia residente).
+# Requiere exportar el snapshot con este valor > 0. 0 = sin reordenar
+GALLERY_RERANK_CANDIDATOS = 0
+
+# Snapshot de la galería en disco (generado con `manage.py exportar_galeria`)
+GALLERY_SNAPSHOT_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'galeria_snapshot')
+GALLERY_SYNC_INTERVAL = 30  # Segundos entre sincronizaciones delta de la galería
+GALLERY_SYNC_OVERLAP = 60  # Margen (segundos) hacia atrás al pedir deltas
+
+# Backend de búsqueda: 'exacto' (producto matricial completo), 'ivf' o 'cascada' (aproximados)
+MATCHING_BACKEND = 'exacto'
+ANN_MIN_SIZE = 20000  # Bajo este tamaño de galería se usa siempre búsqueda exacta
+ANN_NLIST = None  # Listas invertidas (None = raíz cuadrada del tamaño de galería)
+ANN_NPROBE = 16  # Listas recorridas por consulta (más = mayor recall, mayor latencia)
+ANN_KMEANS_ITERACIONES = 10  # Iteraciones de k-means al entrenar
+ANN_MUESTRAS_POR_LISTA = 64  # Muestras de entrenamiento por lista
+ANN_FACTOR_REENTRENAMIENTO = 2.0  # Reentrenar si la galería crece este factor
+
+# Backend 'cascada': preselección en proyección PCA + reordenamiento exacto en 512-d
+CASCADA_DIMENSION = 128  # Componentes principales de la proyección (64 o 128)
+CASCADA_CANDIDATOS = 200  # Filas por consulta que pasan al coseno exacto en 512-d
+CASCADA_MUESTRAS_AJUSTE = 50000  # Plantillas usadas para ajustar la PCA
+
+# Búsqueda exacta repartida en procesos (scatter-gather sobre memoria compartida)
+GALLERY_SHARDS = 1  # Fragmentos/procesos de búsqueda (1 = buscar en el proceso de Django)
+GALLERY_SHARDS_MIN_SIZE = 100000  # Bajo este tamaño de galería no se fragmenta
+GALLERY_SHARDS_TIMEOUT = 5.0  # Segundos máximos de espera por fragmento
+GALLERY_SHARDS_HOLGURA = 0.05  # Fracción de filas libres por jornada en el segmento (deltas sin recopiar)
+
+# Verificación 1:1: cache LRU de plantillas por RUT
+VERIFICACION_CACHE_TAMANO = 256  # Usuarios en cache (plantilla, nombre, rut, jornada y activo; sin foto)
+VERIFICACION_CACHE_TTL = 300  # Segundos antes de releer el usuario (cambios de otros procesos)
+
+# ==========================================
+# Configuración de InspireFace
+# ==========================================
+DIMENSION_EMBEDDING = 512  # Tamaño del vector facial (float32)
+
+# Sesiones nativas en el pool (una por núcleo, con tope por memoria de modelos)
+INSPIREFACE_POOL_SIZE = max(1, min(os.cpu_count() or 1, 4))
+INSPIREFACE_POOL_TIMEOUT = 5.0  # Segundos máximos esperando una sesión libre
+
+# Detección en dos escalas: se detecta sobre un proxy reducido y el embedding se
+# extrae de un recorte a resolución completa
+DETECTION_PROXY_WIDTH = 640  # Ancho del proxy de detección en px (0 = detectar sobre la imagen completa)
+DETECTION_PROXY_MIN_FACE_PIXEL_SIZE = 20  # Tamaño mínimo de rostro en el proxy (~80 px a 2592 px de ancho)
+DETECTION_CROP_MARGIN = 0.4  # Margen del recorte, como fracción del tamaño de la caja
+# Opcional: rostros de al menos este ancho en el proxy se extraen del mismo proxy
+# (alineado de 112 px, ahorra re-detectar el recorte a cambio de resolución de origen).
+DETECTION_PROXY_ALIGN_SIZE = 0  # 0 = todos los rostros se extraen de un recorte a resolución completa
+
+# Modo video: sesión de seguimiento para cuadros consecutivos de una cámara
+TRACK_DETECT_INTERVAL = 10  # Cuadros entre detecciones completas (el resto solo seguimiento)
+
+# Extracción de embeddings en procesos (cada uno con su propia sesión InspireFace).
+# Cada proceso de Django (worker de gunicorn/runserver) crea su propio pool y cada
+# trabajador carga los modelos completos: la memoria y los núcleos ocupados crecen
+# como workers de Django x EMBEDDING_WORKERS. Con un solo worker de Django, usar
+# como máximo los núcleos libres (p. ej. núcleos - 1); con varios, dejar 0 o
+# repartir para que workers x EMBEDDING_WORKERS no supere los núcleos.
+EMBEDDING_WORKERS = 0  # 0 = extraer en el proceso de Django (pool de sesiones InspireFace)
+EMBEDDING_SLOTS_POR_WORKER = 2  # Cuadros en vuelo por proceso (memoria compartida, sin pickle)
+EMBEDDING_TIMEOUT = 5.0  # Segundos máximos de espera por cuadro
+EMBEDDING_CALENTAR_TIMEOUT = 60.0  # Segundos máximos para que todos los procesos carguen modelos
 
 # ==========================================
 # Configuración de Captura
@@ -62,6 +171,13 @@ PROFILE_PHOTO_BUFFER_CLEANUP_FRAMES = 5
 RECOGNITION_MAX_ATTEMPTS = 5  # Máximo de intentos de reconocimiento
 RECOGNITION_PERSISTENCE_THRESHOLD = 2  # Confirmaciones de coincidencia necesarias
 
+# Pistas de rostro en video: el embedding se reutiliza entre cuadros de una misma pista
+TRACK_IOU_MINIMO = 0.3  # IoU mínimo para asociar una caja a una pista existente
+TRACK_EXTRAER_CADA = 5  # Cuadros entre extracciones de una misma pista
+TRACK_MEJORA_AREA = 1.2  # Re-extraer antes si el área de la caja crece este factor
+TRACK_MAX_CUADROS_PERDIDA = 10  # Cuadros sin ver una pista antes de descartarla
+TRACK_PAUSA_MAXIMA = 1.0  # Segundos sin cuadros de una cámara antes de descartar sus pistas
+
 # ==========================================
 # Configuración de Tiempos de Espera
 # ==========================================
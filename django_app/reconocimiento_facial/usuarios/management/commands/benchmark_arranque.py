@@ -0,0 +1,183 @@
+"""
+-----------------------------------------------------------------------------
+Archivo: benchmark_arranque.py
+Descripcion: Comando de administracion que mide el costo de arranque en
+             procesos nuevos: django.setup(), importar los servicios,
+             importar las vistas (urls.py) y comandos manage.py livianos.
+             Verifica ademas que importar no inicialice ningun servicio
+             perezoso (modelos de InspireFace, conexion a Firestore,
+             galeria); con --verificar falla si alguno se inicializa.
+             Guarda la corrida en JSON para comparar entre commits.
+             Uso: python manage.py benchmark_arranque [--repeticiones 3]
+                  [--verificar] [--importtime] [--salida RUTA]
+Fecha de creacion: 17 de Octubre 2026
+Fecha de modificacion: 17 de Octubre 2026
+Autores:
+    Roberto Leal
+    William Tapia
+-----------------------------------------------------------------------------
+"""
+from datetime import datetime
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from .benchmark_matching import DIRECTORIO_RESULTADOS, _commit_actual
+
+DIRECTORIO_PROYECTO = os.path.dirname(DIRECTORIO_RESULTADOS)
+
+# Casos de importación: módulos importados tras django.setup()
+CASOS_IMPORTACION = {
+    'django_setup': [],
+    'servicios': ['usuarios.services.matching_service', 'usuarios.services.seguimiento_service'],
+    'vistas': ['usuarios.urls'],
+}
+
+# Comandos manage.py medidos de extremo a extremo
+CASOS_COMANDO = {
+    'manage_help': ['help'],
+    'manage_check': ['check'],
+}
+
+# Servicios perezosos (módulo, instancia) que ninguna importación debe crear
+SERVICIOS_PEREZOSOS = (
+    ('usuarios.services.inspireface_service', 'inspireface_service'),
+    ('usuarios.services.firebase_service', 'firebase_service'),
+    ('usuarios.services.galeria_service', 'galeria_service'),
+    ('usuarios.services.verificacion_service', 'cache_plantillas'),
+)
+
+SCRIPT_IMPORTACION = '''
+import importlib, json, os, sys, time
+inicio = time.perf_counter()
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'reconocimiento_facial.settings')
+import django
+django.setup()
+configurado = time.perf_counter()
+for modulo in json.loads(sys.argv[1]):
+    importlib.import_module(modulo)
+fin = time.perf_counter()
+inicializados = [
+    instancia for modulo, instancia in json.loads(sys.argv[2])
+    if modulo in sys.modules and getattr(sys.modules[modulo], instancia).inicializado
+]
+print(json.dumps({
+    'setup_s': configurado - inicio,
+    'importacion_s': fin - configurado,
+    'total_s': fin - inicio,
+    'inicializados': inicializados
+}))
+'''
+
+
+def _ejecutar(argumentos, importtime=False):
+    """Ejecuta Python en un proceso nuevo; retorna (segundos, salida, stderr)."""
+    comando = [sys.executable] + (['-X', 'importtime'] if importtime else []) + argumentos
+    inicio = time.perf_counter()
+    proceso = subprocess.run(comando, cwd=DIRECTORIO_PROYECTO, capture_output=True, text=True)
+    duracion = time.perf_counter() - inicio
+    if proceso.returncode != 0:
+        raise CommandError(f"Falló {' '.join(argumentos[:2])}:\n{proceso.stderr[-2000:]}")
+    return duracion, proceso.stdout, proceso.stderr
+
+
+def _importaciones_mas_pesadas(stderr: str, cantidad: int = 10):
+    """Paquetes de primer nivel con mayor tiempo acumulado según -X importtime."""
+    pesadas = []
+    for linea in stderr.splitlines():
+        if not linea.startswith('import time:') or '|' not in linea:
+            continue
+        _, acumulado, paquete = linea[len('import time:'):].split('|')
+        if acumulado.strip().isdigit() and not paquete.startswith('  '):
+            pesadas.append((int(acumulado) / 1000, paquete.strip()))
+    return sorted(pesadas, reverse=True)[:cantidad]
+
+
+class Command(BaseCommand):
+    help = 'Mide el arranque (setup, importaciones, comandos) y verifica que los servicios sean perezosos'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeticiones', type=int, default=3, help='Procesos por caso (se reporta la mediana)')
+        parser.add_argument('--verificar', action='store_true',
+                            help='Falla si importar inicializa algún servicio perezoso')
+        parser.add_argument('--importtime', action='store_true',
+                            help='Lista las importaciones más pesadas del caso vistas')
+        parser.add_argument('--salida', default=None, help='Archivo JSON de resultados')
+
+    def handle(self, *args, **options):
+        repeticiones = max(1, options['repeticiones'])
+        commit = _commit_actual()
+        resultados = []
+        inicializados = set()
+
+        self.stdout.write(f"📊 Benchmark de arranque (commit {commit}, {repeticiones} procesos por caso)")
+        self.stdout.write(f"{'caso':>14} {'mediana ms':>11} {'min ms':>9} {'max ms':>9}")
+
+        for caso, modulos in CASOS_IMPORTACION.items():
+            medidas = []
+            for _ in range(repeticiones):
+                _, salida, _ = _ejecutar([
+                    '-c', SCRIPT_IMPORTACION, json.dumps(modulos), json.dumps(SERVICIOS_PEREZOSOS)
+                ])
+                medida = json.loads(salida.strip().splitlines()[-1])
+                inicializados.update(medida['inicializados'])
+                medidas.append(medida)
+            resultados.append(self._resumir(caso, [m['total_s'] for m in medidas], {
+                'importacion_ms': statistics.median(m['importacion_s'] for m in medidas) * 1000,
+                'inicializados': sorted({s for m in medidas for s in m['inicializados']})
+            }))
+
+        for caso, argumentos in CASOS_COMANDO.items():
+            duraciones = [_ejecutar(['manage.py'] + argumentos)[0] for _ in range(repeticiones)]
+            resultados.append(self._resumir(caso, duraciones))
+
+        if options['importtime']:
+            _, _, stderr = _ejecutar([
+                '-c', SCRIPT_IMPORTACION, json.dumps(CASOS_IMPORTACION['vistas']), json.dumps([])
+            ], importtime=True)
+            self.stdout.write("🐢 Importaciones más pesadas (vistas):")
+            for milisegundos, paquete in _importaciones_mas_pesadas(stderr):
+                self.stdout.write(f"  {milisegundos:>9.1f} ms  {paquete}")
+
+        corrida = {
+            'fecha': datetime.now().isoformat(),
+            'commit': commit,
+            'plataforma': platform.platform(),
+            'python': platform.python_version(),
+            'repeticiones': repeticiones,
+            'resultados': resultados
+        }
+        salida = options['salida'] or os.path.join(
+            DIRECTORIO_RESULTADOS, f"arranque-{datetime.now():%Y%m%d-%H%M%S}-{commit}.json"
+        )
+        os.makedirs(os.path.dirname(os.path.abspath(salida)), exist_ok=True)
+        with open(salida, 'w', encoding='utf-8') as f:
+            json.dump(corrida, f, ensure_ascii=False, indent=2)
+        self.stdout.write(self.style.SUCCESS(f"✅ Resultados guardados en {salida}"))
+
+        if inicializados:
+            mensaje = f"Servicios inicializados al importar: {', '.join(sorted(inicializados))}"
+            if options['verificar']:
+                raise CommandError(mensaje)
+            self.stdout.write(self.style.WARNING(f"⚠️ {mensaje}"))
+        else:
+            self.stdout.write(self.style.SUCCESS("✅ Ningún servicio se inicializa al importar"))
+
+    def _resumir(self, caso, duraciones, extra=None):
+        resultado = {
+            'caso': caso,
+            'mediana_ms': statistics.median(duraciones) * 1000,
+            'min_ms': min(duraciones) * 1000,
+            'max_ms': max(duraciones) * 1000,
+            **(extra or {})
+        }
+        self.stdout.write(
+            f"{caso:>14} {resultado['mediana_ms']:>11.0f} {resultado['min_ms']:>9.0f} {resultado['max_ms']:>9.0f}"
+        )
+        return resultado
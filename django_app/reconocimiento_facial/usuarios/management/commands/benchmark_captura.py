@@ -0,0 +1,168 @@
+"""
+-----------------------------------------------------------------------------
+Archivo: benchmark_captura.py
+Descripcion: Comando de administracion que compara los decodificadores del
+             capturador de camara sobre un video grabado: 'opencv'
+             (cv2.VideoCapture + cv2.resize) y 'ffmpeg' (subproceso que
+             escala y convierte al decodificar, con buffers preasignados).
+             Cada backend corre en un proceso nuevo y se reporta arranque
+             hasta el primer cuadro, latencia por cuadro p50/p95, cuadros
+             por segundo y CPU por cuadro (proceso + subproceso ffmpeg).
+             Los cuadros se retienen en un buffer circular del tamano de
+             CAMERA_RING_SIZE, como en el capturador, para medir tambien la
+             reutilizacion de buffers. Guarda la corrida en JSON.
+             Uso: python manage.py benchmark_captura VIDEO [--cuadros 300]
+                  [--backends opencv,ffmpeg] [--resolucion 1920x1080]
+                  [--salida RUTA]
+Fecha de creacion: 17 de Octubre 2026
+Fecha de modificacion: 17 de Octubre 2026
+Autores:
+    Roberto Leal
+    William Tapia
+-----------------------------------------------------------------------------
+"""
+from collections import deque
+from datetime import datetime
+import json
+import os
+import platform
+import resource
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from .benchmark_matching import DIRECTORIO_RESULTADOS, _commit_actual, _en_proceso_nuevo
+
+BACKENDS = ('opencv', 'ffmpeg')
+
+
+def medir_backend(video: str, backend: str, resolucion, cantidad: int) -> dict:
+    """
+    Decodifica `cantidad` cuadros con un backend, igual que el hilo del
+    capturador. Se ejecuta en un proceso nuevo para que el CPU medido
+    (incluido el de ffmpeg como proceso hijo) sea solo el del caso.
+    """
+    import cv2
+    from usuarios.config import CAMERA_RING_SIZE
+    from usuarios.services.camara_service import abrir_fuente
+
+    resolucion = tuple(resolucion)
+    recientes = deque(maxlen=CAMERA_RING_SIZE)  # Cuadros retenidos como en el buffer circular
+    latencias = []
+    arranque_ms = None
+
+    cpu_inicio = time.process_time()
+    inicio = time.perf_counter()
+    captura = abrir_fuente(video, resolucion, backend)
+    try:
+        if not captura.isOpened():
+            raise RuntimeError(f"No se pudo abrir {video} con {backend}")
+        for _ in range(cantidad):
+            t = time.perf_counter()
+            ret, imagen = captura.read()
+            if not ret or imagen is None:
+                break
+            if (imagen.shape[1], imagen.shape[0]) != resolucion:
+                imagen = cv2.resize(imagen, resolucion, interpolation=cv2.INTER_LINEAR)
+            latencias.append((time.perf_counter() - t) * 1000)
+            if arranque_ms is None:
+                arranque_ms = (time.perf_counter() - inicio) * 1000
+            recientes.append(imagen)
+        reemplazados = getattr(captura, 'buffers_reemplazados', None)
+    finally:
+        captura.release()
+    duracion = time.perf_counter() - inicio
+    cpu_proceso = time.process_time() - cpu_inicio
+    hijos = resource.getrusage(resource.RUSAGE_CHILDREN)
+    cpu_hijos = hijos.ru_utime + hijos.ru_stime
+
+    if not latencias:
+        raise RuntimeError(f"{backend} no entregó cuadros de {video}")
+    cuadros = len(latencias)
+    # El primer cuadro incluye la apertura del stream: se reporta aparte
+    por_cuadro = latencias[1:] or latencias
+    return {
+        'backend': backend,
+        'cuadros': cuadros,
+        'arranque_ms': arranque_ms,
+        'p50_ms': float(np.percentile(por_cuadro, 50)),
+        'p95_ms': float(np.percentile(por_cuadro, 95)),
+        'fps': cuadros / duracion,
+        'cpu_ms_por_cuadro': (cpu_proceso + cpu_hijos) * 1000 / cuadros,
+        'cpu_proceso_ms_por_cuadro': cpu_proceso * 1000 / cuadros,
+        'cpu_nucleos': (cpu_proceso + cpu_hijos) / duracion,
+        'buffers_reemplazados': reemplazados
+    }
+
+
+class Command(BaseCommand):
+    help = 'Compara CPU y latencia de los decodificadores de cámara (opencv, ffmpeg) sobre un video grabado'
+
+    def add_arguments(self, parser):
+        parser.add_argument('video', help='Video grabado de la cámara (o una URL RTSP)')
+        parser.add_argument('--cuadros', type=int, default=300, help='Cuadros decodificados por backend')
+        parser.add_argument('--backends', default=','.join(BACKENDS), help='Backends separados por coma')
+        parser.add_argument('--resolucion', default=None, help='Resolución de salida ANCHOxALTO (por defecto VIDEO_RESOLUTION)')
+        parser.add_argument('--salida', default=None, help='Archivo JSON de resultados')
+
+    def handle(self, *args, **options):
+        from usuarios.config import VIDEO_RESOLUTION
+
+        video = options['video']
+        if '://' not in video and not os.path.exists(video):
+            raise CommandError(f"No existe el video: {video}")
+        backends = [b.strip() for b in options['backends'].split(',') if b.strip()]
+        desconocidos = set(backends) - set(BACKENDS)
+        if desconocidos:
+            raise CommandError(f"Backends desconocidos: {', '.join(sorted(desconocidos))}")
+        try:
+            resolucion = (
+                tuple(int(v) for v in options['resolucion'].lower().split('x'))
+                if options['resolucion'] else tuple(VIDEO_RESOLUTION)
+            )
+        except ValueError:
+            raise CommandError("--resolucion debe tener la forma ANCHOxALTO")
+        cantidad = max(2, options['cuadros'])
+        commit = _commit_actual()
+        resultados = []
+
+        self.stdout.write(
+            f"📊 Benchmark de captura (commit {commit}, {cantidad} cuadros a {resolucion[0]}x{resolucion[1]})"
+        )
+        self.stdout.write(
+            f"{'backend':>8} {'cuadros':>8} {'arranque ms':>12} {'p50 ms':>8} {'p95 ms':>8} "
+            f"{'fps':>7} {'CPU ms/cuadro':>14} {'núcleos':>8}"
+        )
+        for backend in backends:
+            try:
+                resultado = _en_proceso_nuevo(medir_backend, video, backend, resolucion, cantidad)
+            except Exception as e:
+                raise CommandError(f"Falló el backend {backend}: {e}")
+            resultados.append(resultado)
+            self.stdout.write(
+                f"{backend:>8} {resultado['cuadros']:>8} {resultado['arranque_ms']:>12.1f} "
+                f"{resultado['p50_ms']:>8.2f} {resultado['p95_ms']:>8.2f} {resultado['fps']:>7.1f} "
+                f"{resultado['cpu_ms_por_cuadro']:>14.2f} {resultado['cpu_nucleos']:>8.2f}"
+            )
+            if resultado['buffers_reemplazados']:
+                self.stdout.write(self.style.WARNING(
+                    f"⚠️ {backend}: {resultado['buffers_reemplazados']} buffers reemplazados por seguir "
+                    f"retenidos (subir CAMERA_FFMPEG_BUFFERS_EXTRA)"
+                ))
+
+        corrida = {
+            'fecha': datetime.now().isoformat(),
+            'commit': commit,
+            'plataforma': platform.platform(),
+            'video': video,
+            'resolucion': list(resolucion),
+            'resultados': resultados
+        }
+        salida = options['salida'] or os.path.join(
+            DIRECTORIO_RESULTADOS, f"captura-{datetime.now():%Y%m%d-%H%M%S}-{commit}.json"
+        )
+        os.makedirs(os.path.dirname(os.path.abspath(salida)), exist_ok=True)
+        with open(salida, 'w', encoding='utf-8') as f:
+            json.dump(corrida, f, ensure_ascii=False, indent=2)
+        self.stdout.write(self.style.SUCCESS(f"✅ Resultados guardados en {salida}"))
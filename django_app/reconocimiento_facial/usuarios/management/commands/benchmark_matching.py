@@ -0,0 +1,273 @@
+"""
+-----------------------------------------------------------------------------
+Archivo: benchmark_matching.py
+Descripcion: Comando de administracion que mide el motor de matching sobre
+             galerias sinteticas reproducibles (vectores de 512 dimensiones
+             normalizados) de 1k a 1M plantillas, para cada backend de
+             busqueda. Reporta latencia p50/p99, throughput y memoria pico
+             (RSS) por caso, mas cosine_similarity y verificar_usuario, y
+             guarda la corrida en JSON para comparar entre commits. No
+             requiere camara ni acceso a Firestore.
+             Uso: python manage.py benchmark_matching [--tamanos 1000,10000]
+                  [--backends exacto,ivf] [--salida RUTA] [--comparar RUTA]
+Fecha de creacion: 16 de Octubre 2026
+Fecha de modificacion: 17 de Octubre 2026
+Autores:
+    Roberto Leal
+    William Tapia
+-----------------------------------------------------------------------------
+"""
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+TAMANOS_POR_DEFECTO = '1000,10000,100000,1000000'
+BACKENDS = ('exacto', 'ivf', 'cascada', 'fragmentado')
+TAM_LOTE = 5  # Rostros por cuadro en la medición de throughput por lotes
+
+DIRECTORIO_RESULTADOS = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))),
+    'benchmarks'
+)
+
+
+def _rss_pico_mb() -> float:
+    """Memoria residente máxima del proceso (ru_maxrss está en KB en Linux)."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _percentiles(latencias):
+    return {
+        'p50_ms': float(np.percentile(latencias, 50)),
+        'p99_ms': float(np.percentile(latencias, 99)),
+        'media_ms': float(np.mean(latencias))
+    }
+
+
+def _ajustes_backend(backend: str, fragmentos: int) -> dict:
+    """Valores de config.py que selecciona cada backend (sin umbrales de tamaño)."""
+    if backend == 'fragmentado':
+        return {'MATCHING_BACKEND': 'exacto', 'GALLERY_SHARDS': fragmentos, 'GALLERY_SHARDS_MIN_SIZE': 0}
+    return {'MATCHING_BACKEND': backend, 'ANN_MIN_SIZE': 0, 'GALLERY_SHARDS': 1}
+
+
+def ejecutar_caso(tamano: int, backend: str, cantidad_consultas: int, k: int, semilla: int, ajustes: dict) -> dict:
+    """
+    Mide un backend sobre una galería sintética. Se ejecuta en un proceso
+    nuevo para que la configuración y el RSS pico sean propios del caso.
+    """
+    # La configuración se ajusta antes de importar los servicios que la leen
+    from usuarios import config
+    for nombre, valor in ajustes.items():
+        setattr(config, nombre, valor)
+
+    from usuarios.services.fragmentos_service import cerrar_ejecutores
+    from usuarios.services.indice_service import IndiceGaleria
+    from usuarios.utils.galeria_sintetica import generar_plantillas, generar_consultas, usuarios_sinteticos
+
+    plantillas = generar_plantillas(tamano, semilla=semilla)
+    consultas, _ = generar_consultas(plantillas, cantidad_consultas, semilla=semilla + 1)
+
+    inicio = time.perf_counter()
+    indice = IndiceGaleria.desde_matriz(usuarios_sinteticos(tamano), plantillas)
+    del plantillas
+    indice.preparar_ann()
+    indice = indice.preparar_fragmentos()
+    construccion = time.perf_counter() - inicio
+
+    # Calentamiento (pool de procesos, cachés de BLAS)
+    indice.buscar(consultas[0], k=k)
+
+    latencias = []
+    for consulta in consultas:
+        inicio = time.perf_counter()
+        indice.buscar(consulta, k=k)
+        latencias.append((time.perf_counter() - inicio) * 1000)
+
+    inicio = time.perf_counter()
+    for i in range(0, len(consultas), TAM_LOTE):
+        indice.buscar_lote(consultas[i:i + TAM_LOTE], k=k)
+    duracion_lotes = time.perf_counter() - inicio
+
+    # Este caso corre en un proceso hijo, que al terminar espera a los suyos
+    cerrar_ejecutores()
+
+    return {
+        'caso': 'encontrar_match',
+        'tamano': tamano,
+        'backend': backend,
+        'construccion_s': construccion,
+        **_percentiles(latencias),
+        'consultas_por_s': len(latencias) / (sum(latencias) / 1000),
+        'consultas_por_s_lote': len(consultas) / duracion_lotes,
+        'memoria_indice_mb': indice.memoria_bytes() / 1024 / 1024,
+        'rss_pico_mb': _rss_pico_mb()
+    }
+
+
+class FuenteEnMemoria:
+    """Usuarios sintéticos con la interfaz de FirebaseService que usa la cache 1:1."""
+
+    def __init__(self, usuarios):
+        self._por_rut = {u['rut']: u for u in usuarios}
+
+    def obtener_usuario_por_rut(self, rut):
+        return self._por_rut.get(rut)
+
+    def registrar_observador_usuarios(self, callback):
+        """Los usuarios en memoria no cambian: no hay nada que observar."""
+
+
+def ejecutar_funciones(repeticiones: int, semilla: int) -> dict:
+    """Mide cosine_similarity y verificar_usuario (1:1) con usuarios sintéticos."""
+    from usuarios.services import matching_service
+    from usuarios.services.verificacion_service import CachePlantillas
+    from usuarios.utils.galeria_sintetica import generar_plantillas, generar_consultas, usuarios_sinteticos
+
+    plantillas = generar_plantillas(1000, semilla=semilla)
+    consultas, filas = generar_consultas(plantillas, repeticiones, semilla=semilla + 1)
+    usuarios = usuarios_sinteticos(len(plantillas))
+    for usuario, plantilla in zip(usuarios, plantillas):
+        usuario['vector_facial'] = plantilla.tolist()
+
+    # Solo en este proceso de benchmark: la cache lee los usuarios de memoria,
+    # sin crear FirebaseService (no hay credenciales ni conexión a Firestore)
+    matching_service.cache_plantillas = CachePlantillas(FuenteEnMemoria(usuarios))
+
+    consultas = [c.tolist() for c in consultas]
+    esperados = [usuarios[fila] for fila in filas.tolist()]
+
+    def medir(funcion):
+        latencias = []
+        for consulta, usuario in zip(consultas, esperados):
+            inicio = time.perf_counter()
+            funcion(consulta, usuario)
+            latencias.append((time.perf_counter() - inicio) * 1000)
+        return _percentiles(latencias)
+
+    return {
+        'caso': 'funciones',
+        'cosine_similarity': medir(
+            lambda consulta, usuario: matching_service.cosine_similarity(consulta, usuario['vector_facial'])
+        ),
+        'verificar_usuario': medir(
+            lambda consulta, usuario: matching_service.verificar_usuario(consulta, usuario['rut'])
+        ),
+        'rss_pico_mb': _rss_pico_mb()
+    }
+
+
+def _en_proceso_nuevo(funcion, *args):
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as ejecutor:
+        return ejecutor.submit(funcion, *args).result()
+
+
+def _commit_actual() -> str:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True, text=True, timeout=5
+        ).stdout.strip() or 'desconocido'
+    except Exception:
+        return 'desconocido'
+
+
+class Command(BaseCommand):
+    help = 'Benchmark del motor de matching sobre galerías sintéticas (sin cámara ni Firestore)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tamanos', default=TAMANOS_POR_DEFECTO, help='Tamaños de galería separados por coma')
+        parser.add_argument('--backends', default=','.join(BACKENDS), help='Backends separados por coma')
+        parser.add_argument('--consultas', type=int, default=200, help='Consultas por caso')
+        parser.add_argument('--k', type=int, default=5, help='Candidatos por consulta')
+        parser.add_argument('--fragmentos', type=int, default=os.cpu_count() or 2,
+                            help='Procesos del backend fragmentado')
+        parser.add_argument('--semilla', type=int, default=0, help='Semilla de la galería sintética')
+        parser.add_argument('--salida', default=None, help='Archivo JSON de resultados')
+        parser.add_argument('--comparar', default=None, help='JSON de una corrida anterior para comparar p50')
+
+    def handle(self, *args, **options):
+        tamanos = [int(t) for t in options['tamanos'].split(',') if t.strip()]
+        backends = [b.strip() for b in options['backends'].split(',') if b.strip()]
+        desconocidos = set(backends) - set(BACKENDS)
+        if desconocidos:
+            raise CommandError(f"Backends desconocidos: {', '.join(sorted(desconocidos))}")
+
+        commit = _commit_actual()
+        resultados = []
+
+        self.stdout.write(f"📊 Benchmark de matching (commit {commit})")
+        self.stdout.write(f"{'tamaño':>9} {'backend':>12} {'p50 ms':>9} {'p99 ms':>9} "
+                          f"{'q/s':>9} {'q/s lote':>9} {'RSS MB':>9}")
+
+        for tamano in tamanos:
+            for backend in backends:
+                resultado = _en_proceso_nuevo(
+                    ejecutar_caso, tamano, backend, options['consultas'], options['k'],
+                    options['semilla'], _ajustes_backend(backend, options['fragmentos'])
+                )
+                resultados.append(resultado)
+                self.stdout.write(
+                    f"{tamano:>9} {backend:>12} {resultado['p50_ms']:>9.3f} {resultado['p99_ms']:>9.3f} "
+                    f"{resultado['consultas_por_s']:>9.0f} {resultado['consultas_por_s_lote']:>9.0f} "
+                    f"{resultado['rss_pico_mb']:>9.0f}"
+                )
+
+        funciones = _en_proceso_nuevo(ejecutar_funciones, options['consultas'], options['semilla'])
+        resultados.append(funciones)
+        for nombre in ('cosine_similarity', 'verificar_usuario'):
+            self.stdout.write(
+                f"⏱️ {nombre}: p50 {funciones[nombre]['p50_ms']:.3f} ms | p99 {funciones[nombre]['p99_ms']:.3f} ms"
+            )
+
+        corrida = {
+            'fecha': datetime.now().isoformat(),
+            'commit': commit,
+            'plataforma': platform.platform(),
+            'cpus': os.cpu_count(),
+            'numpy': np.__version__,
+            'parametros': {k: options[k] for k in ('consultas', 'k', 'fragmentos', 'semilla')},
+            'resultados': resultados
+        }
+
+        salida = options['salida'] or os.path.join(
+            DIRECTORIO_RESULTADOS, f"matching-{datetime.now():%Y%m%d-%H%M%S}-{commit}.json"
+        )
+        os.makedirs(os.path.dirname(os.path.abspath(salida)), exist_ok=True)
+        with open(salida, 'w', encoding='utf-8') as f:
+            json.dump(corrida, f, ensure_ascii=False, indent=2)
+        self.stdout.write(self.style.SUCCESS(f"✅ Resultados guardados en {salida}"))
+
+        if options['comparar']:
+            self._comparar(options['comparar'], resultados)
+
+    def _comparar(self, ruta, resultados):
+        """Variación de p50 frente a una corrida anterior (positivo = más lento)."""
+        with open(ruta, encoding='utf-8') as f:
+            anterior = json.load(f)
+        previos = {
+            (r['tamano'], r['backend']): r
+            for r in anterior.get('resultados', []) if r.get('caso') == 'encontrar_match'
+        }
+
+        self.stdout.write(f"🔁 Comparación con {anterior.get('commit')} ({anterior.get('fecha')})")
+        for resultado in resultados:
+            previo = previos.get((resultado.get('tamano'), resultado.get('backend')))
+            if resultado.get('caso') != 'encontrar_match' or not previo:
+                continue
+            variacion = (resultado['p50_ms'] / previo['p50_ms'] - 1) * 100 if previo['p50_ms'] else 0.0
+            estilo = self.style.WARNING if variacion > 10 else self.style.SUCCESS
+            self.stdout.write(estilo(
+                f"  {resultado['tamano']:>9} {resultado['backend']:>12}: "
+                f"{previo['p50_ms']:.3f} → {resultado['p50_ms']:.3f} ms ({variacion:+.1f}%)"
+            ))
@@ -0,0 +1,52 @@
+"""
+-----------------------------------------------------------------------------
+Archivo: calentar.py
+Descripcion: Comando de administracion que calienta el proceso: importa las
+             vistas, carga los modelos de InspireFace con una inferencia de
+             prueba, conecta Firestore, carga la galeria e inicia el pool de
+             extraccion, reportando el tiempo de cada etapa. Sirve para
+             verificar un despliegue antes de aceptar trafico; los workers
+             WSGI se calientan a si mismos con RF_CALENTAR_AL_INICIAR=1.
+             Uso: python manage.py calentar [--omitir galeria,extraccion]
+Fecha de creacion: 17 de Octubre 2026
+Fecha de modificacion: 17 de Octubre 2026
+Autores:
+    Roberto Leal
+    William Tapia
+-----------------------------------------------------------------------------
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from usuarios.services.calentamiento_service import ETAPAS, calentar_servicios
+
+
+class Command(BaseCommand):
+    help = 'Calienta modelos, Firestore, galería y pool de extracción antes de aceptar tráfico'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--omitir',
+            default='',
+            help=f"Etapas a saltar separadas por coma ({', '.join(ETAPAS)})"
+        )
+
+    def handle(self, *args, **options):
+        omitir = {e.strip() for e in options['omitir'].split(',') if e.strip()}
+        desconocidas = omitir - set(ETAPAS)
+        if desconocidas:
+            raise CommandError(f"Etapas desconocidas: {', '.join(sorted(desconocidas))}")
+
+        inicio = time.perf_counter()
+        tiempos = calentar_servicios(omitir=omitir)
+        total = time.perf_counter() - inicio
+
+        for etapa, segundos in tiempos.items():
+            estado = f"{segundos * 1000:>9.0f} ms" if segundos is not None else self.style.ERROR('    error')
+            self.stdout.write(f"  {etapa:>12}: {estado}")
+
+        fallidas = [etapa for etapa, segundos in tiempos.items() if segundos is None]
+        if fallidas:
+            raise CommandError(f"Calentamiento incompleto, fallaron: {', '.join(fallidas)}")
+        self.stdout.write(self.style.SUCCESS(f"✅ Proceso caliente en {total:.1f} s"))
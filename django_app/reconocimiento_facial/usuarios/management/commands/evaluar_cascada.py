@@ -0,0 +1,90 @@
+"""
+-----------------------------------------------------------------------------
+Archivo: evaluar_cascada.py
+Descripcion: Comando de administracion que mide la busqueda en cascada
+             (preseleccion PCA + reordenamiento exacto en 512-d) contra la
+             busqueda exacta: recall@1 respecto del top-1 exacto y latencia
+             por consulta. Usa una galeria sintetica reproducible o la
+             galeria real de Firestore (--galeria).
+             Uso: python manage.py evaluar_cascada [--plantillas N]
+                  [--dimension D] [--candidatos C] [--galeria]
+Fecha de creacion: 16 de Octubre 2026
+Fecha de modificacion: 16 de Octubre 2026
+Autores:
+    Roberto Leal
+    William Tapia
+-----------------------------------------------------------------------------
+"""
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from usuarios.services import ann_service
+from usuarios.services.ann_service import IndiceCascada
+from usuarios.services.indice_service import IndiceGaleria
+from usuarios.utils.galeria_sintetica import generar_plantillas, generar_consultas, usuarios_sinteticos
+
+
+class Command(BaseCommand):
+    help = 'Mide recall@1 y latencia de la búsqueda en cascada frente a la búsqueda exacta'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--plantillas', type=int, default=100000, help='Tamaño de la galería sintética')
+        parser.add_argument('--consultas', type=int, default=500, help='Cantidad de consultas')
+        parser.add_argument('--dimension', type=int, default=None, help='Dimensión de la proyección PCA')
+        parser.add_argument('--candidatos', type=int, default=None, help='Candidatos reordenados en 512-d')
+        parser.add_argument('--galeria', action='store_true', help='Usar la galería real de Firestore')
+
+    def handle(self, *args, **options):
+        if options['candidatos']:
+            ann_service.CASCADA_CANDIDATOS = options['candidatos']
+
+        if options['galeria']:
+            from usuarios.services.firebase_service import firebase_service
+            indice = IndiceGaleria.desde_usuarios(firebase_service.listar_usuarios_galeria())
+            plantillas = np.asarray(indice.matriz, dtype=np.float32)
+        else:
+            plantillas = generar_plantillas(options['plantillas'])
+            indice = IndiceGaleria.desde_matriz(usuarios_sinteticos(len(plantillas)), plantillas)
+            plantillas = np.asarray(indice.matriz, dtype=np.float32)
+
+        if len(indice) == 0:
+            self.stdout.write(self.style.WARNING("⚠️ Galería vacía"))
+            return
+
+        consultas, _ = generar_consultas(plantillas, options['consultas'])
+        self.stdout.write(f"📊 Galería: {len(indice)} plantillas, {len(consultas)} consultas")
+
+        # Búsqueda exacta (referencia)
+        exactos, tiempos_exactos = self._medir(indice, consultas)
+
+        # Cascada sobre el mismo índice
+        inicio = time.perf_counter()
+        indice.ann = IndiceCascada.entrenar(indice.matriz, options['dimension'])
+        ajuste = time.perf_counter() - inicio
+        cascada, tiempos_cascada = self._medir(indice, consultas)
+
+        recall = float(np.mean([a == b for a, b in zip(exactos, cascada)]))
+        self.stdout.write(f"🧮 Proyección {indice.ann.version} ajustada en {ajuste:.1f} s")
+        self.stdout.write(
+            f"⏱️ Exacto:  p50 {np.percentile(tiempos_exactos, 50):.2f} ms | "
+            f"p99 {np.percentile(tiempos_exactos, 99):.2f} ms"
+        )
+        self.stdout.write(
+            f"⏱️ Cascada: p50 {np.percentile(tiempos_cascada, 50):.2f} ms | "
+            f"p99 {np.percentile(tiempos_cascada, 99):.2f} ms "
+            f"({indice.ann.dimension} dims, {ann_service.CASCADA_CANDIDATOS} candidatos)"
+        )
+        self.stdout.write(self.style.SUCCESS(f"✅ recall@1 frente a búsqueda exacta: {recall * 100:.2f}%"))
+
+    def _medir(self, indice, consultas):
+        """Top-1 (RUT) y latencia en ms de cada consulta."""
+        top1 = []
+        tiempos = []
+        for consulta in consultas:
+            inicio = time.perf_counter()
+            candidatos, _ = indice.buscar(consulta, k=1)
+            tiempos.append((time.perf_counter() - inicio) * 1000)
+            top1.append(candidatos[0]['usuario']['rut'] if candidatos else None)
+        return top1, tiempos
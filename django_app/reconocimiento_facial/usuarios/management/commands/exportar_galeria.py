@@ -0,0 +1,58 @@
+"""
+-----------------------------------------------------------------------------
+Archivo: exportar_galeria.py
+Descripcion: Comando de administracion que descarga la galeria biometrica
+             desde Firestore y la guarda como snapshot en disco (.npy con
+             memmap + metadatos JSON con marca de version). Los workers
+             abren el snapshot al iniciar y solo piden deltas posteriores.
+             Con GALLERY_RERANK_CANDIDATOS > 0 y plantillas int8 guarda
+             ademas las plantillas float32 para reordenar candidatos.
+             Uso: python manage.py exportar_galeria [--directorio RUTA]
+Fecha de creacion: 16 de Octubre 2026
+Fecha de modificacion: 17 de Octubre 2026
+Autores:
+    Roberto Leal
+    William Tapia
+-----------------------------------------------------------------------------
+"""
+from datetime import datetime
+import time
+
+from django.core.management.base import BaseCommand
+
+from usuarios.config import GALLERY_RERANK_CANDIDATOS, GALLERY_SNAPSHOT_DIR
+from usuarios.services.firebase_service import firebase_service
+from usuarios.services.indice_service import IndiceGaleria
+from usuarios.services.snapshot_service import guardar_snapshot
+
+
+class Command(BaseCommand):
+    help = 'Exporta la galería biométrica de Firestore a un snapshot en disco (memmap)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--directorio',
+            default=GALLERY_SNAPSHOT_DIR,
+            help='Directorio destino del snapshot (por defecto config.GALLERY_SNAPSHOT_DIR)'
+        )
+
+    def handle(self, *args, **options):
+        directorio = options['directorio']
+        inicio = time.time()
+
+        # La marca se toma antes de leer: lo escrito durante la exportación
+        # se recupera como delta al abrir el snapshot
+        marca = datetime.now().isoformat()
+        usuarios = firebase_service.listar_usuarios_galeria()
+        self.stdout.write(f"📊 {len(usuarios)} usuarios descargados de Firestore")
+
+        # Con reordenamiento, el snapshot incluye las plantillas float32 (referencia.npy)
+        indice = IndiceGaleria.desde_usuarios(usuarios, conservar_referencia=GALLERY_RERANK_CANDIDATOS > 0)
+        indice.preparar_ann()
+        guardar_snapshot(indice, directorio, marca)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Snapshot guardado en {directorio}: {len(indice)} plantillas, "
+            f"{indice.memoria_bytes() / 1024 / 1024:.1f} MB, versión {marca} "
+            f"({time.time() - inicio:.1f} s)"
+        ))
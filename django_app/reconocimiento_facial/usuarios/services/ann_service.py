@@ -0,0 +1,387 @@
+"""
+-----------------------------------------------------------------------------
+Archivo: ann_service.py
+Descripcion: Indices aproximados de vecinos mas cercanos para galerias
+             biometricas grandes. IVF: agrupa las plantillas normalizadas en
+             listas invertidas mediante k-means esferico, de modo que cada
+             consulta solo compara contra las listas mas cercanas (nprobe).
+             Cascada: preseleccion en una proyeccion PCA de baja dimension
+             y reordenamiento exacto en 512-d. Implementado solo con NumPy.
+Fecha de creacion: 16 de Octubre 2026
+Fecha de modificacion: 16 de Octubre 2026
+Autores:
+    Roberto Leal
+    William Tapia
+-----------------------------------------------------------------------------
+"""
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional, Tuple
+import hashlib
+import numpy as np
+
+from ..config import (
+    ANN_NLIST,
+    ANN_NPROBE,
+    ANN_KMEANS_ITERACIONES,
+    ANN_MUESTRAS_POR_LISTA,
+    ANN_FACTOR_REENTRENAMIENTO,
+    CASCADA_DIMENSION,
+    CASCADA_CANDIDATOS,
+    CASCADA_MUESTRAS_AJUSTE
+)
+from ..utils.logger import logger
+
+# Filas asignadas por bloque al calcular centroides más cercanos (limita memoria temporal)
+_BLOQUE_ASIGNACION = 16384
+
+
+def _normalizar_filas(matriz: np.ndarray) -> np.ndarray:
+    normas = np.linalg.norm(matriz, axis=1, keepdims=True)
+    return matriz / np.where(normas > 0, normas, 1.0)
+
+
+def asignar_centroides(matriz: np.ndarray, centroides: np.ndarray) -> np.ndarray:
+    """Retorna el índice del centroide más similar (coseno) para cada fila."""
+    asignacion = np.empty(matriz.shape[0], dtype=np.int32)
+    for inicio in range(0, matriz.shape[0], _BLOQUE_ASIGNACION):
+        bloque = matriz[inicio:inicio + _BLOQUE_ASIGNACION]
+        asignacion[inicio:inicio + bloque.shape[0]] = np.argmax(bloque @ centroides.T, axis=1)
+    return asignacion
+
+
+def entrenar_centroides(
+    matriz: np.ndarray,
+    nlist: int,
+    iteraciones: int = ANN_KMEANS_ITERACIONES,
+    semilla: int = 0
+) -> np.ndarray:
+    """
+    K-means esférico sobre una muestra de la galería.
+
+    Args:
+        matriz: Plantillas L2-normalizadas (N, D)
+        nlist: Cantidad de listas invertidas
+        iteraciones: Iteraciones de Lloyd
+        semilla: Semilla para muestreo reproducible
+
+    Returns:
+        Centroides normalizados (nlist, D) float32
+    """
+    rng = np.random.default_rng(semilla)
+    n = matriz.shape[0]
+    tam_muestra = min(n, nlist * ANN_MUESTRAS_POR_LISTA)
+    muestra = matriz[rng.choice(n, tam_muestra, replace=False)] if tam_muestra < n else matriz
+    muestra = np.asarray(muestra, dtype=np.float32)
+
+    centroides = muestra[rng.choice(muestra.shape[0], nlist, replace=False)].copy()
+
+    for _ in range(iteraciones):
+        asignacion = asignar_centroides(muestra, centroides)
+        sumas = np.zeros_like(centroides)
+        np.add.at(sumas, asignacion, muestra)
+        conteos = np.bincount(asignacion, minlength=nlist)
+
+        # Listas vacías: reiniciar con puntos aleatorios de la muestra
+        vacias = np.flatnonzero(conteos == 0)
+        if vacias.size:
+            sumas[vacias] = muestra[rng.choice(muestra.shape[0], vacias.size, replace=False)]
+
+        centroides = _normalizar_filas(sumas).astype(np.float32)
+
+    return centroides
+
+
+class IndiceIVF:
+    """
+    Listas invertidas sobre las filas de un IndiceGaleria.
+
+    `asignacion[i]` es la lista de la fila i; las filas de cada lista se
+    guardan contiguas en `orden`, delimitadas por `inicios`. El índice es
+    inmutable: las inserciones producen un índice derivado que reutiliza los
+    centroides y solo asigna las filas nuevas.
+    """
+    NOMBRE = 'ivf'
+
+    def __init__(self, centroides: np.ndarray, asignacion: np.ndarray, tam_entrenamiento: int):
+        self.centroides = centroides
+        self.asignacion = asignacion
+        self.tam_entrenamiento = tam_entrenamiento
+
+        nlist = centroides.shape[0]
+        self.orden = np.argsort(asignacion, kind='stable').astype(np.int64)
+        conteos = np.bincount(asignacion, minlength=nlist)
+        self.inicios = np.concatenate([[0], np.cumsum(conteos)]).astype(np.int64)
+
+    @property
+    def nlist(self) -> int:
+        return self.centroides.shape[0]
+
+    @classmethod
+    def entrenar(cls, matriz: np.ndarray, nlist: Optional[int] = None) -> 'IndiceIVF':
+        """Entrena centroides y asigna todas las filas de la matriz."""
+        n = matriz.shape[0]
+        nlist = nlist or ANN_NLIST or max(1, int(np.sqrt(n)))
+        nlist = min(nlist, n)
+
+        logger.matching(f"Entrenando índice IVF: {n} plantillas, {nlist} listas")
+        centroides = entrenar_centroides(matriz, nlist)
+        return cls(centroides, asignar_centroides(matriz, centroides), n)
+
+    def derivar(self, filas_conservadas: np.ndarray, matriz_nueva: np.ndarray) -> 'IndiceIVF':
+        """
+        Índice para una galería formada por `filas_conservadas` de la actual
+        seguidas de `matriz_nueva` (inserción incremental sin reentrenar).
+        """
+        asignacion = self.asignacion[filas_conservadas]
+        if matriz_nueva.shape[0]:
+            asignacion = np.concatenate([asignacion, asignar_centroides(matriz_nueva, self.centroides)])
+        return IndiceIVF(self.centroides, asignacion, self.tam_entrenamiento)
+
+    def permutar(self, orden: np.ndarray) -> 'IndiceIVF':
+        """Índice equivalente para la galería con las filas reordenadas según `orden`."""
+        return IndiceIVF(self.centroides, self.asignacion[orden], self.tam_entrenamiento)
+
+    def requiere_reentrenamiento(self, n: int) -> bool:
+        """La galería creció demasiado respecto del tamaño de entrenamiento."""
+        return n > self.tam_entrenamiento * ANN_FACTOR_REENTRENAMIENTO
+
+    def arreglos(self) -> Dict[str, np.ndarray]:
+        """Arreglos a guardar en el snapshot de la galería."""
+        return {
+            'ivf_centroides': self.centroides,
+            'ivf_asignacion': self.asignacion,
+            'ivf_tam_entrenamiento': np.array([self.tam_entrenamiento])
+        }
+
+    def metadatos(self) -> Dict[str, Any]:
+        return {'backend': self.NOMBRE, 'nlist': self.nlist}
+
+    @classmethod
+    def desde_arreglos(
+        cls,
+        cargar: Callable[[str], Optional[np.ndarray]],
+        metadatos: Dict[str, Any]
+    ) -> Optional['IndiceIVF']:
+        """Reconstruye el índice desde un snapshot (None si no lo contiene)."""
+        centroides = cargar('ivf_centroides')
+        if centroides is None:
+            return None
+        return cls(
+            np.asarray(centroides),
+            np.asarray(cargar('ivf_asignacion')),
+            int(cargar('ivf_tam_entrenamiento')[0])
+        )
+
+    def candidatos(self, consulta: np.ndarray, nprobe: Optional[int] = None) -> np.ndarray:
+        """Filas de las `nprobe` listas cuyos centroides son más similares a la consulta."""
+        nprobe = min(nprobe or ANN_NPROBE, self.nlist)
+        similitudes = self.centroides @ consulta
+        if nprobe < self.nlist:
+            listas = np.argpartition(-similitudes, nprobe - 1)[:nprobe]
+        else:
+            listas = np.arange(self.nlist)
+
+        return np.concatenate([
+            self.orden[self.inicios[lista]:self.inicios[lista + 1]] for lista in listas.tolist()
+        ])
+
+    def preseleccion(
+        self,
+        consultas: np.ndarray,
+        mascara: np.ndarray,
+        nprobe: Optional[int] = None
+    ) -> np.ndarray:
+        """Unión de las filas elegibles de las listas visitadas por cada consulta (Q, D)."""
+        filas = np.unique(np.concatenate([self.candidatos(c, nprobe) for c in consultas]))
+        return filas[mascara[filas]]
+
+    def buscar(
+        self,
+        matriz: np.ndarray,
+        consulta: np.ndarray,
+        mascara: np.ndarray,
+        nprobe: Optional[int] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Similitudes sobre las filas candidatas elegibles.
+
+        Returns:
+            Tupla (filas, similitudes) sin ordenar
+        """
+        filas = self.candidatos(consulta, nprobe)
+        filas = filas[mascara[filas]]
+        return filas, matriz[filas] @ consulta
+
+
+def ajustar_pca(
+    matriz: np.ndarray,
+    dimension: int,
+    semilla: int = 0
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    PCA sobre una muestra de la galería.
+
+    Returns:
+        Tupla (media (D,), componentes (D, dimension)) en float32
+    """
+    rng = np.random.default_rng(semilla)
+    n = matriz.shape[0]
+    if n > CASCADA_MUESTRAS_AJUSTE:
+        muestra = matriz[np.sort(rng.choice(n, CASCADA_MUESTRAS_AJUSTE, replace=False))]
+    else:
+        muestra = matriz[:n]
+    muestra = np.asarray(muestra, dtype=np.float64)
+
+    media = muestra.mean(axis=0)
+    covarianza = np.cov(muestra - media, rowvar=False)
+    valores, vectores = np.linalg.eigh(covarianza)
+    componentes = vectores[:, np.argsort(valores)[::-1][:dimension]]
+    return media.astype(np.float32), np.ascontiguousarray(componentes, dtype=np.float32)
+
+
+class IndiceCascada:
+    """
+    Búsqueda en cascada sobre las filas de un IndiceGaleria.
+
+    Cada plantilla se guarda además proyectada a `dimension` componentes
+    principales (`reducida`). La consulta se puntúa primero contra la matriz
+    reducida y solo los CASCADA_CANDIDATOS mejores se reordenan con el coseno
+    exacto en 512-d. Como las plantillas están normalizadas,
+    x·q = (x - media)·q + media·q, y el término media·q es común a todas las
+    filas: basta con proyectar la galería centrada y la consulta sin centrar.
+
+    La proyección se versiona (`version`, hash de la media y los componentes)
+    y se guarda junto al snapshot de la galería.
+    """
+    NOMBRE = 'cascada'
+
+    def __init__(
+        self,
+        media: np.ndarray,
+        componentes: np.ndarray,
+        reducida: np.ndarray,
+        tam_entrenamiento: int,
+        ajustado: Optional[str] = None
+    ):
+        self.media = media
+        self.componentes = componentes
+        self.reducida = reducida
+        self.tam_entrenamiento = tam_entrenamiento
+        self.ajustado = ajustado or datetime.now().isoformat()
+        self.version = self.calcular_version(media, componentes)
+
+    @staticmethod
+    def calcular_version(media: np.ndarray, componentes: np.ndarray) -> str:
+        resumen = hashlib.sha1()
+        resumen.update(np.ascontiguousarray(media, dtype=np.float32).tobytes())
+        resumen.update(np.ascontiguousarray(componentes, dtype=np.float32).tobytes())
+        return f"pca{componentes.shape[1]}-{resumen.hexdigest()[:12]}"
+
+    @property
+    def dimension(self) -> int:
+        return self.componentes.shape[1]
+
+    def proyectar(self, matriz: np.ndarray) -> np.ndarray:
+        """Proyecta filas de la galería (centradas) a la dimensión reducida, por bloques."""
+        n = matriz.shape[0]
+        reducida = np.empty((n, self.dimension), dtype=np.float32)
+        for inicio in range(0, n, _BLOQUE_ASIGNACION):
+            bloque = np.asarray(matriz[inicio:inicio + _BLOQUE_ASIGNACION], dtype=np.float32)
+            reducida[inicio:inicio + bloque.shape[0]] = (bloque - self.media) @ self.componentes
+        return reducida
+
+    @classmethod
+    def entrenar(cls, matriz: np.ndarray, dimension: Optional[int] = None) -> 'IndiceCascada':
+        """Ajusta la proyección PCA y proyecta todas las filas de la matriz."""
+        n = matriz.shape[0]
+        dimension = min(dimension or CASCADA_DIMENSION, matriz.shape[1])
+
+        logger.matching(f"Ajustando proyección de cascada: {n} plantillas, {dimension} dimensiones")
+        media, componentes = ajustar_pca(matriz, dimension)
+        indice = cls(media, componentes, np.empty((0, dimension), dtype=np.float32), n)
+        indice.reducida = indice.proyectar(matriz)
+        return indice
+
+    def derivar(self, filas_conservadas: np.ndarray, matriz_nueva: np.ndarray) -> 'IndiceCascada':
+        """Inserción incremental: conserva la proyección y solo proyecta las filas nuevas."""
+        reducida = self.reducida[filas_conservadas]
+        if matriz_nueva.shape[0]:
+            reducida = np.concatenate([reducida, self.proyectar(matriz_nueva)])
+        return IndiceCascada(self.media, self.componentes, reducida, self.tam_entrenamiento, self.ajustado)
+
+    def permutar(self, orden: np.ndarray) -> 'IndiceCascada':
+        """Índice equivalente para la galería con las filas reordenadas según `orden`."""
+        return IndiceCascada(self.media, self.componentes, self.reducida[orden], self.tam_entrenamiento, self.ajustado)
+
+    def requiere_reentrenamiento(self, n: int) -> bool:
+        """La galería creció demasiado respecto del tamaño de ajuste."""
+        return n > self.tam_entrenamiento * ANN_FACTOR_REENTRENAMIENTO
+
+    def arreglos(self) -> Dict[str, np.ndarray]:
+        """Arreglos a guardar en el snapshot de la galería."""
+        return {
+            'cascada_media': self.media,
+            'cascada_componentes': self.componentes,
+            'cascada_reducida': self.reducida,
+            'cascada_tam_entrenamiento': np.array([self.tam_entrenamiento])
+        }
+
+    def metadatos(self) -> Dict[str, Any]:
+        return {
+            'backend': self.NOMBRE,
+            'proyeccion': self.version,
+            'dimension': self.dimension,
+            'ajustado': self.ajustado
+        }
+
+    @classmethod
+    def desde_arreglos(
+        cls,
+        cargar: Callable[[str], Optional[np.ndarray]],
+        metadatos: Dict[str, Any]
+    ) -> Optional['IndiceCascada']:
+        """
+        Reconstruye el índice desde un snapshot (None si no lo contiene).
+        Falla si la proyección no corresponde a la versión registrada.
+        """
+        componentes = cargar('cascada_componentes')
+        if componentes is None:
+            return None
+
+        indice = cls(
+            np.asarray(cargar('cascada_media')),
+            np.asarray(componentes),
+            cargar('cascada_reducida'),
+            int(cargar('cascada_tam_entrenamiento')[0]),
+            metadatos.get('ajustado')
+        )
+        if indice.version != metadatos.get('proyeccion'):
+            raise ValueError(
+                f"Proyección de cascada {indice.version} no coincide con la del snapshot "
+                f"({metadatos.get('proyeccion')})"
+            )
+        return indice
+
+    def preseleccion(
+        self,
+        consultas: np.ndarray,
+        mascara: np.ndarray,
+        nprobe: Optional[int] = None
+    ) -> np.ndarray:
+        """
+        Unión de las CASCADA_CANDIDATOS mejores filas elegibles de cada
+        consulta (Q, D) según el puntaje en la dimensión reducida. `nprobe`
+        se ignora (se mantiene por compatibilidad con IndiceIVF).
+        """
+        puntajes = self.reducida @ (consultas @ self.componentes).T
+        if not mascara.all():
+            puntajes[~mascara] = -np.inf
+
+        candidatos = min(CASCADA_CANDIDATOS, int(mascara.sum()))
+        if candidatos == 0:
+            return np.empty(0, dtype=np.int64)
+        if candidatos < puntajes.shape[0]:
+            mejores = np.argpartition(-puntajes, candidatos - 1, axis=0)[:candidatos]
+        else:
+            mejores = np.flatnonzero(mascara)[:, None]
+        return np.unique(mejores)
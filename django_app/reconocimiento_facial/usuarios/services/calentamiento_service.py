@@ -0,0 +1,93 @@
+"""
+-----------------------------------------------------------------------------
+Archivo: calentamiento_service.py
+Descripcion: Calentamiento explicito del proceso antes de aceptar trafico.
+             Los servicios se crean de forma perezosa en su primer uso; este
+             modulo los fuerza en orden (vistas, modelos de InspireFace con
+             una inferencia de prueba, conexion a Firestore, galeria y pool
+             de extraccion) y mide cada etapa. Lo usan `manage.py calentar`
+             y, con RF_CALENTAR_AL_INICIAR=1, el arranque WSGI de cada worker.
+Fecha de creacion: 17 de Octubre 2026
+Fecha de modificacion: 17 de Octubre 2026
+Autores:
+    Roberto Leal
+    William Tapia
+-----------------------------------------------------------------------------
+"""
+from typing import Callable, Dict, Optional
+import time
+
+from ..utils.logger import logger
+
+# Etapas en el orden en que se calientan
+ETAPAS = ('vistas', 'inspireface', 'inferencia', 'firestore', 'galeria', 'extraccion')
+
+
+def _cargar_vistas():
+    from django.urls import get_resolver
+    return len(get_resolver().url_patterns)
+
+
+def _cargar_inspireface():
+    from .inspireface_service import inspireface_service
+    return inspireface_service.obtener().tam_pool
+
+
+def _inferencia_de_prueba():
+    from .inspireface_service import inspireface_service
+    inspireface_service.calentar()
+
+
+def _conectar_firestore():
+    from .firebase_service import firebase_service
+    firebase_service.obtener()
+
+
+def _cargar_galeria():
+    from .galeria_service import galeria_service
+    return len(galeria_service.obtener_indice())
+
+
+def _iniciar_extraccion():
+    from .extraccion_service import ejecutor_embeddings
+    return ejecutor_embeddings.calentar()
+
+
+_FUNCIONES: Dict[str, Callable] = {
+    'vistas': _cargar_vistas,
+    'inspireface': _cargar_inspireface,
+    'inferencia': _inferencia_de_prueba,
+    'firestore': _conectar_firestore,
+    'galeria': _cargar_galeria,
+    'extraccion': _iniciar_extraccion,
+}
+
+
+def calentar_servicios(omitir=()) -> Dict[str, Optional[float]]:
+    """
+    Ejecuta las etapas de calentamiento en este proceso.
+
+    Un error en una etapa se registra y no detiene las siguientes: el
+    servicio afectado se volverá a intentar en su primer uso.
+
+    Args:
+        omitir: Nombres de etapas a saltar (ver ETAPAS)
+
+    Returns:
+        Segundos por etapa (None si la etapa falló)
+    """
+    tiempos: Dict[str, Optional[float]] = {}
+    for etapa in ETAPAS:
+        if etapa in omitir:
+            continue
+        inicio = time.perf_counter()
+        try:
+            detalle = _FUNCIONES[etapa]()
+        except Exception as e:
+            logger.error(f"Calentamiento '{etapa}' falló: {e}")
+            tiempos[etapa] = None
+            continue
+        tiempos[etapa] = time.perf_counter() - inicio
+        sufijo = f" ({detalle})" if detalle is not None else ''
+        logger.success(f"Calentamiento '{etapa}': {tiempos[etapa] * 1000:.0f} ms{sufijo}")
+    return tiempos
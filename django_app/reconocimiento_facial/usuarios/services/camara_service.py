@@ -0,0 +1,463 @@
+"""
+-----------------------------------------------------------------------------
+Archivo: camara_service.py
+Descripcion: Capturador RTSP compartido por camara. Un hilo de larga vida
+             por URL mantiene la conexion abierta y decodifica de forma
+             continua a un buffer circular de cuadros con marca de tiempo,
+             de modo que reconocimiento, registro, foto de perfil y streams
+             toman un cuadro reciente al instante, sin un handshake
+             RTSP/FFmpeg ni cuadros descartados por peticion. El hilo se
+             reconecta ante fallos y se detiene tras CAMERA_IDLE_TIMEOUT
+             segundos sin consumidores. Un capturador por proceso.
+             En modo dual (CAMERA_DUAL_STREAM) la deteccion y el seguimiento
+             corren sobre el subflujo de baja resolucion; el capturador del
+             flujo principal (el mismo compartido de la camara) se conecta
+             cuando hay un rostro que recortar y se cierra poco despues de
+             que el subflujo deja de tenerlo.
+             Con CAMERA_BACKEND = 'ffmpeg' los cuadros los decodifica un
+             subproceso ffmpeg que escala y convierte a BGR en un solo paso
+             y escribe rawvideo por un pipe, leido con readinto sobre un
+             pool de buffers preasignados que se prestan como arreglos
+             NumPy (sin cv2.resize ni un arreglo nuevo por cuadro). OpenCV
+             se importa solo con el backend 'opencv', al abrir el primer
+             capturador, no al importar el modulo.
+Fecha de creacion: 17 de Octubre 2026
+Fecha de modificacion: 17 de Octubre 2026
+Autores:
+    Roberto Leal
+    William Tapia
+-----------------------------------------------------------------------------
+"""
+from collections import deque
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional, Tuple
+import subprocess
+import threading
+import time
+import weakref
+import numpy as np
+
+from ..config import (
+    CAMERA_BACKEND,
+    CAMERA_DUAL_GRACIA,
+    CAMERA_DUAL_TIMEOUT,
+    CAMERA_FFMPEG_ARGS_ENTRADA,
+    CAMERA_FFMPEG_BIN,
+    CAMERA_FFMPEG_BUFFERS_EXTRA,
+    CAMERA_FFPROBE_BIN,
+    CAMERA_IDLE_TIMEOUT,
+    CAMERA_MAX_FRAME_AGE,
+    CAMERA_RECONNECT_DELAY,
+    CAMERA_RING_SIZE,
+    MIN_FACE_PIXEL_SIZE,
+    RTSP_CONNECTION_TIMEOUT,
+    RTSP_URL_HIGH,
+    RTSP_URL_LOW,
+    VIDEO_RESOLUTION,
+)
+from ..utils.logger import logger
+
+# Lecturas fallidas consecutivas antes de reabrir la conexión
+MAX_LECTURAS_FALLIDAS = 5
+
+
+@dataclass
+class Cuadro:
+    """Cuadro decodificado. La imagen se comparte entre consumidores: solo lectura."""
+    secuencia: int
+    marca: float  # time.time() al decodificar
+    imagen: np.ndarray
+
+
+class FuenteFFmpeg:
+    """
+    Decodificador ffmpeg en un subproceso, con la interfaz de
+    cv2.VideoCapture que usa CapturadorRTSP (isOpened, grab, read, release).
+
+    ffmpeg entrega cuadros BGR ya escalados a `resolucion` (un solo paso de
+    libswscale) y cada cuadro se lee del pipe con readinto directamente en
+    un buffer del pool. Los buffers se reutilizan en ronda. Cada cuadro
+    entregado es un préstamo del buffer: el pool guarda una referencia débil
+    al arreglo prestado, que mantienen vivo el buffer circular, el cuadro
+    retenido por un consumidor y cualquier vista derivada de él. Un buffer
+    con el préstamo vivo se reemplaza por uno nuevo en vez de sobrescribirse.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        resolucion: Optional[Tuple[int, int]] = VIDEO_RESOLUTION,
+        buffers: int = CAMERA_RING_SIZE + CAMERA_FFMPEG_BUFFERS_EXTRA
+    ):
+        ancho, alto = resolucion or _dimensiones_nativas(url)
+        self.forma = (alto, ancho, 3)
+        self._bytes = alto * ancho * 3
+        self._pool = [bytearray(self._bytes) for _ in range(max(2, buffers))]
+        self._prestamos: List[Optional[weakref.ref]] = [None] * len(self._pool)
+        self._siguiente = 0
+        self._descarte = np.empty(self.forma, dtype=np.uint8)  # Destino de grab()
+        self.buffers_reemplazados = 0
+        self._proceso = subprocess.Popen(
+            _comando_ffmpeg(url, ancho, alto),
+            stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+            bufsize=0  # Sin buffer de Python: readinto copia del pipe al arreglo
+        )
+
+    def isOpened(self) -> bool:
+        return self._proceso.poll() is None
+
+    def _leer_en(self, destino: np.ndarray) -> bool:
+        """Lee un cuadro completo del pipe en `destino`; False al cerrarse el pipe."""
+        vista = memoryview(destino).cast('B')
+        leidos = 0
+        while leidos < len(vista):
+            n = self._proceso.stdout.readinto(vista[leidos:])
+            if not n:
+                return False
+            leidos += n
+        return True
+
+    def grab(self) -> bool:
+        """Consume un cuadro sin publicarlo (modo bajo demanda)."""
+        return self._leer_en(self._descarte)
+
+    def read(self) -> Tuple[bool, Optional[np.ndarray]]:
+        indice = self._siguiente
+        self._siguiente = (indice + 1) % len(self._pool)
+        prestamo = self._prestamos[indice]
+        if prestamo is not None and prestamo() is not None:
+            # El cuadro anterior de este buffer sigue en uso
+            self._pool[indice] = bytearray(self._bytes)
+            self.buffers_reemplazados += 1
+        # Las vistas del cuadro (recortes, reshape) tienen como base este
+        # arreglo, no el bytearray: mientras exista alguna, el préstamo sigue vivo
+        prestado = np.frombuffer(self._pool[indice], dtype=np.uint8)
+        self._prestamos[indice] = None
+        if not self._leer_en(prestado):
+            return False, None
+        self._prestamos[indice] = weakref.ref(prestado)
+        return True, prestado.reshape(self.forma)
+
+    def release(self):
+        if self._proceso.poll() is None:
+            self._proceso.kill()
+        self._proceso.wait()
+        self._proceso.stdout.close()
+
+
+def _comando_ffmpeg(url: str, ancho: int, alto: int) -> List[str]:
+    entrada = ['-rtsp_transport', 'tcp'] if url.startswith('rtsp://') else []
+    return [
+        CAMERA_FFMPEG_BIN, '-hide_banner', '-loglevel', 'error', '-nostdin',
+        *CAMERA_FFMPEG_ARGS_ENTRADA, *entrada,
+        '-fflags', 'nobuffer', '-flags', 'low_delay',
+        '-i', url, '-an', '-sn',
+        '-vf', f'scale={ancho}:{alto}', '-pix_fmt', 'bgr24',
+        '-f', 'rawvideo', 'pipe:1'
+    ]
+
+
+def _dimensiones_nativas(url: str) -> Tuple[int, int]:
+    """(ancho, alto) del primer stream de video según ffprobe."""
+    salida = subprocess.run(
+        [CAMERA_FFPROBE_BIN, '-v', 'error', '-select_streams', 'v:0',
+         '-show_entries', 'stream=width,height', '-of', 'csv=p=0:s=x', url],
+        capture_output=True, text=True, timeout=RTSP_CONNECTION_TIMEOUT, check=True
+    ).stdout
+    ancho, alto = salida.strip().splitlines()[0].split('x')
+    return int(ancho), int(alto)
+
+
+def abrir_fuente(
+    url: str,
+    resolucion: Optional[Tuple[int, int]] = VIDEO_RESOLUTION,
+    backend: str = CAMERA_BACKEND,
+    buffers: int = CAMERA_RING_SIZE + CAMERA_FFMPEG_BUFFERS_EXTRA
+):
+    """Abre la URL con el decodificador del backend ('opencv' o 'ffmpeg')."""
+    if backend == 'ffmpeg':
+        return FuenteFFmpeg(url, resolucion, buffers)
+    if backend != 'opencv':
+        raise ValueError(f"Backend de captura desconocido: {backend}")
+    import cv2
+
+    captura = cv2.VideoCapture(url, cv2.CAP_FFMPEG)
+    captura.set(cv2.CAP_PROP_BUFFERSIZE, 1)  # El buffer propio reemplaza al de FFmpeg
+    return captura
+
+
+class CapturadorRTSP:
+    """
+    Hilo de captura continua de una URL RTSP con buffer circular.
+
+    Los consumidores piden el último cuadro (ultimo), el siguiente a uno ya
+    visto (siguiente) o se suscriben a los cuadros nuevos (suscribir). Cada
+    pedido mantiene vivo el hilo; si estaba detenido, lo inicia (conectar
+    lo hace sin esperar un cuadro). Un consumidor que ya no necesita cuadros
+    puede acortar la espera antes de detenerlo (soltar).
+    El decodificador lo elige `backend` (ver abrir_fuente).
+    """
+
+    def __init__(
+        self,
+        url: str,
+        resolucion: Optional[Tuple[int, int]] = VIDEO_RESOLUTION,
+        capacidad: int = CAMERA_RING_SIZE,
+        backend: str = CAMERA_BACKEND
+    ):
+        self.url = url
+        self.resolucion = tuple(resolucion) if resolucion else None  # None = resolución nativa
+        self.backend = backend
+        self._cuadros: 'deque[Cuadro]' = deque(maxlen=max(1, capacidad))
+        self._condicion = threading.Condition()
+        self._hilo: Optional[threading.Thread] = None
+        self._ultimo_uso = 0.0
+        self._inactividad = CAMERA_IDLE_TIMEOUT  # Segundos sin pedidos antes de detener el hilo
+        self._secuencia = 0
+        self.conectado = False
+        self.reconexiones = 0
+
+    # ------------------------------------------
+    # Hilo de captura
+    # ------------------------------------------
+
+    def _asegurar_hilo(self):
+        """Registra el uso y arranca el hilo si no está corriendo."""
+        with self._condicion:
+            self._ultimo_uso = time.time()
+            self._inactividad = CAMERA_IDLE_TIMEOUT
+            if self._hilo is None or not self._hilo.is_alive():
+                self._hilo = threading.Thread(target=self._bucle, name=f'capturador {self.url}', daemon=True)
+                self._hilo.start()
+
+    def _inactivo(self) -> bool:
+        """Decide bajo el lock si el hilo termina por falta de consumidores."""
+        with self._condicion:
+            if time.time() - self._ultimo_uso < self._inactividad:
+                return False
+            self._hilo = None
+            self.conectado = False
+            self._cuadros.clear()
+            return True
+
+    def _abrir(self):
+        # Pool ffmpeg: el buffer circular más margen para cuadros retenidos por consumidores
+        return abrir_fuente(
+            self.url, self.resolucion, self.backend,
+            self._cuadros.maxlen + CAMERA_FFMPEG_BUFFERS_EXTRA
+        )
+
+    def _bucle(self):
+        captura = None
+        fallos = 0
+        try:
+            while not self._inactivo():
+                if captura is None:
+                    try:
+                        captura = self._abrir()
+                    except Exception as e:
+                        logger.error(f"No se pudo abrir el decodificador de {self.url}: {e}")
+                        time.sleep(CAMERA_RECONNECT_DELAY)
+                        continue
+                    if not captura.isOpened():
+                        logger.error(f"No se pudo conectar al stream RTSP {self.url}")
+                        captura.release()
+                        captura = None
+                        time.sleep(CAMERA_RECONNECT_DELAY)
+                        continue
+                    self.conectado = True
+                    logger.camera(f"Capturador conectado: {self.url}")
+
+                ret, imagen = captura.read()
+                if not ret or imagen is None:
+                    fallos += 1
+                    if fallos > MAX_LECTURAS_FALLIDAS:
+                        logger.warning(f"Reconectando capturador: {self.url}")
+                        captura.release()
+                        captura = None
+                        self.conectado = False
+                        self.reconexiones += 1
+                        fallos = 0
+                        time.sleep(CAMERA_RECONNECT_DELAY)
+                    continue
+
+                fallos = 0
+                if self.resolucion and (imagen.shape[1], imagen.shape[0]) != self.resolucion:
+                    # Solo con OpenCV: ffmpeg ya entrega los cuadros a `resolucion`
+                    import cv2
+
+                    imagen = cv2.resize(imagen, self.resolucion, interpolation=cv2.INTER_LINEAR)
+                self._publicar(imagen)
+        finally:
+            if captura is not None:
+                captura.release()
+            logger.camera(f"Capturador detenido: {self.url}")
+
+    def _publicar(self, imagen: np.ndarray):
+        with self._condicion:
+            self._secuencia += 1
+            self._cuadros.append(Cuadro(self._secuencia, time.time(), imagen))
+            self._condicion.notify_all()
+
+    # ------------------------------------------
+    # Consumidores
+    # ------------------------------------------
+
+    @property
+    def secuencia(self) -> int:
+        """Secuencia del último cuadro publicado (0 si aún no hay)."""
+        return self._secuencia
+
+    def siguiente(self, despues_de: int = 0, timeout: float = RTSP_CONNECTION_TIMEOUT) -> Optional[Cuadro]:
+        """
+        Cuadro más reciente con secuencia mayor que `despues_de`, esperando
+        hasta `timeout` segundos. None si no llega ninguno.
+        """
+        self._asegurar_hilo()
+        limite = time.time() + timeout
+        with self._condicion:
+            while not self._cuadros or self._cuadros[-1].secuencia <= despues_de:
+                restante = limite - time.time()
+                if restante <= 0:
+                    return None
+                self._condicion.wait(restante)
+            return self._cuadros[-1]
+
+    def ultimo(
+        self,
+        max_antiguedad: float = CAMERA_MAX_FRAME_AGE,
+        timeout: float = RTSP_CONNECTION_TIMEOUT
+    ) -> Optional[Cuadro]:
+        """Último cuadro si no supera `max_antiguedad`; si no, espera uno nuevo."""
+        self._asegurar_hilo()
+        with self._condicion:
+            actual = self._cuadros[-1] if self._cuadros else None
+        if actual is not None and time.time() - actual.marca <= max_antiguedad:
+            return actual
+        return self.siguiente(actual.secuencia if actual else 0, timeout)
+
+    def suscribir(self, timeout: float = RTSP_CONNECTION_TIMEOUT) -> Iterator[Cuadro]:
+        """
+        Genera cuadros nuevos a medida que se decodifican (un consumidor
+        lento recibe siempre el más reciente, sin acumular atraso). Termina
+        si no llega un cuadro en `timeout` segundos.
+        """
+        cuadro = self.ultimo(timeout=timeout)
+        while cuadro is not None:
+            yield cuadro
+            cuadro = self.siguiente(cuadro.secuencia, timeout)
+
+    def conectar(self):
+        """
+        Arranca el hilo sin pedir un cuadro (o lo mantiene vivo), para que la
+        conexión avance mientras el consumidor sigue con otra fuente.
+        """
+        self._asegurar_hilo()
+
+    def soltar(self, inactividad: float):
+        """
+        Detiene el hilo cuando pasan `inactividad` segundos desde el último
+        pedido (en lugar de CAMERA_IDLE_TIMEOUT). Cualquier pedido posterior
+        restablece la espera normal, así no se corta a otro consumidor activo.
+        """
+        with self._condicion:
+            self._inactividad = min(self._inactividad, inactividad)
+
+
+class FuenteDual:
+    """
+    Par subflujo/flujo principal de una misma cámara.
+
+    La detección y el seguimiento usan los cuadros del subflujo; para
+    extraer un embedding se pide al flujo principal (el capturador
+    compartido de la cámara) el siguiente cuadro y la caja se escala a su
+    resolución. Ambos flujos vienen del mismo sensor (mismo encuadre); el
+    margen del recorte y la re-detección en él absorben el desfase entre
+    los dos cuadros.
+
+    El flujo principal se conecta con el primer rostro de tamaño suficiente
+    y se suelta (soltar_alto) cuando el subflujo ya no tiene uno: sin
+    rostros solo se decodifica el subflujo. Mientras el flujo principal se
+    conecta, o si no entrega un cuadro a tiempo, se extrae del cuadro del
+    subflujo, y se avisa una vez por fuente.
+    """
+
+    def __init__(self, bajo: CapturadorRTSP, alto: CapturadorRTSP):
+        self.bajo = bajo
+        self.alto = alto
+        self._aviso_respaldo = False
+
+    def tam_minimo_bajo(self, imagen_baja: np.ndarray) -> float:
+        """MIN_FACE_PIXEL_SIZE del flujo principal expresado en px del subflujo."""
+        if not self.alto.resolucion:
+            return MIN_FACE_PIXEL_SIZE
+        return MIN_FACE_PIXEL_SIZE * imagen_baja.shape[1] / self.alto.resolucion[0]
+
+    def cuadro_alto(self, imagen_baja: np.ndarray, caja) -> Optional[Tuple[np.ndarray, Tuple[int, int, int, int]]]:
+        """
+        Cuadro del flujo principal decodificado tras el pedido y la caja del
+        subflujo escalada a su resolución.
+
+        Returns:
+            (imagen, caja) o None si el rostro no alcanza MIN_FACE_PIXEL_SIZE
+            en el flujo principal. Sin cuadro del flujo principal retorna el
+            del subflujo con su caja
+        """
+        if min(caja[2] - caja[0], caja[3] - caja[1]) < self.tam_minimo_bajo(imagen_baja):
+            self.soltar_alto()
+            return None
+
+        # Mientras el flujo principal se conecta (handshake RTSP, o
+        # CAMERA_RECONNECT_DELAY, más que CAMERA_DUAL_TIMEOUT) no se espera en cada cuadro
+        if not self.alto.conectado:
+            self.alto.conectar()
+            return self._respaldo(imagen_baja, caja, 'flujo principal conectándose')
+        cuadro = self.alto.siguiente(self.alto.secuencia, timeout=CAMERA_DUAL_TIMEOUT)
+        if cuadro is None:
+            return self._respaldo(imagen_baja, caja, f'sin cuadro del flujo principal en {CAMERA_DUAL_TIMEOUT}s')
+
+        escala_x = cuadro.imagen.shape[1] / imagen_baja.shape[1]
+        escala_y = cuadro.imagen.shape[0] / imagen_baja.shape[0]
+        caja_alta = (
+            int(caja[0] * escala_x), int(caja[1] * escala_y),
+            int(caja[2] * escala_x), int(caja[3] * escala_y)
+        )
+        return cuadro.imagen, caja_alta
+
+    def soltar_alto(self):
+        """Sin rostro que recortar: el flujo principal se cierra tras CAMERA_DUAL_GRACIA."""
+        self.alto.soltar(CAMERA_DUAL_GRACIA)
+
+    def _respaldo(self, imagen_baja: np.ndarray, caja, motivo: str):
+        """Extracción sobre el subflujo cuando falta el flujo principal."""
+        if not self._aviso_respaldo:
+            self._aviso_respaldo = True
+            logger.warning(f"Modo dual: {motivo}, se extrae del subflujo ({self.bajo.url})")
+        return imagen_baja, caja
+
+
+_capturadores: Dict[str, CapturadorRTSP] = {}
+_lock_capturadores = threading.Lock()
+
+
+def obtener_capturador(
+    url: str = RTSP_URL_HIGH,
+    resolucion: Optional[Tuple[int, int]] = VIDEO_RESOLUTION
+) -> CapturadorRTSP:
+    """
+    Capturador compartido de la URL (uno por cámara en el proceso). La
+    resolución solo se aplica al crearlo.
+    """
+    with _lock_capturadores:
+        capturador = _capturadores.get(url)
+        if capturador is None:
+            capturador = _capturadores[url] = CapturadorRTSP(url, resolucion=resolucion)
+        return capturador
+
+
+def obtener_fuente_dual() -> FuenteDual:
+    """
+    Subflujo a resolución nativa (detección) + flujo principal compartido
+    (recorte), que no se conecta hasta el primer rostro.
+    """
+    return FuenteDual(obtener_capturador(RTSP_URL_LOW, resolucion=None), obtener_capturador(RTSP_URL_HIGH))
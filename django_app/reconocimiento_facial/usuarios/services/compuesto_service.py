@@ -0,0 +1,113 @@
+"""
+-----------------------------------------------------------------------------
+Archivo: compuesto_service.py
+Descripcion: Indice compuesto de la galeria biometrica: el snapshot abierto
+             con memmap (base, de solo lectura y compartida entre workers)
+             mas un indice pequeno en memoria con los cambios posteriores.
+             Los deltas solo tocan el indice pequeno y excluyen de la base
+             las filas reemplazadas, sin copiarla.
+Fecha de creacion: 17 de Octubre 2026
+Fecha de modificacion: 17 de Octubre 2026
+Autores:
+    Roberto Leal
+    William Tapia
+-----------------------------------------------------------------------------
+"""
+from typing import Any, Dict, List, Optional, Tuple
+import copy
+import numpy as np
+
+from .indice_service import IndiceGaleria
+
+
+class IndiceCompuesto:
+    """
+    Snapshot mapeado en memoria (base, de solo lectura) más un índice pequeño
+    en memoria con los cambios posteriores (delta).
+
+    Las filas de la base cuyos usuarios aparecen en el delta quedan excluidas
+    (tombstone), de modo que la base nunca se copia y sus páginas siguen
+    compartidas entre todos los workers del host. Expone la misma interfaz de
+    búsqueda que IndiceGaleria.
+    """
+
+    def __init__(
+        self,
+        base: IndiceGaleria,
+        delta: Optional[IndiceGaleria] = None,
+        reemplazados: Optional[frozenset] = None
+    ):
+        self.base = base
+        self.delta = delta if delta is not None else IndiceGaleria.desde_usuarios([])
+        self.reemplazados = reemplazados or frozenset()
+
+    def __len__(self) -> int:
+        return len(self.base) - len(self.reemplazados & self.base.fila_por_rut.keys()) + len(self.delta)
+
+    @property
+    def dimension(self) -> int:
+        return self.base.dimension or self.delta.dimension
+
+    def aplicar_cambios(self, usuarios: List[Dict[str, Any]]) -> 'IndiceCompuesto':
+        """Aplica los cambios en el delta y excluye esas filas de la base."""
+        if not usuarios:
+            return self
+
+        # Cambios de solo metadatos sobre filas vigentes de la base: en sitio
+        usuarios = [
+            u for u in usuarios
+            if u.get('rut') in self.reemplazados or not self.base.actualizar_metadatos(u)
+        ]
+        if not usuarios:
+            return self
+
+        cambiados = frozenset(u.get('rut') for u in usuarios)
+        base = copy.copy(self.base)
+        base.activos = self.base.activos.copy()
+        for rut in cambiados:
+            fila = base.fila_por_rut.get(rut)
+            if fila is not None:
+                base.activos[fila] = False
+
+        return IndiceCompuesto(base, self.delta.aplicar_cambios(usuarios), self.reemplazados | cambiados)
+
+    def preparar_ann(self):
+        """La base conserva el IVF del snapshot; el delta decide el suyo."""
+        if self.base.ann is None:
+            self.base.preparar_ann()
+        self.delta.preparar_ann()
+
+    def preparar_fragmentos(self) -> 'IndiceCompuesto':
+        """
+        No aplica: la base ya es memoria compartida (memmap del snapshot) y el
+        delta es pequeño.
+        """
+        return self
+
+    def marcar_activo(self, rut: str, activo: bool) -> bool:
+        if self.delta.marcar_activo(rut, activo):
+            return True
+        if rut in self.reemplazados:
+            return False
+        return self.base.marcar_activo(rut, activo)
+
+    def memoria_bytes(self) -> int:
+        """Bytes privados del proceso (el delta); la base es memoria compartida."""
+        return self.delta.memoria_bytes()
+
+    def buscar(self, vector_consulta: Any, k: int = 5, **kwargs) -> Tuple[List[Dict[str, Any]], int]:
+        """Busca en base y delta y mezcla los candidatos por similitud."""
+        resultados, total = self.buscar_lote(np.asarray(vector_consulta, dtype=np.float32)[None, :], k, **kwargs)
+        return resultados[0], total
+
+    def buscar_lote(self, consultas: Any, k: int = 5, **kwargs) -> Tuple[List[List[Dict[str, Any]]], int]:
+        """Versión por lotes de buscar()."""
+        resultados, total = self.base.buscar_lote(consultas, k, **kwargs)
+        if len(self.delta):
+            resultados_delta, total_delta = self.delta.buscar_lote(consultas, k, **kwargs)
+            resultados = [
+                sorted(a + b, key=lambda c: c['similitud'], reverse=True)[:k]
+                for a, b in zip(resultados, resultados_delta)
+            ]
+            total += total_delta
+        return resultados, total
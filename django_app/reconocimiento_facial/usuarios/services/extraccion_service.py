@@ -0,0 +1,364 @@
+"""
+-----------------------------------------------------------------------------
+Archivo: extraccion_service.py
+Descripcion: Ejecutor de extraccion de embeddings en procesos trabajadores.
+             Cada proceso carga su propia sesion InspireFace, de modo que la
+             extraccion usa todos los nucleos sin competir por el GIL. Los
+             cuadros se copian a slots de memoria compartida
+             (multiprocessing.shared_memory) reservados al iniciar: un cuadro
+             BGR de 1080p nunca se serializa con pickle, solo viajan el
+             nombre del slot y su forma. Expone submit(cuadro) -> Future.
+             En modo seguimiento mapear delega en seguimiento_service: la
+             deteccion/seguimiento corre en el proceso principal y solo los
+             cuadros con rostro se envian a extraer. Sin procesos
+             (EMBEDDING_WORKERS = 0) los cuadros se procesan en lotes con
+             get_face_embeddings_batch; un lote se procesa en cuanto no hay
+             mas cuadros disponibles, sin esperar a llenarlo.
+             Cada proceso hace una inferencia de prueba al iniciarse;
+             calentar() inicia todos los procesos y espera a que terminen.
+Fecha de creacion: 16 de Octubre 2026
+Fecha de modificacion: 17 de Octubre 2026
+Autores:
+    Roberto Leal
+    William Tapia
+-----------------------------------------------------------------------------
+"""
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+import atexit
+import multiprocessing
+import os
+import queue
+import threading
+import numpy as np
+
+from ..config import (
+    EMBEDDING_CALENTAR_TIMEOUT,
+    EMBEDDING_SLOTS_POR_WORKER,
+    EMBEDDING_TIMEOUT,
+    EMBEDDING_WORKERS,
+    INSPIREFACE_POOL_SIZE,
+    VIDEO_RESOLUTION,
+)
+from ..utils.logger import logger
+
+# Bytes de cada slot: un cuadro BGR uint8 a la resolución de análisis
+_BYTES_POR_SLOT = VIDEO_RESOLUTION[0] * VIDEO_RESOLUTION[1] * 3
+
+
+# ==========================================
+# Proceso trabajador
+# ==========================================
+
+_slots_abiertos: Dict[str, shared_memory.SharedMemory] = {}
+_barrera = None
+
+
+def _inicializar_trabajador(barrera):
+    """
+    Carga el SDK con una sola sesión (el paralelismo lo dan los procesos) y
+    hace una inferencia de prueba antes de aceptar el primer cuadro.
+    """
+    global _barrera
+    _barrera = barrera
+    from .. import config
+    config.INSPIREFACE_POOL_SIZE = 1
+    from .inspireface_service import inspireface_service
+    inspireface_service.calentar()
+
+
+def _esperar_trabajadores(timeout: float) -> int:
+    """
+    Bloquea hasta que todos los procesos del pool estén en la barrera: cada
+    tarea ocupa un proceso distinto, así que el pool inicia (y calienta)
+    todos sus procesos. Retorna el PID.
+    """
+    _barrera.wait(timeout)
+    return os.getpid()
+
+
+def _extraer_de_slot(nombre: str, forma: Tuple[int, ...], tipo: str, return_quality: bool, caja=None):
+    """Extrae el embedding del cuadro escrito en el slot compartido `nombre`."""
+    from .inspireface_service import inspireface_service
+
+    memoria = _slots_abiertos.get(nombre)
+    if memoria is None:
+        memoria = shared_memory.SharedMemory(name=nombre)
+        _slots_abiertos[nombre] = memoria
+    cuadro = np.ndarray(forma, dtype=np.dtype(tipo), buffer=memoria.buf)
+    return inspireface_service.get_face_embedding(cuadro, return_quality=return_quality, caja=caja)
+
+
+def _extraer_de_cuadro(cuadro: np.ndarray, return_quality: bool, caja=None):
+    """Cuadros mayores que un slot: se envían serializados."""
+    from .inspireface_service import inspireface_service
+    return inspireface_service.get_face_embedding(cuadro, return_quality=return_quality, caja=caja)
+
+
+# ==========================================
+# Proceso principal
+# ==========================================
+
+class EjecutorEmbeddings:
+    """
+    Pool de procesos de extracción alimentado por slots de memoria compartida.
+
+    submit() toma un slot libre (bloquea si todos están en vuelo), copia el
+    cuadro y retorna un Future con el mismo resultado que
+    inspireface_service.get_face_embedding. El slot se libera al completarse
+    el Future. Si el pool no está disponible la extracción se hace en el
+    proceso actual y se retorna un Future ya resuelto.
+    """
+
+    def __init__(
+        self,
+        trabajadores: int = EMBEDDING_WORKERS,
+        slots_por_trabajador: int = EMBEDDING_SLOTS_POR_WORKER
+    ):
+        self.trabajadores = max(0, trabajadores)
+        # Sin procesos, la capacidad es el tamaño de lote sobre el pool de sesiones
+        self.capacidad = max(1, (self.trabajadores or INSPIREFACE_POOL_SIZE) * max(1, slots_por_trabajador))
+        self._ejecutor: Optional[ProcessPoolExecutor] = None
+        self._slots: List[shared_memory.SharedMemory] = []
+        self._libres: 'queue.Queue[int]' = queue.Queue()
+        self._lock = threading.Lock()
+
+    def _obtener_ejecutor(self) -> ProcessPoolExecutor:
+        """Inicia el pool y reserva los slots en el primer uso."""
+        with self._lock:
+            if not self._slots:
+                for i in range(self.capacidad):
+                    self._slots.append(shared_memory.SharedMemory(create=True, size=_BYTES_POR_SLOT))
+                    self._libres.put(i)
+                atexit.register(self.cerrar)
+            if self._ejecutor is None:
+                # 'spawn': el SDK nativo y los hilos de Django no sobreviven a fork
+                contexto = multiprocessing.get_context('spawn')
+                self._ejecutor = ProcessPoolExecutor(
+                    max_workers=self.trabajadores,
+                    mp_context=contexto,
+                    initializer=_inicializar_trabajador,
+                    initargs=(contexto.Barrier(self.trabajadores),)
+                )
+                logger.recognition(f"Pool de extracción iniciado: {self.trabajadores} procesos, {self.capacidad} slots")
+            return self._ejecutor
+
+    def calentar(self) -> int:
+        """
+        Inicia todos los procesos trabajadores y espera a que cada uno cargue
+        sus modelos, para no pagar el arranque en la primera extracción. Las
+        tareas se encuentran en una barrera, de modo que ningún proceso
+        atiende dos de ellas y todos pasan por el inicializador.
+
+        Returns:
+            Procesos distintos que respondieron (0 sin pool)
+        """
+        if self.trabajadores == 0:
+            return 0
+        ejecutor = self._obtener_ejecutor()
+        futuros = [
+            ejecutor.submit(_esperar_trabajadores, EMBEDDING_CALENTAR_TIMEOUT)
+            for _ in range(self.trabajadores)
+        ]
+        procesos = set()
+        for futuro in futuros:
+            try:
+                procesos.add(futuro.result())
+            except Exception as e:
+                logger.error(f"Un proceso de extracción no terminó de calentar: {e}")
+        return len(procesos)
+
+    def _reiniciar(self):
+        with self._lock:
+            if self._ejecutor is not None:
+                self._ejecutor.shutdown(wait=False, cancel_futures=True)
+            self._ejecutor = None
+
+    def cerrar(self):
+        """Detiene los procesos y libera los slots compartidos."""
+        self._reiniciar()
+        with self._lock:
+            for memoria in self._slots:
+                memoria.close()
+                memoria.unlink()
+            self._slots = []
+            self._libres = queue.Queue()
+
+    def submit(self, cuadro: np.ndarray, return_quality: bool = False, caja=None) -> Future:
+        """
+        Encola la extracción del embedding de un cuadro BGR.
+
+        Args:
+            caja: Caja del rostro ya localizada (se omite la detección)
+
+        Returns:
+            Future cuyo resultado es el de get_face_embedding(cuadro, return_quality, caja)
+        """
+        if self.trabajadores == 0 or cuadro is None:
+            return self._en_linea(cuadro, return_quality, caja)
+
+        cuadro = np.ascontiguousarray(cuadro)
+        try:
+            ejecutor = self._obtener_ejecutor()
+            if cuadro.nbytes > _BYTES_POR_SLOT:
+                return ejecutor.submit(_extraer_de_cuadro, cuadro, return_quality, caja)
+            indice = self._libres.get(timeout=EMBEDDING_TIMEOUT)
+        except Exception as e:
+            logger.error(f"Pool de extracción no disponible, se extrae en el proceso actual: {e}")
+            return self._en_linea(cuadro, return_quality, caja)
+
+        memoria = self._slots[indice]
+        np.ndarray(cuadro.shape, dtype=cuadro.dtype, buffer=memoria.buf)[...] = cuadro
+        try:
+            futuro = ejecutor.submit(
+                _extraer_de_slot, memoria.name, cuadro.shape, cuadro.dtype.str, return_quality, caja
+            )
+        except Exception as e:
+            self._libres.put(indice)
+            logger.error(f"Error enviando cuadro al pool de extracción: {e}")
+            self._reiniciar()
+            return self._en_linea(cuadro, return_quality, caja)
+
+        libres = self._libres
+        futuro.add_done_callback(lambda _futuro: libres.put(indice))
+        return futuro
+
+    def mapear(
+        self,
+        cuadros: Iterable[np.ndarray],
+        return_quality: bool = False,
+        seguimiento: bool = False,
+        dual=None,
+        camara: Optional[str] = None
+    ) -> Iterator[Tuple[np.ndarray, object]]:
+        """
+        Genera (cuadro, resultado) en el orden de entrada manteniendo hasta
+        `capacidad` cuadros en vuelo. Al cerrar el generador (break del
+        consumidor) se cancelan los cuadros pendientes.
+
+        Con seguimiento=True los cuadros deben ser consecutivos de una misma
+        cámara y se procesan con seguimiento_service.seguir_y_extraer: el
+        rostro se sigue entre cuadros (detección completa solo cada
+        TRACK_DETECT_INTERVAL cuadros), se extrae en cada cuadro con rostro
+        apto y los cuadros sin rostro apto (filtro de calidad) se resuelven
+        sin enviarse al pool. Con `dual` (FuenteDual) los cuadros son del
+        subflujo y se genera el cuadro del flujo principal extraído. Con
+        `camara` se reutiliza la sesión de seguimiento de esa cámara.
+
+        Sin procesos trabajadores los cuadros se agrupan en lotes de hasta
+        `capacidad` y se extraen con get_face_embeddings_batch. Los cuadros
+        se leen en un hilo aparte: un lote se procesa con los cuadros ya
+        disponibles, sin esperar a llenarlo.
+        """
+        if seguimiento:
+            return self._mapear_con_seguimiento(cuadros, return_quality, dual, camara)
+        if self.trabajadores == 0:
+            return self._mapear_en_lotes(cuadros, return_quality)
+        return self._mapear_en_pool(cuadros, return_quality)
+
+    def _mapear_con_seguimiento(self, cuadros, return_quality, dual, camara):
+        from .seguimiento_service import seguir_y_extraer
+
+        vacio = (None, 0.0) if return_quality else None
+        resultados = seguir_y_extraer(
+            cuadros, self, dual=dual, return_quality=return_quality, todas=True, camara=camara
+        )
+        try:
+            for cuadro, _, muestra in resultados:
+                yield cuadro, vacio if muestra is None else muestra
+        finally:
+            resultados.close()
+
+    def _mapear_en_pool(self, cuadros, return_quality):
+        pendientes = deque()
+        try:
+            for cuadro in cuadros:
+                pendientes.append((cuadro, self.submit(cuadro, return_quality)))
+                if len(pendientes) >= self.capacidad:
+                    cuadro, futuro = pendientes.popleft()
+                    yield cuadro, self.resultado(futuro, cuadro, return_quality)
+            while pendientes:
+                cuadro, futuro = pendientes.popleft()
+                yield cuadro, self.resultado(futuro, cuadro, return_quality)
+        finally:
+            for _, futuro in pendientes:
+                futuro.cancel()
+
+    def _mapear_en_lotes(self, cuadros, return_quality):
+        from .inspireface_service import inspireface_service
+
+        def resolver(lote):
+            embeddings, validos, calidades = inspireface_service.get_face_embeddings_batch(lote)
+            for cuadro, embedding, valido, calidad in zip(lote, embeddings, validos, calidades):
+                if not valido:
+                    yield cuadro, (None, 0.0) if return_quality else None
+                else:
+                    yield cuadro, (embedding, float(calidad)) if return_quality else embedding
+
+        fin = object()
+        disponibles: 'queue.Queue' = queue.Queue(maxsize=self.capacidad)
+        detener = threading.Event()
+
+        def leer():
+            try:
+                for cuadro in cuadros:
+                    disponibles.put(cuadro)
+                    if detener.is_set():
+                        break
+            finally:
+                disponibles.put(fin)
+
+        threading.Thread(target=leer, name='lector de cuadros', daemon=True).start()
+        try:
+            terminado = False
+            while not terminado:
+                # Bloquea solo por el primer cuadro; el resto del lote es lo ya leído
+                lote = [disponibles.get()]
+                while len(lote) < self.capacidad:
+                    try:
+                        lote.append(disponibles.get_nowait())
+                    except queue.Empty:
+                        break
+                if lote[-1] is fin:
+                    lote.pop()
+                    terminado = True
+                if lote:
+                    yield from resolver(lote)
+        finally:
+            detener.set()
+            # Libera al lector si está bloqueado en put
+            while not terminado:
+                try:
+                    terminado = disponibles.get(timeout=EMBEDDING_TIMEOUT) is fin
+                except queue.Empty:
+                    break
+
+    def resultado(self, futuro: Future, cuadro: np.ndarray, return_quality: bool = False, caja=None):
+        """
+        Resultado de un Future de submit(). Si el pool falla se extrae en el
+        proceso actual con la misma caja (sin volver a detectar el rostro).
+        """
+        try:
+            return futuro.result(timeout=EMBEDDING_TIMEOUT)
+        except Exception as e:
+            logger.error(f"Error en pool de extracción, se extrae en el proceso actual: {e}")
+            if isinstance(e, BrokenProcessPool):
+                self._reiniciar()
+            return self._en_linea(cuadro, return_quality, caja).result()
+
+    def _en_linea(self, cuadro, return_quality: bool, caja=None) -> Future:
+        from .inspireface_service import inspireface_service
+
+        futuro = Future()
+        try:
+            futuro.set_result(inspireface_service.get_face_embedding(cuadro, return_quality=return_quality, caja=caja))
+        except Exception as e:
+            futuro.set_exception(e)
+        return futuro
+
+
+# Instancia global (los procesos se inician en el primer submit)
+ejecutor_embeddings = EjecutorEmbeddings()
@@ -5,18 +5,47 @@ Descripcion: Servicio de conexion y operaciones con Firebase Firestore.
              Implementa CRUD de usuarios, gestion de eventos, registro
              de asistencias, y almacenamiento de vectores faciales.
              Reemplaza MySQL/Django ORM con base de datos NoSQL en la nube.
+             Marca cada escritura de usuario con fecha_actualizacion para
+             la sincronizacion incremental de la galeria biometrica.
+             Los vectores faciales llegan como arreglos float32 y se
+             convierten a listas solo al escribir en Firestore. La conexion
+             se abre en el primer uso del servicio, no al importar; el SDK
+             de Firebase Admin tambien se importa recien en ese momento.
 Fecha de creacion: 15 de Septiembre 2025
-Fecha de modificacion: 20 de Diciembre 2025
+Fecha de modificacion: 17 de Octubre 2026
 Autores:
     Roberto Leal
     William Tapia
 -----------------------------------------------------------------------------
 """
-import firebase_admin
-from firebase_admin import credentials, firestore, storage
 from datetime import datetime
 import base64
 import os
+import numpy as np
+
+from ..utils.perezoso import ServicioPerezoso
+
+# Campos cuya modificación cambia la plantilla biométrica del usuario
+CAMPOS_VECTORIALES = ('vector_facial', 'vector_promedio', 'vectores_faciales')
+
+# Campos de usuario que necesita la galería biométrica (excluye la imagen base64)
+CAMPOS_GALERIA = [
+    'nombre', 'rut', 'carrera', 'jornada', 'activo',
+    *CAMPOS_VECTORIALES,
+    'fecha_actualizacion', 'fecha_actualizacion_vector'
+]
+
+
+def vector_a_lista(valor):
+    """
+    Convierte vectores faciales (arreglos NumPy o listas de arreglos) a
+    listas de float nativos, el único formato que acepta Firestore.
+    """
+    if isinstance(valor, np.ndarray):
+        return valor.tolist()
+    if isinstance(valor, (list, tuple)):
+        return [vector_a_lista(v) if isinstance(v, np.ndarray) else v for v in valor]
+    return valor
 
 
 def get_default_profile_image():
@@ -51,11 +80,30 @@ class FirebaseService:
     
     def __init__(self):
         if not self._initialized:
+            self._observadores = []
             self.initialize()
             FirebaseService._initialized = True
     
+    def registrar_observador_usuarios(self, callback):
+        """
+        Registra un callback invocado como callback(rut, campos) cada vez que
+        este proceso crea o modifica un usuario.
+        """
+        self._observadores.append(callback)
+    
+    def _notificar_cambio_usuario(self, rut, campos):
+        """Notifica a los observadores un cambio en un usuario."""
+        for callback in self._observadores:
+            try:
+                callback(rut, campos)
+            except Exception as e:
+                print(f"Error notificando cambio de usuario: {e}")
+    
     def initialize(self):
         """Inicializa Firebase Admin SDK"""
+        import firebase_admin
+        from firebase_admin import credentials, firestore
+
         try:
             # Buscar archivo de credenciales
             cred_paths = [
@@ -100,11 +148,12 @@ class FirebaseService:
             carrera (str): Carrera del alumno
             jornada (str): 'D' (Diurna) o 'V' (Vespertina)
             imagen_base64 (str): Imagen en base64 (opcional)
-            vector_facial (list): Lista de 512 floats (opcional)
+            vector_facial (np.ndarray | list): Vector de 512 floats (opcional)
         
         Returns:
             dict: Usuario creado con ID
         """
+        vector_facial = vector_a_lista(vector_facial)
         try:
             # Verificar si ya existe
             if self.obtener_usuario_por_rut(rut):
@@ -118,6 +167,8 @@ class FirebaseService:
                 'imagen': imagen_base64,
                 'vector_facial': vector_facial,
                 'fecha_registro': datetime.now().isoformat(),
+                'fecha_actualizacion': datetime.now().isoformat(),
+                'fecha_actualizacion_vector': datetime.now().isoformat(),
                 'activo': True
             }
             
@@ -126,6 +177,7 @@ class FirebaseService:
             doc_ref.set(usuario_data)
             
             usuario_data['id'] = rut
+            self._notificar_cambio_usuario(rut, usuario_data)
             return usuario_data
             
         except Exception as e:
@@ -143,13 +195,15 @@ class FirebaseService:
             rut (str): RUT único
             carrera (str): Carrera del alumno
             jornada (str): 'D' (Diurna) o 'V' (Vespertina)
-            vectores_faciales (list): Lista de vectores faciales
-            vector_promedio (list): Vector promedio de todos
+            vectores_faciales (list | np.ndarray): Lista (o matriz) de vectores faciales
+            vector_promedio (np.ndarray | list): Vector promedio de todos
             imagen_base64 (str): Imagen en base64 (opcional)
         
         Returns:
             dict: Usuario creado con ID
         """
+        vectores_faciales = vector_a_lista(vectores_faciales)
+        vector_promedio = vector_a_lista(vector_promedio)
         try:
             # Verificar si ya existe
             if self.obtener_usuario_por_rut(rut):
@@ -165,6 +219,8 @@ class FirebaseService:
                 'vector_promedio': vector_promedio,
                 'cantidad_muestras': len(vectores_faciales) if vectores_faciales else 0,
                 'fecha_registro': datetime.now().isoformat(),
+                'fecha_actualizacion': datetime.now().isoformat(),
+                'fecha_actualizacion_vector': datetime.now().isoformat(),
                 'activo': True,
                 'tipo_registro': 'multiple'  # Para diferenciar de registros simples
             }
@@ -174,6 +230,7 @@ class FirebaseService:
             doc_ref.set(usuario_data)
             
             usuario_data['id'] = rut
+            self._notificar_cambio_usuario(rut, usuario_data)
             return usuario_data
             
         except Exception as e:
@@ -234,6 +291,36 @@ class FirebaseService:
             print(f"Error listando usuarios: {e}")
             return []
     
+    def listar_usuarios_galeria(self, desde=None):
+        """
+        Lista usuarios con solo los campos necesarios para el matching
+        (sin la imagen de perfil en base64).
+        
+        Args:
+            desde (str): Marca ISO opcional. Si se indica, retorna solo los
+                usuarios con fecha_actualizacion posterior (sincronización delta).
+        
+        Returns:
+            list: Lista de usuarios
+        """
+        try:
+            query = self.db.collection('usuarios').select(CAMPOS_GALERIA)
+            
+            if desde:
+                query = query.where('fecha_actualizacion', '>', desde)
+            
+            usuarios = []
+            for doc in query.stream():
+                data = doc.to_dict()
+                data['id'] = doc.id
+                usuarios.append(data)
+            
+            return usuarios
+            
+        except Exception as e:
+            print(f"Error listando usuarios para galería: {e}")
+            raise
+    
     def actualizar_usuario(self, rut, **campos):
         """
         Actualiza campos de un usuario.
@@ -251,7 +338,17 @@ class FirebaseService:
             if not doc_ref.get().exists:
                 raise ValueError(f"Usuario con RUT {rut} no existe")
             
+            # Marcas usadas por la galería biométrica para sincronizar deltas
+            # (fecha_actualizacion_vector distingue cambios de plantilla)
+            campos.setdefault('fecha_actualizacion', datetime.now().isoformat())
+            if any(campo in campos for campo in CAMPOS_VECTORIALES):
+                campos.setdefault('fecha_actualizacion_vector', campos['fecha_actualizacion'])
+                for campo in CAMPOS_VECTORIALES:
+                    if campo in campos:
+                        campos[campo] = vector_a_lista(campos[campo])
+            
             doc_ref.update(campos)
+            self._notificar_cambio_usuario(rut, campos)
             return True
             
         except Exception as e:
@@ -264,7 +361,7 @@ class FirebaseService:
         
         Args:
             rut (str): RUT del usuario
-            vector_facial (list): Vector de 512 floats
+            vector_facial (np.ndarray | list): Vector de 512 floats
         
         Returns:
             bool: True si se actualizó correctamente
@@ -342,6 +439,8 @@ class FirebaseService:
         Lista todos los eventos ordenados por fecha.
         """
         try:
+            from firebase_admin import firestore
+
             docs = self.db.collection('eventos').order_by('fecha', direction=firestore.Query.DESCENDING).stream()
             eventos = []
             for doc in docs:
@@ -591,6 +690,66 @@ class FirebaseService:
             print(f"Error registrando asistencia: {e}")
             raise
 
+    def registrar_asistencias_lote(self, id_evento, registros, metodo='biometrico'):
+        """
+        Registra la asistencia de varios usuarios a un evento con una sola
+        consulta de duplicados y una sola escritura por lotes (WriteBatch).
+
+        Args:
+            id_evento: ID del evento
+            registros: Lista de dicts con 'rut_usuario' y 'similitud'
+            metodo: Método de registro (manual, biometrico)
+
+        Returns:
+            Lista de dicts {'rut_usuario', 'status', ...} en el mismo orden,
+            con status 'registrada' o 'existe'
+        """
+        try:
+            ruts = list(dict.fromkeys(r['rut_usuario'] for r in registros))
+            if not ruts:
+                return []
+
+            # Asistencias ya existentes (el operador 'in' acepta hasta 30 valores)
+            existentes = {}
+            for i in range(0, len(ruts), 30):
+                docs = self.db.collection('asistencias')\
+                    .where('id_evento', '==', id_evento)\
+                    .where('rut_usuario', 'in', ruts[i:i + 30])\
+                    .stream()
+                for doc in docs:
+                    existentes.setdefault(doc.to_dict().get('rut_usuario'), doc.id)
+
+            batch = self.db.batch()
+            resultados = []
+            for registro in registros:
+                rut = registro['rut_usuario']
+                if rut in existentes:
+                    resultados.append({'rut_usuario': rut, 'status': 'existe', 'id': existentes[rut]})
+                    continue
+
+                asistencia_data = {
+                    'rut_usuario': rut,
+                    'id_evento': id_evento,
+                    'fecha_hora': datetime.now().isoformat(),
+                    'metodo': metodo,
+                    'similitud': registro.get('similitud'),
+                    'verificado': True
+                }
+                doc_ref = self.db.collection('asistencias').document()
+                batch.set(doc_ref, asistencia_data)
+
+                asistencia_data['id'] = doc_ref.id
+                existentes[rut] = doc_ref.id
+                resultados.append({'rut_usuario': rut, 'status': 'registrada', 'data': asistencia_data})
+
+            if any(r['status'] == 'registrada' for r in resultados):
+                batch.commit()
+            return resultados
+
+        except Exception as e:
+            print(f"Error registrando asistencias por lote: {e}")
+            raise
+
     def listar_asistencias(self, id_evento=None):
         """
         Lista asistencias, opcionalmente filtradas por evento.
@@ -604,6 +763,8 @@ class FirebaseService:
                 docs = ref.stream()
             else:
                 # Sin filtro, podemos ordenar directamente
+                from firebase_admin import firestore
+
                 docs = ref.order_by('fecha_hora', direction=firestore.Query.DESCENDING).stream()
             
             asistencias = []
@@ -631,4 +792,4 @@ class FirebaseService:
 
 
 # Instancia global del servicio
-firebase_service = FirebaseService()
+firebase_service = ServicioPerezoso(FirebaseService)
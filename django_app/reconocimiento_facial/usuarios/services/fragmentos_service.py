@@ -0,0 +1,322 @@
+"""
+-----------------------------------------------------------------------------
+Archivo: fragmentos_service.py
+Descripcion: Busqueda distribuida (scatter-gather) de la galeria biometrica
+             en procesos trabajadores. La matriz de plantillas y la mascara
+             de activos se copian una sola vez a memoria compartida
+             (/dev/shm, mapeada por todos los procesos) y se dividen en
+             GALLERY_SHARDS fragmentos contiguos, cada uno atendido siempre
+             por el mismo proceso. Cada consulta se reparte entre los
+             fragmentos, cada proceso retorna su top-k local y el
+             proceso principal mezcla los resultados. El segmento reserva
+             filas libres para que los deltas escriban solo sus filas, y
+             cada fila guarda el rango de versiones del indice que la ven.
+Fecha de creacion: 16 de Octubre 2026
+Fecha de modificacion: 17 de Octubre 2026
+Autores:
+    Roberto Leal
+    William Tapia
+-----------------------------------------------------------------------------
+"""
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+import atexit
+import multiprocessing
+import os
+import tempfile
+import threading
+import uuid
+import weakref
+import numpy as np
+
+from ..config import GALLERY_SHARDS, GALLERY_SHARDS_TIMEOUT
+from ..utils.cuantizacion import MatrizCuantizada
+from ..utils.logger import logger
+
+# Directorio respaldado por RAM (tmpfs) donde se crean los segmentos compartidos
+_DIRECTORIO_COMPARTIDO = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+
+# Alineación de cada arreglo dentro del segmento (tamaño de página)
+_ALINEACION = 4096
+
+# Generación de baja de una fila vigente (sin reemplazar)
+_SIN_BAJA = np.iinfo(np.int64).max
+
+Disposicion = Dict[str, Tuple[int, Tuple[int, ...], str]]
+
+
+def _crear_segmento(formas: Dict[str, Tuple[Tuple[int, ...], Any]]) -> Tuple[str, Disposicion]:
+    """
+    Crea un archivo nuevo en memoria compartida, en ceros, con espacio para
+    los arreglos indicados (nombre -> (forma, dtype)).
+
+    Returns:
+        Tupla (ruta, disposicion) con el offset, forma y dtype de cada arreglo
+    """
+    disposicion: Disposicion = {}
+    offset = 0
+    for nombre, (forma, tipo) in formas.items():
+        tipo = np.dtype(tipo)
+        disposicion[nombre] = (offset, tuple(forma), tipo.str)
+        offset += -(-max(int(np.prod(forma)) * tipo.itemsize, 1) // _ALINEACION) * _ALINEACION
+
+    ruta = os.path.join(_DIRECTORIO_COMPARTIDO, f'galeria-{os.getpid()}-{uuid.uuid4().hex[:12]}')
+    with open(ruta, 'wb') as f:
+        f.truncate(max(offset, 1))
+    return ruta, disposicion
+
+
+def _abrir_segmento(ruta: str, disposicion: Disposicion, modo: str = 'r') -> Dict[str, np.ndarray]:
+    """Mapea cada arreglo del segmento como np.memmap (sin copiar)."""
+    return {
+        nombre: np.memmap(ruta, dtype=np.dtype(tipo), mode=modo, offset=offset, shape=forma)
+        for nombre, (offset, forma, tipo) in disposicion.items()
+    }
+
+
+def _eliminar_segmento(ruta: str):
+    """Elimina el archivo del segmento; los mapeos existentes siguen siendo válidos."""
+    try:
+        os.unlink(ruta)
+    except FileNotFoundError:
+        pass
+
+
+def _matriz_de(vistas: Dict[str, np.ndarray]):
+    if 'escalas' in vistas:
+        return MatrizCuantizada(vistas['datos'], vistas['escalas'])
+    if vistas['datos'].dtype == np.float16:
+        return MatrizCuantizada(vistas['datos'])
+    return vistas['datos']
+
+
+# ==========================================
+# Proceso trabajador
+# ==========================================
+
+_segmento_abierto: Optional[Tuple[str, Dict[str, np.ndarray]]] = None
+
+
+def _segmento_en_trabajador(ruta: str, disposicion: Disposicion) -> Dict[str, np.ndarray]:
+    """
+    Mapeos del segmento en el proceso trabajador. Se conserva solo el
+    vigente: al llegar uno nuevo se suelta el anterior, cuyo archivo el
+    proceso principal ya eliminó.
+    """
+    global _segmento_abierto
+    if _segmento_abierto is None or _segmento_abierto[0] != ruta:
+        _segmento_abierto = None
+        _segmento_abierto = (ruta, _abrir_segmento(ruta, disposicion))
+    return _segmento_abierto[1]
+
+
+def _buscar_en_fragmento(
+    ruta: str,
+    disposicion: Disposicion,
+    generacion: int,
+    inicio: int,
+    fin: int,
+    consultas: np.ndarray,
+    k: int
+) -> np.ndarray:
+    """
+    Top-k local de cada consulta sobre las filas [inicio, fin) del segmento
+    que ve la versión `generacion` del índice.
+
+    Returns:
+        Filas (índices globales) elegidas por al menos una consulta
+    """
+    vistas = _segmento_en_trabajador(ruta, disposicion)
+    similitudes = _matriz_de(vistas)[inicio:fin] @ consultas.T
+    activos = (
+        vistas['activos'][inicio:fin]
+        & (vistas['alta'][inicio:fin] <= generacion)
+        & (vistas['baja'][inicio:fin] > generacion)
+    )
+    if not activos.all():
+        similitudes[~activos] = -np.inf
+
+    k = min(k, fin - inicio)
+    if k < fin - inicio:
+        mejores = np.argpartition(-similitudes, k - 1, axis=0)[:k]
+    else:
+        mejores = np.broadcast_to(np.arange(fin - inicio)[:, None], similitudes.shape)
+    elegidas = np.take_along_axis(similitudes, mejores, axis=0) > -np.inf
+    return inicio + np.unique(mejores[elegidas])
+
+
+# ==========================================
+# Proceso principal
+# ==========================================
+
+_ejecutores: List[ProcessPoolExecutor] = []
+_lock_ejecutor = threading.Lock()
+
+
+def obtener_ejecutores() -> List[ProcessPoolExecutor]:
+    """
+    Un proceso por fragmento (GALLERY_SHARDS), compartidos por todas las
+    versiones de la galería. El fragmento i se envía siempre al proceso i:
+    cada proceso mapea y mantiene en caché solo las páginas de sus filas.
+    """
+    with _lock_ejecutor:
+        if not _ejecutores:
+            # 'spawn': el proceso de Django tiene hilos (sincronización de galería)
+            contexto = multiprocessing.get_context('spawn')
+            _ejecutores.extend(
+                ProcessPoolExecutor(max_workers=1, mp_context=contexto) for _ in range(GALLERY_SHARDS)
+            )
+            logger.matching(f"Pool de búsqueda iniciado: {GALLERY_SHARDS} procesos")
+        return list(_ejecutores)
+
+
+def cerrar_ejecutores():
+    """
+    Detiene los procesos de búsqueda (el siguiente pedido crea otros). Un
+    proceso hijo de multiprocessing que los haya creado debe llamarla antes
+    de terminar: al salir espera a sus hijos y no ejecuta atexit.
+    """
+    with _lock_ejecutor:
+        for ejecutor in _ejecutores:
+            ejecutor.shutdown(wait=False, cancel_futures=True)
+        _ejecutores.clear()
+
+
+atexit.register(cerrar_ejecutores)
+
+
+class GaleriaFragmentada:
+    """
+    Matriz de plantillas de un IndiceGaleria en memoria compartida, dividida
+    en fragmentos contiguos que se puntúan en paralelo en el pool de procesos.
+
+    El segmento tiene `capacidad` filas y lo comparten las versiones
+    sucesivas del índice: cada delta escribe solo sus filas en filas libres
+    (`escribir`), sin volver a copiar la galería. `matriz` es la vista del
+    segmento que usa el índice; `activos` es la copia de la máscara que leen
+    los trabajadores. El archivo se elimina al recolectarse la última
+    versión del índice que lo usa: una búsqueda en curso retiene su versión,
+    así sus trabajadores nunca abren un segmento ya eliminado.
+
+    Cada versión del índice tiene una generación y cada fila es válida para
+    las generaciones [alta, baja). Un delta escribe en filas que ninguna
+    versión viva ve y retira las reemplazadas desde la generación nueva: una
+    búsqueda sobre una versión anterior sigue viendo exactamente su galería.
+    """
+
+    def __init__(
+        self,
+        matriz: Any,
+        filas: np.ndarray,
+        capacidad: int,
+        activos: np.ndarray,
+        fragmentos: int = GALLERY_SHARDS
+    ):
+        """Copia `matriz` a las `filas` indicadas de un segmento nuevo de `capacidad` filas."""
+        formas = {
+            'activos': ((capacidad,), bool),
+            'alta': ((capacidad,), np.int64),
+            'baja': ((capacidad,), np.int64),
+        }
+        if isinstance(matriz, MatrizCuantizada):
+            formas['datos'] = ((capacidad, matriz.shape[1]), matriz.datos.dtype)
+            if matriz.escalas is not None:
+                formas['escalas'] = ((capacidad,), np.float32)
+        else:
+            formas['datos'] = ((capacidad, matriz.shape[1]), np.float32)
+
+        self.ruta, self.disposicion = _crear_segmento(formas)
+        self.liberar = weakref.finalize(self, _eliminar_segmento, self.ruta)
+        self._vistas = _abrir_segmento(self.ruta, self.disposicion, 'r+')
+        self.matriz = _matriz_de(self._vistas)
+        self.activos = self._vistas['activos']
+        self.generacion = 0
+        self._vivas: Dict[int, int] = {}
+        self._lock = threading.Lock()
+        self.escribir(filas, matriz, activos, self.generacion)
+
+        limites = np.linspace(0, capacidad, max(1, min(fragmentos, capacidad)) + 1).astype(int).tolist()
+        self.rangos: List[Tuple[int, int]] = [
+            (a, b) for a, b in zip(limites[:-1], limites[1:]) if b > a
+        ]
+
+    def registrar_version(self, indice: Any, generacion: int):
+        """Cuenta `indice` como versión viva de la generación indicada hasta que se recolecte."""
+        with self._lock:
+            self._vivas[generacion] = self._vivas.get(generacion, 0) + 1
+        weakref.finalize(indice, self._soltar_version, generacion)
+
+    def _soltar_version(self, generacion: int):
+        with self._lock:
+            self._vivas[generacion] -= 1
+            if not self._vivas[generacion]:
+                del self._vivas[generacion]
+
+    def filas_reutilizables(self, inicio: int, fin: int) -> np.ndarray:
+        """Filas de [inicio, fin) que ninguna versión viva del índice ve."""
+        with self._lock:
+            minima = min(self._vivas, default=self.generacion)
+        return inicio + np.flatnonzero(self._vistas['baja'][inicio:fin] <= minima)
+
+    def escribir(self, filas: np.ndarray, matriz: Any, activos: np.ndarray, generacion: int):
+        """
+        Escribe en sitio las filas indicadas del segmento (plantillas y
+        máscara), válidas desde `generacion`. Las filas deben ser
+        reutilizables: se marcan antes de escribir para que ninguna versión
+        anterior las vea a medio escribir.
+        """
+        self._vistas['alta'][filas] = generacion
+        self._vistas['baja'][filas] = _SIN_BAJA
+        if isinstance(matriz, MatrizCuantizada):
+            self._vistas['datos'][filas] = matriz.datos
+            if 'escalas' in self._vistas:
+                self._vistas['escalas'][filas] = matriz.escalas
+        else:
+            self._vistas['datos'][filas] = matriz
+        self.activos[filas] = activos
+
+    def retirar(self, filas: np.ndarray, generacion: int):
+        """Las filas dejan de verse desde `generacion` (las versiones anteriores las conservan)."""
+        self._vistas['baja'][filas] = generacion
+
+    def preseleccion(
+        self,
+        consultas: np.ndarray,
+        inicio: int,
+        fin: int,
+        k: int,
+        generacion: int
+    ) -> Optional[np.ndarray]:
+        """
+        Reparte las consultas (Q, D) entre los fragmentos que intersectan
+        [inicio, fin) y une sus top-k locales sobre las filas que ve la
+        versión `generacion`. La unión contiene el top-k global exacto de
+        cada consulta.
+
+        Returns:
+            Filas candidatas, o None si el pool de procesos falló (el índice
+            puntúa entonces en el proceso principal)
+        """
+        consultas = np.ascontiguousarray(consultas, dtype=np.float32)
+        try:
+            ejecutores = obtener_ejecutores()
+            futuros = [
+                ejecutores[i % len(ejecutores)].submit(
+                    _buscar_en_fragmento, self.ruta, self.disposicion, generacion,
+                    max(a, inicio), min(b, fin), consultas, k
+                )
+                for i, (a, b) in enumerate(self.rangos)
+                if max(a, inicio) < min(b, fin)
+            ]
+            filas = [futuro.result(timeout=GALLERY_SHARDS_TIMEOUT) for futuro in futuros]
+        except FileNotFoundError:
+            # Búsqueda sobre una versión cuyo segmento ya se reemplazó y eliminó
+            return None
+        except Exception as e:
+            logger.error(f"Error en búsqueda fragmentada, se usa búsqueda local: {e}")
+            cerrar_ejecutores()
+            return None
+
+        if not filas:
+            return np.empty(0, dtype=np.int64)
+        return np.unique(np.concatenate(filas))
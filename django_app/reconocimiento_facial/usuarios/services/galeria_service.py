@@ -0,0 +1,205 @@
+"""
+-----------------------------------------------------------------------------
+Archivo: galeria_service.py
+Descripcion: Servicio de galeria biometrica del proceso. Carga Firestore una
+             vez (o abre el snapshot en disco con memmap) y luego aplica
+             solo los cambios (deltas) con intercambio atomico del indice
+             publicado (doble buffer), de modo que las busquedas en curso
+             nunca esperan a una recarga. El indice vive en indice_service,
+             el snapshot en snapshot_service y la combinacion snapshot +
+             delta en compuesto_service. El servicio se crea en su primer
+             uso, no al importar.
+Fecha de creacion: 16 de Octubre 2026
+Fecha de modificacion: 17 de Octubre 2026
+Autores:
+    Roberto Leal
+    William Tapia
+-----------------------------------------------------------------------------
+"""
+from typing import List, Dict, Optional, Any, Tuple
+from datetime import datetime, timedelta
+import os
+import threading
+import time
+
+from ..config import (
+    GALLERY_SYNC_INTERVAL,
+    GALLERY_SYNC_OVERLAP,
+    GALLERY_SNAPSHOT_DIR
+)
+from ..utils.logger import logger
+from ..utils.perezoso import ServicioPerezoso
+from .compuesto_service import IndiceCompuesto
+from .firebase_service import firebase_service
+from .indice_service import IndiceGaleria
+from .snapshot_service import ARCHIVO_METADATOS_SNAPSHOT, abrir_snapshot
+
+
+# Último índice construido a partir de una lista `usuarios_cache`.
+# Las vistas reutilizan la misma lista en todo el ciclo de reconocimiento,
+# por lo que la matriz se construye una sola vez por petición.
+_ultimo_indice: Tuple[Optional[List[Dict]], Optional[IndiceGaleria]] = (None, None)
+
+
+def indice_para_usuarios(usuarios: List[Dict[str, Any]]) -> IndiceGaleria:
+    """Retorna (y memoriza) el índice correspondiente a una lista de usuarios."""
+    global _ultimo_indice
+
+    cache, indice = _ultimo_indice
+    if usuarios is cache and indice is not None:
+        return indice
+
+    indice = IndiceGaleria.desde_usuarios(usuarios)
+    _ultimo_indice = (usuarios, indice)
+    return indice
+
+
+class GaleriaService:
+    """
+    Galería biométrica compartida por todo el proceso (singleton).
+
+    La primera consulta abre el snapshot en disco si existe (o, si no, carga
+    todos los usuarios desde Firestore); después solo se descargan los
+    documentos con `fecha_actualizacion` posterior a la última marca vista.
+
+    Cada sincronización construye un índice nuevo y lo publica con una sola
+    asignación (doble buffer), por lo que las búsquedas en curso nunca
+    esperan a una recarga.
+    """
+    _instance = None
+    _initialized = False
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(GaleriaService, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if not self._initialized:
+            self._indice: Optional[IndiceGaleria] = None
+            self._marca: Optional[str] = None
+            self._ultima_sync = 0.0
+            self._pendiente = False
+            self._lock_carga = threading.Lock()
+            self._lock_sync = threading.Lock()
+            firebase_service.registrar_observador_usuarios(self._on_usuario_modificado)
+            GaleriaService._initialized = True
+
+    def obtener_indice(self) -> IndiceGaleria:
+        """
+        Retorna el índice vigente. Solo bloquea en la primera carga; si el
+        índice está desactualizado, la sincronización corre en segundo plano.
+        """
+        indice = self._indice
+        if indice is None:
+            with self._lock_carga:
+                if self._indice is None:
+                    self._carga_inicial()
+            return self._indice
+
+        if self._pendiente or (time.time() - self._ultima_sync) > GALLERY_SYNC_INTERVAL:
+            self.sincronizar_en_segundo_plano()
+        return indice
+
+    def _carga_inicial(self):
+        """Abre el snapshot en disco y pide solo los deltas; si no hay, carga completa."""
+        if os.path.exists(os.path.join(GALLERY_SNAPSHOT_DIR, ARCHIVO_METADATOS_SNAPSHOT)):
+            try:
+                inicio = time.time()
+                base, marca = abrir_snapshot(GALLERY_SNAPSHOT_DIR)
+                self._marca = marca
+                self._publicar(IndiceCompuesto(base), [])
+                logger.storage(
+                    f"Galería abierta desde snapshot ({marca}): {len(base)} plantillas "
+                    f"en {(time.time() - inicio) * 1000:.0f} ms"
+                )
+                self.sincronizar_en_segundo_plano()
+                return
+            except Exception as e:
+                logger.warning(f"Snapshot de galería inválido, se carga desde Firestore: {e}")
+
+        self.recargar()
+
+    def recargar(self):
+        """Carga completa de la galería desde Firestore."""
+        inicio = time.time()
+        marca_carga = datetime.now().isoformat()
+        usuarios = firebase_service.listar_usuarios_galeria()
+        indice = IndiceGaleria.desde_usuarios(usuarios)
+        self._marca = marca_carga
+        self._publicar(indice, usuarios)
+        logger.storage(
+            f"Galería cargada: {len(indice)} plantillas en {(time.time() - inicio) * 1000:.0f} ms"
+        )
+
+    def sincronizar(self):
+        """Descarga y aplica los usuarios modificados desde la última marca."""
+        if self._indice is None:
+            self.recargar()
+            return
+
+        self._pendiente = False
+        usuarios = firebase_service.listar_usuarios_galeria(desde=self._desde())
+        indice = self._indice.aplicar_cambios(usuarios)
+        self._publicar(indice, usuarios)
+
+        if usuarios:
+            logger.storage(f"Galería sincronizada: {len(usuarios)} cambios, {len(indice)} plantillas")
+
+    def sincronizar_en_segundo_plano(self):
+        """Lanza una sincronización delta si no hay otra en curso."""
+        if not self._lock_sync.acquire(blocking=False):
+            return
+
+        def _tarea():
+            try:
+                self.sincronizar()
+            except Exception as e:
+                self._pendiente = True
+                logger.error(f"Error sincronizando galería: {e}")
+            finally:
+                self._ultima_sync = time.time()
+                self._lock_sync.release()
+
+        threading.Thread(target=_tarea, name='galeria-sync', daemon=True).start()
+
+    def _publicar(self, indice: IndiceGaleria, usuarios: List[Dict[str, Any]]):
+        """Publica el nuevo índice y avanza la marca de sincronización."""
+        indice.preparar_ann()
+        indice = indice.preparar_fragmentos()
+        marcas = [u.get('fecha_actualizacion') for u in usuarios if u.get('fecha_actualizacion')]
+        if self._marca:
+            marcas.append(self._marca)
+        if marcas:
+            self._marca = max(marcas)
+        # El índice anterior (y su segmento compartido, si se reconstruyó)
+        # se libera cuando terminan las búsquedas que aún lo usan
+        self._indice = indice
+        self._ultima_sync = time.time()
+
+    def _desde(self) -> Optional[str]:
+        """
+        Marca desde la que se piden deltas. Se retrocede un margen para cubrir
+        desfases de reloj entre workers; reaplicar un cambio es idempotente.
+        """
+        if not self._marca:
+            return None
+        try:
+            marca = datetime.fromisoformat(self._marca) - timedelta(seconds=GALLERY_SYNC_OVERLAP)
+            return marca.isoformat()
+        except ValueError:
+            return self._marca
+
+    def _on_usuario_modificado(self, rut, campos):
+        """Observador de FirebaseService: sincroniza apenas este proceso escribe."""
+        # Deshabilitar/eliminar (soft delete) se aplica al instante como tombstone
+        if self._indice is not None and 'activo' in campos:
+            self._indice.marcar_activo(rut, campos['activo'])
+
+        self._pendiente = True
+        if self._indice is not None:
+            self.sincronizar_en_segundo_plano()
+
+
+# Instancia global del servicio (se crea y se suscribe a Firebase en el primer uso)
+galeria_service = ServicioPerezoso(GaleriaService)
@@ -0,0 +1,793 @@
+"""
+-----------------------------------------------------------------------------
+Archivo: indice_service.py
+Descripcion: Indice vectorizado de la galeria biometrica. Mantiene una
+             matriz contigua float32 con las plantillas faciales
+             normalizadas de los usuarios, de modo que una consulta 1:N
+             se resuelve con un unico producto matriz-vector y una
+             seleccion top-k con argpartition. Las busquedas por lotes usan
+             un solo producto matriz-matriz. Soporta matching
+             multi-plantilla sobre vectores_faciales con agregacion
+             vectorizada por usuario (maximo o media top-k), almacenamiento
+             compacto float16/int8 y reordenamiento opcional en float32.
+             Las filas se ordenan por jornada para filtrar con cortes
+             contiguos y los deltas generan un indice nuevo sin reconvertir
+             las filas no afectadas. Para galerias grandes delega la
+             preseleccion en un indice aproximado (IVF o cascada PCA) o
+             reparte la busqueda exacta en procesos (GALLERY_SHARDS).
+Fecha de creacion: 16 de Octubre 2026
+Fecha de modificacion: 17 de Octubre 2026
+Autores:
+    Roberto Leal
+    William Tapia
+-----------------------------------------------------------------------------
+"""
+from typing import List, Dict, Optional, Any, Tuple, Union
+from itertools import groupby
+import numpy as np
+
+from ..config import (
+    MATCHING_BACKEND,
+    MATCHING_MODO,
+    MATCHING_TOPK_MUESTRAS,
+    MAX_MUESTRAS_POR_USUARIO,
+    GALLERY_DTYPE,
+    GALLERY_RERANK_CANDIDATOS,
+    GALLERY_SHARDS,
+    GALLERY_SHARDS_MIN_SIZE,
+    GALLERY_SHARDS_HOLGURA,
+    ANN_MIN_SIZE
+)
+from ..utils.cuantizacion import Matriz, cuantizar, tomar_filas, concatenar
+from ..utils.logger import logger
+from .ann_service import IndiceIVF, IndiceCascada
+from .fragmentos_service import GaleriaFragmentada
+from .firebase_service import CAMPOS_VECTORIALES
+
+
+def vector_de_usuario(usuario: Dict[str, Any]) -> Optional[Any]:
+    """
+    Retorna la plantilla principal de un usuario (lista o arreglo), o None.
+    Usa vector_promedio si existe, sino vector_facial (compatibilidad).
+    """
+    for campo in ('vector_promedio', 'vector_facial'):
+        vector = usuario.get(campo)
+        if vector is not None and len(vector):
+            return vector
+    return None
+
+
+def muestras_de_usuario(usuario: Dict[str, Any]) -> List[Any]:
+    """
+    Retorna las muestras individuales guardadas en `vectores_faciales`
+    (listas de floats o mapas con clave 'vector'), como máximo
+    MAX_MUESTRAS_POR_USUARIO repartidas uniformemente.
+    """
+    muestras = []
+    guardadas = usuario.get('vectores_faciales')
+    for muestra in (guardadas if guardadas is not None else []):
+        if isinstance(muestra, dict):
+            muestra = muestra.get('vector')
+        if muestra is not None and len(muestra):
+            muestras.append(muestra)
+
+    if len(muestras) > MAX_MUESTRAS_POR_USUARIO:
+        posiciones = np.linspace(0, len(muestras) - 1, MAX_MUESTRAS_POR_USUARIO).astype(int)
+        muestras = [muestras[i] for i in posiciones]
+    return muestras
+
+
+def normalizar_filas(vectores: Any) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Convierte vectores a una matriz float32 contigua L2-normalizada.
+
+    Returns:
+        Tupla (matriz_normalizada, normas_originales)
+    """
+    matriz = np.ascontiguousarray(np.array(vectores, dtype=np.float32))
+    normas = np.linalg.norm(matriz, axis=1).astype(np.float32)
+    divisor = np.where(normas > 0, normas, 1.0).astype(np.float32)
+    matriz /= divisor[:, None]
+    return matriz, normas
+
+
+def seleccionar_top_k(similitudes: np.ndarray, k: int) -> np.ndarray:
+    """Posiciones de las k similitudes mayores, ordenadas de mayor a menor."""
+    k = min(k, similitudes.shape[0])
+    if k < similitudes.shape[0]:
+        top = np.argpartition(-similitudes, k - 1)[:k]
+    else:
+        top = np.arange(similitudes.shape[0])
+    return top[np.argsort(-similitudes[top], kind='stable')]
+
+
+def clave_jornada(usuario: Dict[str, Any]) -> str:
+    """Clave de orden de las filas de la galería (una partición por jornada)."""
+    return usuario.get('jornada') or ''
+
+
+def particiones_por_jornada(usuarios: List[Dict[str, Any]]) -> Optional[Dict[str, Tuple[int, int]]]:
+    """
+    Rango [inicio, fin) de filas de cada jornada, o None si las filas de una
+    misma jornada no están contiguas.
+    """
+    particiones = {}
+    inicio = 0
+    for jornada, grupo in groupby(usuarios, key=clave_jornada):
+        fin = inicio + sum(1 for _ in grupo)
+        if jornada in particiones:
+            return None
+        particiones[jornada] = (inicio, fin)
+        inicio = fin
+    return particiones
+
+
+def usuario_hueco(jornada: str) -> Dict[str, Any]:
+    """Fila libre (sin usuario, inactiva) reservada dentro de la partición de una jornada."""
+    return {'rut': None, 'jornada': jornada, 'activo': False}
+
+
+def metadatos_de_usuario(usuario: Dict[str, Any]) -> Dict[str, Any]:
+    """Copia del usuario sin los campos vectoriales (pesados, no se conservan en la galería)."""
+    return {k: v for k, v in usuario.items() if k not in CAMPOS_VECTORIALES}
+
+
+def normalizar_consulta(vector: Any) -> Tuple[np.ndarray, float]:
+    """
+    Convierte un vector de consulta a float32 normalizado.
+
+    Returns:
+        Tupla (vector_normalizado, norma_original)
+    """
+    consulta = np.asarray(vector, dtype=np.float32).ravel()
+    norma = float(np.linalg.norm(consulta))
+    if norma > 0:
+        consulta = consulta / norma
+    return consulta, norma
+
+
+def normalizar_consultas(vectores: Any) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Versión por lotes de normalizar_consulta.
+
+    Returns:
+        Tupla (matriz (Q, D) normalizada, normas originales (Q,))
+    """
+    consultas = np.asarray(vectores, dtype=np.float32)
+    if consultas.ndim == 1:
+        consultas = consultas[None, :]
+    return normalizar_filas(consultas)
+
+
+def media_topk_por_segmento(similitudes: np.ndarray, inicios: np.ndarray, conteos: np.ndarray) -> np.ndarray:
+    """Media de las MATCHING_TOPK_MUESTRAS mejores similitudes de cada segmento."""
+    n = conteos.size
+    segmento = np.repeat(np.arange(n), conteos)
+    # Ordenar por segmento y, dentro de cada uno, por similitud descendente
+    orden = np.lexsort((-similitudes, segmento))
+    rango = np.arange(orden.size) - np.repeat(inicios, conteos)
+    elegidas = orden[rango < MATCHING_TOPK_MUESTRAS]
+    sumas = np.bincount(segmento[elegidas], weights=similitudes[elegidas], minlength=n)
+    return (sumas / np.minimum(conteos, MATCHING_TOPK_MUESTRAS)).astype(np.float32)
+
+
+class IndiceGaleria:
+    """
+    Índice en memoria de plantillas faciales.
+
+    Cada fila de `matriz` es la plantilla L2-normalizada de un usuario, por lo
+    que la similitud coseno contra todos los usuarios es `matriz @ consulta`.
+    Se guarda la norma original de cada plantilla para reconstruir la
+    distancia euclidiana exacta de los candidatos sin volver a los datos crudos.
+
+    Con MATCHING_BACKEND = 'ivf' o 'cascada' y una galería de al menos
+    ANN_MIN_SIZE plantillas, la preselección de candidatos se delega en un
+    IndiceIVF o IndiceCascada (y se puntúan en 512-d solo esos); bajo ese
+    tamaño se usa siempre la búsqueda exacta.
+
+    Las muestras individuales de cada usuario se guardan en `muestras`, con
+    las de la fila i en `muestras[inicio_muestras[i]:inicio_muestras[i + 1]]`
+    (si un usuario no tiene muestras se usa su plantilla principal). Así los
+    modos multi-plantilla puntúan todas las muestras con un solo producto y
+    agregan por segmento.
+
+    Las filas están ordenadas por jornada: filtrar por jornada es un corte
+    contiguo (`particiones`) y el estado activo es una máscara de bits
+    (`activos`) que se modifica en sitio, sin reconstruir la matriz.
+
+    Según GALLERY_DTYPE, `matriz` y `muestras` pueden estar en float16 o int8
+    (MatrizCuantizada). Los puntajes se calculan directamente sobre los
+    códigos (en int8, aplicando la escala de cada fila al resultado), sin
+    conservar una copia en mayor precisión. Con GALLERY_RERANK_CANDIDATOS > 0
+    un índice abierto desde snapshot reordena los mejores candidatos con
+    `referencia`: las filas float32 de referencia.npy mapeadas con memmap,
+    de las que solo se leen las de esos candidatos.
+
+    Con búsqueda fragmentada la matriz vive en un segmento compartido con
+    filas libres (huecos) al final de cada partición. Cada versión del
+    índice tiene su `generacion`: los trabajadores puntúan solo las filas
+    válidas para ella, y un delta escribe únicamente en huecos que ninguna
+    versión viva ve, porque un índice anterior aún puede estar buscando.
+    """
+
+    def __init__(
+        self,
+        usuarios: List[Dict[str, Any]],
+        matriz: Matriz,
+        normas: np.ndarray,
+        muestras: Optional[Matriz] = None,
+        inicio_muestras: Optional[np.ndarray] = None,
+        referencia: Optional[np.ndarray] = None
+    ):
+        self.usuarios = usuarios
+        self.matriz = matriz
+        self.normas = normas
+        self.referencia = referencia
+        if muestras is None:
+            muestras = matriz
+            inicio_muestras = np.arange(len(usuarios) + 1, dtype=np.int64)
+        self.muestras = muestras
+        self.inicio_muestras = inicio_muestras
+        self.ruts = [u.get('rut') for u in usuarios]
+        self.activos = np.array([bool(u.get('activo', True)) for u in usuarios], dtype=bool)
+        self.particiones = particiones_por_jornada(usuarios)
+        self.fila_por_rut = {rut: fila for fila, rut in enumerate(self.ruts) if rut is not None}
+        self.ann: Optional[Union[IndiceIVF, IndiceCascada]] = None
+        self.fragmentos: Optional[GaleriaFragmentada] = None
+        self.generacion: Optional[int] = None
+
+    @classmethod
+    def desde_usuarios(cls, usuarios: List[Dict[str, Any]], conservar_referencia: bool = False) -> 'IndiceGaleria':
+        """
+        Construye el índice a partir de documentos de usuario de Firebase.
+        Los usuarios sin vector facial se omiten.
+
+        Args:
+            conservar_referencia: Con almacenamiento cuantizado, conservar
+                también las plantillas float32 para guardarlas en el snapshot
+                (solo al exportar; los workers las leen del disco)
+        """
+        usuarios = sorted(usuarios, key=clave_jornada)
+        seleccionados = []
+        vectores = []
+        muestras = []
+        conteos = []
+
+        for usuario in usuarios:
+            vector = vector_de_usuario(usuario)
+            if vector is None:
+                logger.warning(f"Usuario {usuario.get('nombre')} no tiene vector facial")
+                continue
+            seleccionados.append(metadatos_de_usuario(usuario))
+            vectores.append(vector)
+
+            propias = muestras_de_usuario(usuario) or [vector]
+            muestras.extend(propias)
+            conteos.append(len(propias))
+
+        if not vectores:
+            return cls([], np.zeros((0, 0), dtype=np.float32), np.zeros(0, dtype=np.float32))
+
+        matriz, normas = normalizar_filas(vectores)
+        referencia = matriz if conservar_referencia and GALLERY_DTYPE != 'float32' else None
+        if len(muestras) == len(vectores):
+            matriz = cuantizar(matriz, GALLERY_DTYPE)
+            matriz_muestras = matriz
+        else:
+            matriz_muestras = cuantizar(normalizar_filas(muestras)[0], GALLERY_DTYPE)
+            matriz = cuantizar(matriz, GALLERY_DTYPE)
+        inicio_muestras = np.concatenate([[0], np.cumsum(conteos)]).astype(np.int64)
+
+        return cls(seleccionados, matriz, normas, matriz_muestras, inicio_muestras, referencia)
+
+    @classmethod
+    def desde_matriz(
+        cls,
+        usuarios: List[Dict[str, Any]],
+        vectores: np.ndarray,
+        conservar_referencia: bool = False
+    ) -> 'IndiceGaleria':
+        """
+        Construye el índice desde metadatos de usuario y una matriz (N, D) con
+        una plantilla por usuario, sin pasar por listas de Python (galerías
+        sintéticas y benchmarks). `conservar_referencia` como en desde_usuarios.
+        """
+        claves = [clave_jornada(u) for u in usuarios]
+        orden = np.array(sorted(range(len(claves)), key=claves.__getitem__), dtype=np.int64)
+        matriz, normas = normalizar_filas(np.asarray(vectores, dtype=np.float32)[orden])
+        return cls(
+            [metadatos_de_usuario(usuarios[i]) for i in orden.tolist()],
+            cuantizar(matriz, GALLERY_DTYPE),
+            normas,
+            referencia=matriz if conservar_referencia and GALLERY_DTYPE != 'float32' else None
+        )
+
+    def __len__(self) -> int:
+        return len(self.usuarios)
+
+    def aplicar_cambios(self, usuarios: List[Dict[str, Any]]) -> 'IndiceGaleria':
+        """
+        Retorna un nuevo índice con los usuarios indicados insertados o
+        reemplazados. Las filas no afectadas se copian tal cual, sin volver a
+        convertir sus vectores.
+
+        Los cambios que no tocan la plantilla ni la jornada (por ejemplo
+        habilitar/deshabilitar) solo actualizan metadatos y la máscara de
+        activos en sitio; si todos los cambios son de ese tipo se retorna el
+        mismo índice, sin reconstruir nada.
+        """
+        usuarios = [u for u in usuarios if not self.actualizar_metadatos(u)]
+        if not usuarios:
+            return self
+
+        cambiados = {u.get('rut') for u in usuarios}
+        nuevos = IndiceGaleria.desde_usuarios(usuarios)
+        if self.fragmentos is not None and self.ann is None:
+            indice = self._aplicar_en_segmento(cambiados, nuevos)
+            if indice is not None:
+                return indice
+            logger.matching("Sin filas libres en el segmento compartido: se reconstruye la galería")
+
+        # Los huecos del segmento compartido no se copian al índice nuevo
+        conservar = np.array([rut is not None and rut not in cambiados for rut in self.ruts], dtype=bool)
+
+        if len(self) == 0:
+            return nuevos
+
+        filas = np.flatnonzero(conservar)
+        filas_muestras, conteos = self._filas_muestras(filas)
+        conteos = np.concatenate([conteos, np.diff(nuevos.inicio_muestras)])
+        usuarios_nuevos = [self.usuarios[i] for i in filas.tolist()] + nuevos.usuarios
+
+        if len(nuevos) == 0:
+            matriz = tomar_filas(self.matriz, filas)
+            normas = self.normas[filas]
+            muestras = tomar_filas(self.muestras, filas_muestras)
+        else:
+            matriz = concatenar([tomar_filas(self.matriz, filas), nuevos.matriz])
+            normas = np.concatenate([self.normas[filas], nuevos.normas])
+            muestras = concatenar([tomar_filas(self.muestras, filas_muestras), nuevos.muestras])
+
+        # Sin muestras adicionales las muestras son la propia matriz: no duplicar
+        if self.muestras is self.matriz and nuevos.muestras is nuevos.matriz:
+            muestras = matriz
+
+        inicio_muestras = np.concatenate([[0], np.cumsum(conteos)]).astype(np.int64)
+        indice = IndiceGaleria(usuarios_nuevos, matriz, normas, muestras, inicio_muestras)
+
+        # Inserción incremental en las listas invertidas existentes
+        if self.ann is not None:
+            indice.ann = self.ann.derivar(filas, nuevos.matriz)
+        return indice.ordenado_por_jornada()
+
+    def _aplicar_en_segmento(self, cambiados: set, nuevos: 'IndiceGaleria') -> Optional['IndiceGaleria']:
+        """
+        Aplica un delta sobre el segmento compartido: las filas de los
+        usuarios nuevos se escriben en huecos de su jornada y las de los
+        usuarios cambiados quedan vacías desde la generación nueva. Solo se
+        copian las filas del delta (más los metadatos por fila, que son
+        privados de cada versión).
+
+        Returns:
+            El índice nuevo, o None si este no es la última versión del
+            segmento o alguna jornada no tiene huecos suficientes (hay que
+            reconstruir el segmento)
+        """
+        if self.generacion != self.fragmentos.generacion:
+            return None
+
+        destinos = np.empty(len(nuevos), dtype=np.int64)
+        for jornada, (a, b) in (nuevos.particiones or {}).items():
+            if jornada not in self.particiones:
+                return None
+            candidatas = self.fragmentos.filas_reutilizables(*self.particiones[jornada])
+            if candidatas.size < b - a:
+                return None
+            destinos[a:b] = candidatas[:b - a]
+
+        liberadas = np.array(
+            sorted(self.fila_por_rut[rut] for rut in cambiados if rut in self.fila_por_rut),
+            dtype=np.int64
+        )
+        usuarios = list(self.usuarios)
+        for fila in liberadas.tolist():
+            usuarios[fila] = usuario_hueco(clave_jornada(self.usuarios[fila]))
+        for fila, usuario in zip(destinos.tolist(), nuevos.usuarios):
+            usuarios[fila] = usuario
+
+        normas = self.normas.copy()
+        normas[liberadas] = 0.0
+        normas[destinos] = nuevos.normas
+
+        if self.muestras is self.matriz and nuevos.muestras is nuevos.matriz:
+            muestras, inicio_muestras = None, None
+        else:
+            # Las muestras son privadas: se rearman tomando cada segmento de
+            # las muestras actuales, las del delta o una fila en cero (huecos)
+            total, total_nuevos = len(self.muestras), len(nuevos.muestras)
+            inicios = self.inicio_muestras[:-1].copy()
+            conteos = np.diff(self.inicio_muestras)
+            inicios[liberadas] = total + total_nuevos
+            conteos[liberadas] = 1
+            inicios[destinos] = total + nuevos.inicio_muestras[:-1]
+            conteos[destinos] = np.diff(nuevos.inicio_muestras)
+            desplazamientos = np.arange(int(conteos.sum())) - np.repeat(np.cumsum(conteos) - conteos, conteos)
+            origen = concatenar([
+                self.muestras, nuevos.muestras, np.zeros((1, self.dimension), dtype=np.float32)
+            ])
+            muestras = tomar_filas(origen, np.repeat(inicios, conteos) + desplazamientos)
+            inicio_muestras = np.concatenate([[0], np.cumsum(conteos)]).astype(np.int64)
+
+        generacion = self.generacion + 1
+        self.fragmentos.escribir(destinos, nuevos.matriz, nuevos.activos, generacion)
+        self.fragmentos.retirar(liberadas, generacion)
+        self.fragmentos.generacion = generacion
+
+        indice = IndiceGaleria(usuarios, self.matriz, normas, muestras, inicio_muestras)
+        indice.fragmentos = self.fragmentos
+        indice.generacion = generacion
+        self.fragmentos.registrar_version(indice, generacion)
+        return indice
+
+    def ordenado_por_jornada(self) -> 'IndiceGaleria':
+        """Retorna el índice con las filas agrupadas por jornada (o el mismo si ya lo están)."""
+        if self.particiones is not None:
+            return self
+
+        claves = [clave_jornada(u) for u in self.usuarios]
+
+        orden = np.array(sorted(range(len(claves)), key=claves.__getitem__), dtype=np.int64)
+        filas_muestras, conteos = self._filas_muestras(orden)
+        matriz = tomar_filas(self.matriz, orden)
+        muestras = matriz if self.muestras is self.matriz else tomar_filas(self.muestras, filas_muestras)
+
+        indice = IndiceGaleria(
+            [self.usuarios[i] for i in orden.tolist()],
+            matriz,
+            self.normas[orden],
+            muestras,
+            np.concatenate([[0], np.cumsum(conteos)]).astype(np.int64)
+        )
+        if self.ann is not None:
+            indice.ann = self.ann.permutar(orden)
+        return indice
+
+    def es_cambio_de_metadatos(self, usuario: Dict[str, Any]) -> bool:
+        """
+        True si el usuario ya está en la galería con la misma plantilla
+        (misma fecha_actualizacion_vector) y la misma jornada.
+        """
+        fila = self.fila_por_rut.get(usuario.get('rut'))
+        if fila is None or vector_de_usuario(usuario) is None:
+            return False
+        actual = self.usuarios[fila]
+        return (
+            actual.get('fecha_actualizacion_vector') == usuario.get('fecha_actualizacion_vector')
+            and clave_jornada(actual) == clave_jornada(usuario)
+        )
+
+    def actualizar_metadatos(self, usuario: Dict[str, Any]) -> bool:
+        """
+        Aplica en sitio un cambio que no afecta la plantilla (nombre, carrera,
+        activo...). Retorna False si el cambio requiere reconstruir filas.
+        """
+        if not self.es_cambio_de_metadatos(usuario):
+            return False
+        fila = self.fila_por_rut[usuario.get('rut')]
+        self.usuarios[fila].update(metadatos_de_usuario(usuario))
+        self._marcar_fila(fila, bool(usuario.get('activo', True)))
+        return True
+
+    def _marcar_fila(self, fila: int, activo: bool):
+        """Actualiza la máscara de activos (y la copia que leen los trabajadores)."""
+        self.activos[fila] = activo
+        if self.fragmentos is not None:
+            self.fragmentos.activos[fila] = activo
+
+    def _filas_muestras(self, filas: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Filas de `muestras` pertenecientes a los usuarios indicados (en orden)
+        y la cantidad de muestras de cada uno.
+        """
+        inicios = self.inicio_muestras[filas]
+        conteos = self.inicio_muestras[filas + 1] - inicios
+        total = int(conteos.sum())
+        # Para cada muestra: inicio de su segmento + posición dentro del segmento
+        desplazamientos = np.arange(total) - np.repeat(np.cumsum(conteos) - conteos, conteos)
+        return np.repeat(inicios, conteos) + desplazamientos, conteos
+
+    def puntajes_multiplantilla(
+        self,
+        consulta: np.ndarray,
+        modo: str,
+        inicio: int = 0,
+        fin: Optional[int] = None
+    ) -> np.ndarray:
+        """
+        Puntaje agregado por usuario sobre todas sus muestras.
+
+        Args:
+            consulta: Vector de consulta normalizado (D,) o lote de consultas
+                traspuesto (D, Q)
+            modo: 'max' (mejor muestra) o 'topk_media' (media de las
+                MATCHING_TOPK_MUESTRAS mejores muestras)
+            inicio, fin: Rango de filas a puntuar (por defecto toda la galería)
+
+        Returns:
+            Array (fin - inicio,) o (fin - inicio, Q) con un puntaje por fila del rango
+        """
+        fin = len(self) if fin is None else fin
+        limites = self.inicio_muestras[inicio:fin + 1]
+        similitudes = self.muestras[limites[0]:limites[-1]] @ consulta
+        inicios = limites[:-1] - limites[0]
+
+        if modo == 'max':
+            return np.maximum.reduceat(similitudes, inicios, axis=0)
+
+        if modo == 'topk_media':
+            conteos = np.diff(limites)
+            if similitudes.ndim == 1:
+                return media_topk_por_segmento(similitudes, inicios, conteos)
+            return np.stack([
+                media_topk_por_segmento(similitudes[:, j], inicios, conteos)
+                for j in range(similitudes.shape[1])
+            ], axis=1)
+
+        raise ValueError(f"Modo de matching desconocido: {modo}")
+
+    def preparar_ann(self):
+        """
+        Entrena (o descarta) el índice aproximado según el backend configurado
+        y el tamaño de la galería.
+        """
+        if MATCHING_BACKEND not in ('ivf', 'cascada') or len(self) < ANN_MIN_SIZE:
+            self.ann = None
+            return
+        clase = IndiceIVF if MATCHING_BACKEND == 'ivf' else IndiceCascada
+        if not isinstance(self.ann, clase) or self.ann.requiere_reentrenamiento(len(self)):
+            self.ann = clase.entrenar(self.matriz)
+
+    def preparar_fragmentos(self) -> 'IndiceGaleria':
+        """
+        Con GALLERY_SHARDS > 1 mueve la matriz a memoria compartida y reparte
+        la búsqueda exacta entre procesos. Solo aplica a galerías grandes sin
+        índice aproximado.
+
+        Returns:
+            El índice a publicar: el mismo, o una copia en un segmento nuevo
+            con GALLERY_SHARDS_HOLGURA filas libres por jornada
+        """
+        if (
+            self.fragmentos is not None
+            or self.ann is not None
+            or GALLERY_SHARDS <= 1
+            or len(self) < GALLERY_SHARDS_MIN_SIZE
+        ):
+            return self
+
+        usuarios, destinos, conteos, partes = [], [], [], []
+        for jornada, (inicio, fin) in self.particiones.items():
+            huecos = int(np.ceil((fin - inicio) * GALLERY_SHARDS_HOLGURA))
+            destinos.append(np.arange(len(usuarios), len(usuarios) + fin - inicio))
+            usuarios += self.usuarios[inicio:fin] + [usuario_hueco(jornada) for _ in range(huecos)]
+            conteos += [np.diff(self.inicio_muestras[inicio:fin + 1]), np.ones(huecos, dtype=np.int64)]
+            partes += [
+                self.muestras[self.inicio_muestras[inicio]:self.inicio_muestras[fin]],
+                np.zeros((huecos, self.dimension), dtype=np.float32)
+            ]
+        destinos = np.concatenate(destinos)
+        capacidad = len(usuarios)
+
+        fragmentos = GaleriaFragmentada(self.matriz, destinos, capacidad, self.activos, GALLERY_SHARDS)
+        normas = np.zeros(capacidad, dtype=np.float32)
+        normas[destinos] = self.normas
+        if self.muestras is self.matriz:
+            muestras, inicio_muestras = None, None
+        else:
+            muestras = concatenar(partes)
+            inicio_muestras = np.concatenate([[0], np.cumsum(np.concatenate(conteos))]).astype(np.int64)
+
+        indice = IndiceGaleria(usuarios, fragmentos.matriz, normas, muestras, inicio_muestras)
+        indice.activos[destinos] = self.activos
+        indice.fragmentos = fragmentos
+        indice.generacion = fragmentos.generacion
+        fragmentos.registrar_version(indice, indice.generacion)
+        logger.matching(
+            f"Galería en memoria compartida: {len(self)} plantillas, {capacidad - len(self)} filas libres"
+        )
+        return indice
+
+    def marcar_activo(self, rut: str, activo: bool) -> bool:
+        """
+        Cambia el estado activo de un usuario en sitio (tombstone), sin
+        reconstruir la matriz ni las listas invertidas.
+
+        Returns:
+            True si el RUT está en la galería
+        """
+        fila = self.fila_por_rut.get(rut)
+        if fila is None:
+            return False
+        self.usuarios[fila]['activo'] = bool(activo)
+        self._marcar_fila(fila, bool(activo))
+        return True
+
+    def memoria_bytes(self) -> int:
+        """Bytes ocupados por las matrices de plantillas del índice."""
+        total = self.matriz.nbytes + self.normas.nbytes
+        if self.muestras is not self.matriz:
+            total += self.muestras.nbytes
+        # La referencia del snapshot es memmap: no ocupa memoria del proceso
+        if self.referencia is not None and not isinstance(self.referencia, np.memmap):
+            total += self.referencia.nbytes
+        return int(total)
+
+    @property
+    def dimension(self) -> int:
+        return self.matriz.shape[1] if self.matriz.ndim == 2 else 0
+
+    def rango_jornada(self, jornada: Optional[str] = None) -> Tuple[int, int]:
+        """Rango [inicio, fin) de filas de la jornada (toda la galería si no se indica)."""
+        if not jornada:
+            return 0, len(self)
+        return self.particiones.get(jornada, (0, 0))
+
+    def mascara(self, jornada: Optional[str] = None) -> np.ndarray:
+        """Máscara booleana de filas elegibles (activas y de la jornada pedida)."""
+        inicio, fin = self.rango_jornada(jornada)
+        if (inicio, fin) == (0, len(self)):
+            return self.activos
+        mascara = np.zeros(len(self), dtype=bool)
+        mascara[inicio:fin] = self.activos[inicio:fin]
+        return mascara
+
+    def buscar(
+        self,
+        vector_consulta: Any,
+        k: int = 5,
+        jornada: Optional[str] = None,
+        nprobe: Optional[int] = None,
+        modo: Optional[str] = None
+    ) -> Tuple[List[Dict[str, Any]], int]:
+        """
+        Busca las k plantillas más similares a la consulta.
+
+        Args:
+            vector_consulta: Vector facial de consulta (lista o array)
+            k: Cantidad de candidatos a retornar
+            jornada: Opcional - Filtrar por jornada
+            nprobe: Opcional - Listas IVF a recorrer (más listas = más recall, más latencia)
+            modo: Opcional - 'plantilla' (vector principal), 'max' o 'topk_media'
+                (multi-plantilla). Por defecto MATCHING_MODO.
+
+        Returns:
+            Tupla (candidatos, total_comparaciones). Cada candidato es un dict
+            con 'usuario', 'similitud' y 'distancia', ordenados por similitud
+            descendente.
+        """
+        consulta = np.asarray(vector_consulta, dtype=np.float32).ravel()
+        resultados, total = self.buscar_lote(consulta[None, :], k, jornada, nprobe, modo)
+        return resultados[0], total
+
+    def buscar_lote(
+        self,
+        consultas: Any,
+        k: int = 5,
+        jornada: Optional[str] = None,
+        nprobe: Optional[int] = None,
+        modo: Optional[str] = None
+    ) -> Tuple[List[List[Dict[str, Any]]], int]:
+        """
+        Busca las k plantillas más similares para cada consulta de un lote
+        (por ejemplo, todos los rostros de un cuadro) con un único producto
+        matriz-matriz contra la galería.
+
+        Args:
+            consultas: Matriz (Q, D) de vectores faciales
+            k, jornada, nprobe, modo: Igual que en buscar()
+
+        Returns:
+            Tupla (candidatos por consulta, total_comparaciones)
+        """
+        consultas, normas = normalizar_consultas(consultas)
+        q = consultas.shape[0]
+
+        inicio, fin = self.rango_jornada(jornada)
+        activos = self.activos[inicio:fin]
+        if q == 0 or not activos.any():
+            return [[] for _ in range(q)], 0
+
+        if consultas.shape[1] != self.dimension:
+            raise ValueError(
+                f"Dimensión de consulta {consultas.shape[1]} no coincide con la galería ({self.dimension})"
+            )
+
+        modo = modo or MATCHING_MODO
+        traspuestas = np.ascontiguousarray(consultas.T)
+        filas = None
+        total = None
+        if modo == 'plantilla' and self.ann is not None:
+            # Preselección aproximada (listas IVF o cascada) y puntaje exacto
+            filas = self.ann.preseleccion(consultas, self.mascara(jornada), nprobe)
+        elif modo == 'plantilla' and self.fragmentos is not None:
+            # Top-k local de cada fragmento en su proceso; aquí solo se mezclan
+            filas = self.fragmentos.preseleccion(consultas, inicio, fin, k, self.generacion)
+            if filas is not None:
+                # Los cambios de activo en sitio escriben la máscara del
+                # segmento, compartida entre versiones: vale la de este índice
+                filas = filas[self.activos[filas]]
+            total = int(activos.sum())
+
+        if filas is not None:
+            similitudes = self.matriz[filas] @ traspuestas
+        else:
+            # La partición es un corte contiguo: el producto no copia filas
+            if modo == 'plantilla':
+                similitudes = self.matriz[inicio:fin] @ traspuestas
+            else:
+                similitudes = self.puntajes_multiplantilla(traspuestas, modo, inicio, fin)
+            if activos.all():
+                filas = np.arange(inicio, fin)
+            else:
+                locales = np.flatnonzero(activos)
+                filas = inicio + locales
+                similitudes = similitudes[locales]
+
+        if filas.size == 0:
+            return [[] for _ in range(q)], 0
+        total = int(filas.size) if total is None else total
+
+        resultados = [
+            self._mejores(filas, similitudes[:, j], consultas[j], float(normas[j]), k, modo)
+            for j in range(q)
+        ]
+        return resultados, total
+
+    def _mejores(
+        self,
+        filas: np.ndarray,
+        similitudes: np.ndarray,
+        consulta: np.ndarray,
+        norma_consulta: float,
+        k: int,
+        modo: str
+    ) -> List[Dict[str, Any]]:
+        """Top-k de una consulta a partir de sus similitudes sobre `filas`."""
+        # Reordenar los mejores candidatos con las filas float32 del snapshot
+        if modo == 'plantilla' and self.referencia is not None and GALLERY_RERANK_CANDIDATOS > 0:
+            preseleccion = seleccionar_top_k(similitudes, max(k, GALLERY_RERANK_CANDIDATOS))
+            filas = filas[preseleccion]
+            similitudes = np.asarray(self.referencia[filas], dtype=np.float32) @ consulta
+
+        top = seleccionar_top_k(similitudes, k)
+        filas_top = filas[top]
+
+        # La distancia se reporta siempre respecto de la plantilla principal
+        coseno = similitudes[top] if modo == 'plantilla' else self.matriz[filas_top] @ consulta
+
+        return self._candidatos(filas_top, similitudes[top], coseno, norma_consulta)
+
+    def _candidatos(
+        self,
+        filas: np.ndarray,
+        similitudes: np.ndarray,
+        coseno: np.ndarray,
+        norma_consulta: float
+    ) -> List[Dict[str, Any]]:
+        """
+        Arma los dicts de candidatos. La distancia euclidiana se calcula a
+        partir de las normas: |a - b|^2 = |a|^2 + |b|^2 - 2|a||b|cos.
+        """
+        normas = self.normas[filas].astype(np.float64)
+        coseno = coseno.astype(np.float64)
+        cuadrado = norma_consulta ** 2 + normas ** 2 - 2.0 * norma_consulta * normas * coseno
+        distancias = np.sqrt(np.maximum(cuadrado, 0.0))
+
+        return [
+            {
+                'usuario': self.usuarios[fila],
+                'similitud': float(min(1.0, max(0.0, similitud))),
+                'distancia': float(distancia)
+            }
+            for fila, similitud, distancia in zip(filas.tolist(), similitudes.tolist(), distancias.tolist())
+        ]
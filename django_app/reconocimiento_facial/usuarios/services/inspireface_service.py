@@ -5,22 +5,62 @@ Descripcion: Servicio singleton para el SDK InspireFace. Proporciona
              deteccion de rostros, extraccion de vectores faciales de
              512 dimensiones, y evaluacion de calidad de imagen.
              Actua como interfaz entre Django y el motor de IA biometrico.
+             Mantiene un pool de sesiones nativas para atender peticiones
+             concurrentes en paralelo. La deteccion corre sobre un proxy
+             reducido y cada rostro se extrae de un recorte a resolucion
+             completa (opcionalmente, los grandes del mismo proxy).
+             Para video ofrece sesiones de seguimiento (LIGHT_TRACK) que solo
+             ejecutan el detector completo cada TRACK_DETECT_INTERVAL cuadros.
+             get_face_embeddings_batch procesa lotes de imagenes repartidos
+             entre las sesiones del pool. Los embeddings se retornan como
+             arreglos float32 (sin listas de Python). Un filtro de calidad
+             barato descarta rostros de video antes de la extraccion
+             (filtrar_calidad; las fotos fijas no lo usan). Los modelos se
+             cargan en el primer uso (o con calentar()), no al importar; el
+             SDK y OpenCV tambien se importan recien en ese momento.
 Fecha de creacion: 05 de Octubre 2025
-Fecha de modificacion: 20 de Diciembre 2025
+Fecha de modificacion: 17 de Octubre 2026
 Autores:
     Roberto Leal
     William Tapia
 -----------------------------------------------------------------------------
 """
-import inspireface as isf
-import cv2
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+import queue
+import threading
+import time
 import numpy as np
 
+from ..config import (
+    DETECTION_CONFIDENCE_THRESHOLD,
+    DETECTION_CROP_MARGIN,
+    DETECTION_PROXY_ALIGN_SIZE,
+    DETECTION_PROXY_MIN_FACE_PIXEL_SIZE,
+    DETECTION_PROXY_WIDTH,
+    DIMENSION_EMBEDDING,
+    INSPIREFACE_POOL_SIZE,
+    INSPIREFACE_POOL_TIMEOUT,
+    MIN_FACE_PIXEL_SIZE,
+    MIN_FACE_QUALITY,
+    QUALITY_ANCHO_RECORTE,
+    QUALITY_BRILLO_MAX,
+    QUALITY_BRILLO_MIN,
+    QUALITY_NITIDEZ_REFERENCIA,
+    TRACK_DETECT_INTERVAL,
+    VIDEO_RESOLUTION,
+)
+from ..utils.perezoso import ServicioPerezoso
+
 
 class InspireFaceService:
     """
     Servicio singleton para el SDK de InspireFace.
     Proporciona detección de rostros, extracción de características y evaluación de calidad.
+
+    Cada sesión nativa la usa un solo hilo a la vez: los métodos toman una
+    sesión del pool (checkout) y la devuelven al terminar (checkin).
     """
     _instance = None
     _initialized = False
@@ -36,7 +76,9 @@ class InspireFaceService:
             self._initialized = True
 
     def _initialize_sdk(self):
-        """Inicializa el SDK de InspireFace y la sesión con configuración óptima"""
+        """Inicializa el SDK de InspireFace y el pool de sesiones"""
+        import inspireface as isf
+
         print("🚀 Inicializando SDK InspireFace...")
         
         # Inicializar SDK globalmente
@@ -44,62 +86,316 @@ class InspireFaceService:
         if not ret:
             raise RuntimeError("Error al inicializar SDK InspireFace")
         
+        # LIFO: se reutiliza primero la sesión usada más recientemente (cachés calientes)
+        self._sesiones = queue.LifoQueue()
+        self.tam_pool = INSPIREFACE_POOL_SIZE
+        for _ in range(self.tam_pool):
+            self._sesiones.put(self._crear_sesion())
+        
+        print(f"✅ Pool InspireFace creado: {self.tam_pool} sesiones")
+        
+        # Contadores del filtro de calidad previo a la extracción (por proceso)
+        self._lock_calidad = threading.Lock()
+        self.rostros_evaluados = 0
+        self.rechazos_calidad = Counter()
+
+    def calentar(self):
+        """
+        Inferencia de prueba sobre una imagen sintética en cada sesión del
+        pool, para que la primera petición real no pague la preparación
+        diferida del motor (reserva de tensores y cachés).
+        
+        Returns:
+            Segundos empleados
+        """
+        inicio = time.perf_counter()
+        ancho, alto = VIDEO_RESOLUTION
+        imagen = np.random.default_rng(0).integers(0, 256, (alto, ancho, 3), dtype=np.uint8)
+        
+        sesiones = [self.checkout() for _ in range(self.tam_pool)]
+        try:
+            for session in sesiones:
+                self._detectar(session, imagen)
+        finally:
+            for session in sesiones:
+                self.checkin(session)
+        return time.perf_counter() - inicio
+
+    def _crear_sesion(self, seguimiento=False):
+        """Crea una sesión con configuración óptima"""
+        import inspireface as isf
+
         # Crear sesión con flags optimizados
         # Habilitar solo lo necesario: reconocimiento facial y evaluación de calidad
         opt = isf.HF_ENABLE_FACE_RECOGNITION
         
-        # Usar modo de detección continua para precisión en registro/reconocimiento
-        self.session = isf.InspireFaceSession(
+        # Imágenes sueltas: detección continua (sin estado entre llamadas).
+        # Video: seguimiento liviano entre cuadros, con detección completa periódica
+        session = isf.InspireFaceSession(
             opt, 
-            isf.HF_DETECT_MODE_ALWAYS_DETECT,
+            isf.HF_DETECT_MODE_LIGHT_TRACK if seguimiento else isf.HF_DETECT_MODE_ALWAYS_DETECT,
             max_detect_num=5  # Soportar hasta 5 rostros para escenarios grupales
         )
         
+        # Disponible solo en versiones recientes del SDK
+        if seguimiento and hasattr(session, 'set_track_mode_detect_interval'):
+            session.set_track_mode_detect_interval(TRACK_DETECT_INTERVAL)
+        
         # Establecer umbral óptimo de confianza de detección
-        self.session.set_detection_confidence_threshold(0.4)
+        session.set_detection_confidence_threshold(0.4)
         
         # Establecer tamaño mínimo de rostro en píxeles para filtrar rostros muy pequeños
-        self.session.set_filter_minimum_face_pixel_size(80)
+        # (con proxy el filtro es relativo al proxy; el mínimo real se aplica en _detectar)
+        session.set_filter_minimum_face_pixel_size(
+            DETECTION_PROXY_MIN_FACE_PIXEL_SIZE if DETECTION_PROXY_WIDTH else MIN_FACE_PIXEL_SIZE
+        )
+        
+        return session
+
+    def checkout(self, timeout=None):
+        """
+        Toma una sesión libre del pool.
+        
+        Args:
+            timeout: Segundos máximos de espera (por defecto INSPIREFACE_POOL_TIMEOUT)
+            
+        Raises:
+            TimeoutError: Si no se libera ninguna sesión a tiempo
+        """
+        timeout = INSPIREFACE_POOL_TIMEOUT if timeout is None else timeout
+        try:
+            return self._sesiones.get(timeout=timeout)
+        except queue.Empty:
+            raise TimeoutError(f"No hay sesiones InspireFace libres tras {timeout}s")
+
+    def checkin(self, session):
+        """Devuelve una sesión al pool."""
+        self._sesiones.put(session)
+
+    @contextmanager
+    def sesion(self, timeout=None):
+        """Context manager: `with inspireface_service.sesion() as session: ...`"""
+        session = self.checkout(timeout)
+        try:
+            yield session
+        finally:
+            self.checkin(session)
+
+    def crear_sesion_seguimiento(self):
+        """
+        Crea una sesión de seguimiento para cuadros consecutivos de UNA cámara.
+        Guarda estado entre cuadros: no va al pool y la usa un solo consumidor.
+        """
+        return self._crear_sesion(seguimiento=True)
+
+    def detectar_en_video(self, sesion_seguimiento, image, tam_minimo=MIN_FACE_PIXEL_SIZE):
+        """
+        Detecta/sigue rostros en el siguiente cuadro del stream.
+        
+        Args:
+            tam_minimo: Ancho mínimo del rostro en px de `image` (en modo
+                dual, MIN_FACE_PIXEL_SIZE del flujo principal en px del subflujo)
+        
+        Returns:
+            Lista de tuplas (caja_original, rostro) ordenada del mejor rostro
+            (más grande) al peor; la caja sirve para get_face_embedding(caja=...)
+        """
+        if image is None:
+            return []
+        try:
+            faces, escala, _ = self._detectar(sesion_seguimiento, image, tam_minimo)
+        except Exception as e:
+            print(f"❌ Error InspireFace (seguimiento): {e}")
+            return []
+        cajas = [(self._caja_original(face, escala), face) for face in faces]
+        cajas.sort(key=lambda par: (par[0][2] - par[0][0]) * (par[0][3] - par[0][1]), reverse=True)
+        return cajas
+
+    def _detectar(self, session, image, tam_minimo=MIN_FACE_PIXEL_SIZE):
+        """
+        Detecta rostros sobre un proxy de DETECTION_PROXY_WIDTH px de ancho.
+        
+        Returns:
+            (rostros, escala, proxy): rostros en coordenadas del proxy, escala
+            proxy/original (1.0 si la imagen ya es pequeña o no hay proxy) y
+            la imagen sobre la que se detectó
+        """
+        import cv2
+
+        alto, ancho = image.shape[:2]
+        if not DETECTION_PROXY_WIDTH or ancho <= DETECTION_PROXY_WIDTH:
+            escala, proxy = 1.0, image
+        else:
+            escala = DETECTION_PROXY_WIDTH / ancho
+            proxy = cv2.resize(
+                image, (DETECTION_PROXY_WIDTH, max(1, round(alto * escala))),
+                interpolation=cv2.INTER_AREA
+            )
+        rostros = [
+            face for face in session.face_detection(proxy)
+            if (face.location[2] - face.location[0]) >= tam_minimo * escala
+        ]
+        return rostros, escala, proxy
+
+    def evaluar_calidad(self, image, caja, face=None, tam_minimo=MIN_FACE_PIXEL_SIZE):
+        """
+        Filtro previo a la extracción: tamaño de la caja, confianza de
+        detección, brillo y nitidez (varianza del Laplaciano) del rostro
+        reducido a QUALITY_ANCHO_RECORTE px. Cuesta una fracción de
+        face_feature_extract y cuenta los rechazos por motivo.
+        
+        Args:
+            tam_minimo: Lado mínimo de la caja en px de `image` (en modo dual,
+                        al extraer del subflujo, MIN_FACE_PIXEL_SIZE escalado)
         
-        print("✅ Sesión InspireFace Creada")
+        Returns:
+            None si el rostro es apto, o el motivo del rechazo
+            ('tamano', 'confianza', 'brillo' o 'nitidez')
+        """
+        motivo = self._motivo_rechazo(image, caja, face, tam_minimo)
+        with self._lock_calidad:
+            self.rostros_evaluados += 1
+            if motivo:
+                self.rechazos_calidad[motivo] += 1
+        return motivo
+
+    def _motivo_rechazo(self, image, caja, face, tam_minimo=MIN_FACE_PIXEL_SIZE):
+        alto, ancho = image.shape[:2]
+        x1, y1, x2, y2 = (int(c) for c in caja)
+        x1, y1, x2, y2 = max(0, x1), max(0, y1), min(ancho, x2), min(alto, y2)
+        if min(x2 - x1, y2 - y1) < tam_minimo:
+            return 'tamano'
+        
+        confianza = getattr(face, 'detection_confidence', None)
+        if confianza is not None and confianza < DETECTION_CONFIDENCE_THRESHOLD:
+            return 'confianza'
+        
+        import cv2
+
+        rostro = image[y1:y2, x1:x2]
+        escala = QUALITY_ANCHO_RECORTE / rostro.shape[1]
+        rostro = cv2.resize(
+            rostro, (QUALITY_ANCHO_RECORTE, max(1, round(rostro.shape[0] * escala))),
+            interpolation=cv2.INTER_AREA
+        )
+        gris = cv2.cvtColor(rostro, cv2.COLOR_BGR2GRAY) if rostro.ndim == 3 else rostro
+        
+        brillo = float(gris.mean())
+        if not QUALITY_BRILLO_MIN <= brillo <= QUALITY_BRILLO_MAX:
+            return 'brillo'
+        
+        nitidez = float(cv2.Laplacian(gris, cv2.CV_64F).var())
+        if min(1.0, nitidez / QUALITY_NITIDEZ_REFERENCIA) < MIN_FACE_QUALITY:
+            return 'nitidez'
+        return None
+
+    def estadisticas_calidad(self, desde=None):
+        """
+        Rostros evaluados y rechazos por motivo del filtro de calidad.
+        
+        Args:
+            desde: Estadísticas tomadas antes (se retorna la diferencia, p. ej.
+                   lo rechazado durante una captura)
+        """
+        with self._lock_calidad:
+            evaluados, rechazos = self.rostros_evaluados, Counter(self.rechazos_calidad)
+        if desde:
+            evaluados -= desde['evaluados']
+            rechazos.subtract(desde['rechazos'])
+        return {'evaluados': evaluados, 'rechazos': {m: n for m, n in rechazos.items() if n}}
+
+    def _caja_original(self, face, escala):
+        """Caja (x1, y1, x2, y2) del rostro en coordenadas de la imagen original."""
+        if escala == 1.0:
+            return face.location
+        return tuple(int(round(c / escala)) for c in face.location)
 
-    def get_face_embedding(self, image, return_quality=False):
+    def _extraer_rostro(self, session, image, proxy, face, escala):
+        """
+        Extrae la característica de un rostro detectado en el proxy.
+        
+        face_feature_extract alinea con los puntos de referencia del token de
+        detección, que el SDK no permite reescalar: el rostro se recorta a
+        resolución completa y se vuelve a detectar en el recorte. Con
+        DETECTION_PROXY_ALIGN_SIZE > 0 los rostros de al menos ese ancho en
+        el proxy se extraen del proxy con la misma detección (si falla, se
+        recortan igual).
+        
+        Returns:
+            Característica del SDK, o None si el rostro no se confirma en el recorte
+        """
+        if escala == 1.0:
+            return session.face_feature_extract(image, face)
+        if 0 < DETECTION_PROXY_ALIGN_SIZE <= face.location[2] - face.location[0]:
+            try:
+                return session.face_feature_extract(proxy, face)
+            except Exception as e:
+                print(f"⚠️ InspireFace: alineado sobre el proxy fallido, se recorta: {e}")
+        origen = self._recorte(session, image, self._caja_original(face, escala))
+        if origen is None:
+            return None
+        return session.face_feature_extract(*origen)
+
+    def _recorte(self, session, image, caja):
+        """
+        Recorta la caja (coordenadas originales) con margen y vuelve a detectar
+        el rostro en el recorte, de modo que face_feature_extract alinee con
+        puntos de referencia a resolución completa. Se usa con cajas que
+        llegan sin token de detección (seguimiento, otro proceso) y con
+        rostros pequeños en el proxy.
+        """
+        x1, y1, x2, y2 = caja
+        margen_x = int((x2 - x1) * DETECTION_CROP_MARGIN)
+        margen_y = int((y2 - y1) * DETECTION_CROP_MARGIN)
+        alto, ancho = image.shape[:2]
+        recorte = np.ascontiguousarray(image[
+            max(0, y1 - margen_y):min(alto, y2 + margen_y),
+            max(0, x1 - margen_x):min(ancho, x2 + margen_x)
+        ])
+        
+        rostros = session.face_detection(recorte)
+        if not rostros:
+            return None
+        return recorte, self._select_best_face(rostros)
+
+    def get_face_embedding(self, image, return_quality=False, caja=None, filtrar_calidad=False):
         """
         Detecta rostro y retorna embedding con puntaje de calidad opcional.
         
         Args:
             image: Imagen de entrada (numpy array)
             return_quality: Si es True, retorna tupla (embedding, puntaje_calidad)
+            caja: Caja (x1, y1, x2, y2) ya detectada (p. ej. por detectar_en_video);
+                  se omite la detección sobre el cuadro completo
+            filtrar_calidad: Aplicar evaluar_calidad antes de extraer (cuadros
+                  de video, donde el siguiente cuadro reemplaza al descartado)
             
         Returns:
-            embedding (list): Vector de 512 dimensiones o None si no hay rostro/error
+            embedding (np.ndarray): Vector float32 de 512 dimensiones o None si no hay rostro/error
             Si return_quality=True: (embedding, puntaje_calidad) o (None, 0)
         """
         try:
             if image is None:
                 return (None, 0.0) if return_quality else None
 
-            # Realizar detección
-            faces = self.session.face_detection(image)
+            with self.sesion() as session:
+                feature, caja_rostro, rostros, motivo = self._extraer(session, image, caja, filtrar_calidad)
             
-            if not faces:
+            if rostros == 0:
                 print("  ⚠️ InspireFace: 0 rostros detectados")
                 return (None, 0.0) if return_quality else None
+            if caja is None:
+                print(f"  ✅ InspireFace: {rostros} rostros detectados")
+            if motivo:
+                print(f"  ⚠️ InspireFace: rostro descartado por {motivo}")
+            if feature is None:
+                return (None, 0.0) if return_quality else None
             
-            print(f"  ✅ InspireFace: {len(faces)} rostros detectados")
-            
-            # Obtener el mejor rostro (más grande/centrado)
-            best_face = self._select_best_face(faces)
-            
-            # Extraer característica
-            feature = self.session.face_feature_extract(image, best_face)
-            
-            # Convertir a lista
-            embedding = list(feature.data) if hasattr(feature, 'data') else list(feature)
+            embedding = self._a_vector(feature)
             
             if return_quality:
                 # Calcular puntaje de calidad basado en tamaño y confianza de detección
-                quality = self._calculate_face_quality(best_face, image.shape)
+                quality = self._calculate_face_quality(caja_rostro, image.shape)
                 return (embedding, quality)
             
             return embedding
@@ -108,32 +404,124 @@ class InspireFaceService:
             print(f"❌ Error InspireFace: {e}")
             return (None, 0.0) if return_quality else None
 
+    def _a_vector(self, feature):
+        """Copia la característica del SDK a un vector float32 propio."""
+        return np.array(getattr(feature, 'data', feature), dtype=np.float32).ravel()
+
+    def _extraer(self, session, image, caja=None, filtrar_calidad=False):
+        """
+        Detección del mejor rostro (o recorte de `caja`) y extracción.
+        Con `caja` el filtro de calidad ya lo aplicó quien la localizó.
+        
+        Returns:
+            (característica o None, caja_original o None, rostros detectados,
+             motivo de rechazo de calidad o None)
+        """
+        if caja is not None:
+            # Rostro ya localizado: solo recorte y extracción
+            origen = self._recorte(session, image, caja)
+            if origen is None:
+                return None, caja, 1, None
+            return session.face_feature_extract(*origen), caja, 1, None
+        
+        # Realizar detección (sobre el proxy reducido)
+        faces, escala, proxy = self._detectar(session, image)
+        if not faces:
+            return None, None, 0, None
+        rostros = len(faces)
+        
+        # Obtener el mejor rostro (más grande/centrado)
+        best_face = self._select_best_face(faces)
+        caja = self._caja_original(best_face, escala)
+        
+        # Filtro de calidad antes de la extracción (costosa)
+        motivo = self.evaluar_calidad(image, caja, best_face) if filtrar_calidad else None
+        if motivo:
+            return None, caja, rostros, motivo
+        
+        return self._extraer_rostro(session, image, proxy, best_face, escala), caja, rostros, None
+
+    def get_face_embeddings_batch(self, frames, cajas=None):
+        """
+        Embedding del mejor rostro de cada imagen de un lote, repartiendo el
+        lote entre las sesiones del pool (el SDK libera el GIL en las
+        llamadas nativas). Sin conversión a listas ni salida por imagen.
+        
+        Args:
+            frames: Lista de imágenes BGR o arreglo apilado (N, H, W, 3)
+            cajas: Opcional - caja ya localizada por imagen (o None para detectar)
+            
+        Returns:
+            Tupla (embeddings (N, 512) float32, validos (N,) bool, calidades (N,) float32);
+            las filas no válidas quedan en cero
+        """
+        n = len(frames)
+        embeddings = np.zeros((n, DIMENSION_EMBEDDING), dtype=np.float32)
+        validos = np.zeros(n, dtype=bool)
+        calidades = np.zeros(n, dtype=np.float32)
+        if n == 0:
+            return embeddings, validos, calidades
+        
+        def procesar(indices):
+            try:
+                with self.sesion() as session:
+                    for i in indices:
+                        image = frames[i]
+                        if image is None:
+                            continue
+                        try:
+                            feature, caja, _, _ = self._extraer(session, image, cajas[i] if cajas is not None else None)
+                        except Exception as e:
+                            print(f"⚠️ Error InspireFace en imagen {i} del lote: {e}")
+                            continue
+                        if feature is None:
+                            continue
+                        embeddings[i] = np.asarray(getattr(feature, 'data', feature), dtype=np.float32).ravel()
+                        validos[i] = True
+                        calidades[i] = self._calculate_face_quality(caja, image.shape)
+            except TimeoutError as e:
+                print(f"❌ Error InspireFace: {e}")
+        
+        # Un bloque intercalado por sesión del pool
+        hilos = min(self.tam_pool, n)
+        bloques = [range(inicio, n, hilos) for inicio in range(hilos)]
+        if hilos == 1:
+            procesar(bloques[0])
+        else:
+            with ThreadPoolExecutor(max_workers=hilos) as ejecutor:
+                list(ejecutor.map(procesar, bloques))
+        
+        print(f"  ✅ InspireFace: {int(validos.sum())}/{n} rostros en el lote")
+        return embeddings, validos, calidades
+
     def get_multiple_embeddings(self, image):
         """
         Detecta múltiples rostros y retorna todos los embeddings.
         Útil para procesamiento por lotes o escenarios grupales.
         
         Returns:
-            Lista de tuplas (embedding, ubicación_rostro)
+            Lista de tuplas (embedding float32, ubicación_rostro)
         """
         try:
             if image is None:
                 return []
 
-            faces = self.session.face_detection(image)
-            
-            if not faces:
-                return []
-            
-            results = []
-            for face in faces:
-                try:
-                    feature = self.session.face_feature_extract(image, face)
-                    embedding = list(feature.data) if hasattr(feature, 'data') else list(feature)
-                    results.append((embedding, face.location))
-                except Exception as e:
-                    print(f"⚠️ Error al extraer característica de un rostro: {e}")
-                    continue
+            with self.sesion() as session:
+                faces, escala, proxy = self._detectar(session, image)
+                
+                if not faces:
+                    return []
+                
+                results = []
+                for face in faces:
+                    try:
+                        feature = self._extraer_rostro(session, image, proxy, face, escala)
+                        if feature is None:
+                            continue
+                        results.append((self._a_vector(feature), self._caja_original(face, escala)))
+                    except Exception as e:
+                        print(f"⚠️ Error al extraer característica de un rostro: {e}")
+                        continue
             
             return results
             
@@ -149,7 +537,8 @@ class InspireFaceService:
         if image is None:
             return []
         try:
-            return self.session.face_detection(image)
+            with self.sesion() as session:
+                return session.face_detection(image)
         except Exception:
             return []
 
@@ -172,12 +561,13 @@ class InspireFaceService:
         
         return max(faces, key=score_face)
 
-    def _calculate_face_quality(self, face, image_shape):
+    def _calculate_face_quality(self, caja, image_shape):
         """
         Calcula puntaje de calidad del rostro basado en tamaño y posición.
+        Recibe la caja (x1, y1, x2, y2) en coordenadas de la imagen.
         Retorna valor entre 0-1.
         """
-        x1, y1, x2, y2 = face.location
+        x1, y1, x2, y2 = caja
         face_width = x2 - x1
         face_height = y2 - y1
         img_height, img_width = image_shape[:2]
@@ -195,15 +585,15 @@ class InspireFaceService:
         Compara dos características faciales usando comparación nativa de InspireFace.
         
         Args:
-            feature1: Primer embedding (lista de 512 floats)
-            feature2: Segundo embedding (lista de 512 floats)
+            feature1: Primer embedding (arreglo o lista de 512 floats)
+            feature2: Segundo embedding (arreglo o lista de 512 floats)
             
         Returns:
             puntaje de similitud (0-1)
         """
         # Convertir a numpy para similitud coseno
-        vec1 = np.array(feature1)
-        vec2 = np.array(feature2)
+        vec1 = np.asarray(feature1, dtype=np.float32)
+        vec2 = np.asarray(feature2, dtype=np.float32)
         
         # Similitud coseno
         dot_product = np.dot(vec1, vec2)
@@ -219,5 +609,5 @@ class InspireFaceService:
         return max(0.0, min(1.0, similarity))
 
 
-# Instancia singleton global
-inspireface_service = InspireFaceService()
+# Instancia singleton global (los modelos se cargan en el primer uso)
+inspireface_service = ServicioPerezoso(InspireFaceService)
@@ -3,10 +3,12 @@
 Archivo: matching_service.py
 Descripcion: Servicio de matching biometrico para comparacion de vectores
              faciales. Implementa calculo de similitud coseno, distancia
-             euclidiana, busqueda de coincidencias en la base de datos,
-             y verificacion 1:1 de usuarios registrados.
+             euclidiana, busqueda vectorizada de coincidencias sobre la
+             galeria en memoria (individual o por lotes para escenas
+             grupales), y verificacion 1:1 de usuarios registrados contra
+             una cache de plantillas por RUT.
 Fecha de creacion: 10 de Octubre 2025
-Fecha de modificacion: 20 de Diciembre 2025
+Fecha de modificacion: 17 de Octubre 2026
 Autores:
     Roberto Leal
     William Tapia
@@ -18,10 +20,13 @@ import numpy as np
 
 from ..config import (
     SIMILARITY_THRESHOLD_DEFAULT,
-    SIMILARITY_THRESHOLD_VERIFICATION
+    SIMILARITY_THRESHOLD_VERIFICATION,
+    MATCH_TOP_K
 )
 from ..utils.logger import logger
-from .firebase_service import firebase_service
+from .galeria_service import galeria_service, indice_para_usuarios
+from .indice_service import normalizar_consulta
+from .verificacion_service import cache_plantillas
 
 
 @dataclass
@@ -47,8 +52,8 @@ def cosine_similarity(vector_a: List[float], vector_b: List[float]) -> float:
         Similitud entre 0 y 1 (1 = idénticos, 0 = completamente diferentes)
     """
     try:
-        vec_a = np.array(vector_a, dtype=np.float32)
-        vec_b = np.array(vector_b, dtype=np.float32)
+        vec_a = np.asarray(vector_a, dtype=np.float32)
+        vec_b = np.asarray(vector_b, dtype=np.float32)
         
         dot_product = np.dot(vec_a, vec_b)
         norm_a = np.linalg.norm(vec_a)
@@ -57,7 +62,7 @@ def cosine_similarity(vector_a: List[float], vector_b: List[float]) -> float:
         if norm_a == 0 or norm_b == 0:
             return 0.0
         
-        similarity = dot_product / (norm_a * norm_b)
+        similarity = float(dot_product / (norm_a * norm_b))
         return max(0.0, min(1.0, similarity))
         
     except Exception as e:
@@ -78,8 +83,8 @@ def euclidean_distance(vector_a: List[float], vector_b: List[float]) -> float:
         Distancia euclidiana
     """
     try:
-        vec_a = np.array(vector_a, dtype=np.float32)
-        vec_b = np.array(vector_b, dtype=np.float32)
+        vec_a = np.asarray(vector_a, dtype=np.float32)
+        vec_b = np.asarray(vector_b, dtype=np.float32)
         return float(np.linalg.norm(vec_a - vec_b))
         
     except Exception as e:
@@ -88,40 +93,41 @@ def euclidean_distance(vector_a: List[float], vector_b: List[float]) -> float:
 
 
 def encontrar_match(
-    vector_consulta: List[float],
+    vector_consulta: Any,
     umbral_similitud: float = SIMILARITY_THRESHOLD_DEFAULT,
     jornada_filtro: Optional[str] = None,
-    usuarios_cache: Optional[List[Dict]] = None
+    usuarios_cache: Optional[List[Dict]] = None,
+    modo: Optional[str] = None
 ) -> MatchResult:
     """
     Encuentra el mejor match para un vector de consulta entre todos los usuarios registrados.
     
     Args:
-        vector_consulta: Vector facial de 512 floats (InspireFace)
+        vector_consulta: Vector facial de 512 floats (arreglo float32 de InspireFace o lista)
         umbral_similitud: Umbral mínimo de similitud (por defecto desde config)
         jornada_filtro: Opcional - Filtrar por jornada 'D' o 'V'
-        usuarios_cache: Opcional - Lista de usuarios precargada para evitar consultas a Firebase
+        usuarios_cache: Opcional - Lista de usuarios a usar en lugar de la galería del proceso
+        modo: Opcional - 'plantilla', 'max' o 'topk_media' (por defecto config.MATCHING_MODO).
+              Los modos multi-plantilla puntúan todas las muestras de vectores_faciales.
     
     Returns:
         MatchResult con estado del match, datos del usuario y métricas de similitud
     """
     logger.matching(f"Iniciando búsqueda de match (umbral: {umbral_similitud * 100}%)")
     
-    # Obtener usuarios activos desde Firebase
-    if usuarios_cache is not None:
-        usuarios = usuarios_cache
-    else:
-        usuarios = firebase_service.listar_usuarios()
+    indice = _indice_de_busqueda(usuarios_cache)
     
-    usuarios_activos = [u for u in usuarios if u.get('activo', True)]
+    # Producto matriz-vector sobre las plantillas activas (filtradas por jornada)
+    resultados, total_comparaciones = indice.buscar(
+        vector_consulta,
+        k=MATCH_TOP_K,
+        jornada=jornada_filtro,
+        modo=modo
+    )
     
-    # Filtrar por jornada si se especificó
-    if jornada_filtro:
-        usuarios_activos = [u for u in usuarios_activos if u.get('jornada') == jornada_filtro]
+    logger.matching(f"Comparando con {total_comparaciones} usuarios activos")
     
-    logger.matching(f"Comparando con {len(usuarios_activos)} usuarios activos")
-    
-    if not usuarios_activos:
+    if not resultados:
         return MatchResult(
             match=False,
             usuario=None,
@@ -131,33 +137,12 @@ def encontrar_match(
             total_comparaciones=0
         )
     
-    resultados = []
-    
-    for usuario in usuarios_activos:
-        # Usar vector_promedio si existe, sino vector_facial (compatibilidad)
-        vector_usuario = usuario.get('vector_promedio') or usuario.get('vector_facial')
-        
-        if not vector_usuario:
-            logger.warning(f"Usuario {usuario.get('nombre')} no tiene vector facial")
-            continue
-        
-        # Calcular similitud coseno y distancia euclidiana
-        similitud = cosine_similarity(vector_consulta, vector_usuario)
-        distancia = euclidean_distance(vector_consulta, vector_usuario)
-        
-        resultados.append({
-            'usuario': usuario,
-            'similitud': similitud,
-            'distancia': distancia
-        })
-        
+    for candidato in resultados:
         logger.matching(
-            f"  - {usuario.get('nombre'):30s} | Similitud: {similitud:.3f} | Distancia: {distancia:.2f}"
+            f"  - {candidato['usuario'].get('nombre'):30s} | "
+            f"Similitud: {candidato['similitud']:.3f} | Distancia: {candidato['distancia']:.2f}"
         )
     
-    # Ordenar por similitud descendente (mayor similitud primero)
-    resultados.sort(key=lambda x: x['similitud'], reverse=True)
-    
     mejor_match = resultados[0] if resultados else None
     
     if mejor_match:
@@ -174,8 +159,8 @@ def encontrar_match(
             usuario=mejor_match['usuario'],
             similitud=mejor_match['similitud'],
             distancia=mejor_match['distancia'],
-            candidatos=resultados[:5],
-            total_comparaciones=len(resultados)
+            candidatos=resultados,
+            total_comparaciones=total_comparaciones
         )
     else:
         max_similitud = mejor_match['similitud'] if mejor_match else 0.0
@@ -188,19 +173,142 @@ def encontrar_match(
             usuario=None,
             similitud=max_similitud,
             distancia=mejor_match['distancia'] if mejor_match else float('inf'),
-            candidatos=resultados[:5],
-            total_comparaciones=len(resultados)
+            candidatos=resultados,
+            total_comparaciones=total_comparaciones
         )
 
 
+def _indice_de_busqueda(usuarios_cache: Optional[List[Dict]]):
+    """Galería sincronizada del proceso (o índice de la lista entregada)."""
+    if usuarios_cache is not None:
+        return indice_para_usuarios(usuarios_cache)
+    return galeria_service.obtener_indice()
+
+
+def asignar_sin_repetir(
+    candidatos_por_rostro: List[List[Dict[str, Any]]],
+    umbral_similitud: float
+) -> List[Optional[Dict[str, Any]]]:
+    """
+    Asignación mutuamente excluyente rostro -> usuario.
+
+    Recorre todos los pares (rostro, candidato) sobre el umbral en orden de
+    similitud descendente y asigna cada par si ni el rostro ni el RUT fueron
+    tomados antes. Así dos rostros del mismo cuadro nunca registran al mismo
+    usuario: el RUT queda para el rostro más parecido y el otro pasa a su
+    siguiente candidato.
+
+    Returns:
+        Por cada rostro, el candidato asignado o None
+    """
+    pares = [
+        (candidato['similitud'], rostro, candidato)
+        for rostro, candidatos in enumerate(candidatos_por_rostro)
+        for candidato in candidatos
+        if candidato['similitud'] >= umbral_similitud
+    ]
+    pares.sort(key=lambda par: par[0], reverse=True)
+
+    asignados: List[Optional[Dict[str, Any]]] = [None] * len(candidatos_por_rostro)
+    ruts_tomados = set()
+    for _, rostro, candidato in pares:
+        rut = candidato['usuario'].get('rut')
+        if asignados[rostro] is None and rut not in ruts_tomados:
+            asignados[rostro] = candidato
+            ruts_tomados.add(rut)
+
+    return asignados
+
+
+def encontrar_matches_batch(
+    vectores_consulta: Any,
+    umbral_similitud: float = SIMILARITY_THRESHOLD_DEFAULT,
+    jornada_filtro: Optional[str] = None,
+    usuarios_cache: Optional[List[Dict]] = None,
+    modo: Optional[str] = None
+) -> List[MatchResult]:
+    """
+    Encuentra el mejor match para cada rostro de un mismo cuadro.
+
+    Todas las consultas se puntúan contra la galería con un único producto
+    matriz-matriz (Q x D por D x N) y luego se asignan sin repetir RUT.
+
+    Args:
+        vectores_consulta: Lista (o matriz Q x 512) de vectores faciales
+        umbral_similitud, jornada_filtro, usuarios_cache, modo: Igual que en encontrar_match
+
+    Returns:
+        Un MatchResult por rostro, en el mismo orden de las consultas
+    """
+    consultas = np.asarray(vectores_consulta, dtype=np.float32)
+    if consultas.size == 0:
+        return []
+    if consultas.ndim == 1:
+        consultas = consultas[None, :]
+
+    logger.matching(
+        f"Iniciando búsqueda por lotes: {consultas.shape[0]} rostros (umbral: {umbral_similitud * 100}%)"
+    )
+
+    indice = _indice_de_busqueda(usuarios_cache)
+
+    # Candidatos extra por rostro: si los mejores RUT los toman otros rostros
+    # del lote, cada uno conserva alternativas
+    k = MATCH_TOP_K + consultas.shape[0] - 1
+    candidatos_por_rostro, total_comparaciones = indice.buscar_lote(
+        consultas,
+        k=k,
+        jornada=jornada_filtro,
+        modo=modo
+    )
+
+    logger.matching(f"Comparando con {total_comparaciones} usuarios activos")
+
+    asignados = asignar_sin_repetir(candidatos_por_rostro, umbral_similitud)
+
+    resultados = []
+    for rostro, (candidatos, asignado) in enumerate(zip(candidatos_por_rostro, asignados)):
+        if asignado is not None:
+            logger.success(
+                f"Rostro {rostro + 1}: MATCH {asignado['usuario'].get('nombre')} "
+                f"({asignado['similitud'] * 100:.1f}%)"
+            )
+            resultados.append(MatchResult(
+                match=True,
+                usuario=asignado['usuario'],
+                similitud=asignado['similitud'],
+                distancia=asignado['distancia'],
+                candidatos=candidatos[:MATCH_TOP_K],
+                total_comparaciones=total_comparaciones
+            ))
+            continue
+
+        mejor = candidatos[0] if candidatos else None
+        logger.warning(
+            f"Rostro {rostro + 1}: NO MATCH (mejor similitud: "
+            f"{(mejor['similitud'] if mejor else 0.0) * 100:.1f}%)"
+        )
+        resultados.append(MatchResult(
+            match=False,
+            usuario=None,
+            similitud=mejor['similitud'] if mejor else 0.0,
+            distancia=mejor['distancia'] if mejor else float('inf'),
+            candidatos=candidatos[:MATCH_TOP_K],
+            total_comparaciones=total_comparaciones
+        ))
+
+    return resultados
+
+
 def verificar_usuario(
-    vector_consulta: List[float],
+    vector_consulta: Any,
     rut_esperado: str,
     umbral: float = SIMILARITY_THRESHOLD_VERIFICATION
 ) -> Dict[str, Any]:
     """
     Verifica si un vector corresponde a un usuario específico (por RUT).
-    Útil para modo de verificación 1:1.
+    Útil para modo de verificación 1:1: la plantilla normalizada se lee de
+    la cache por RUT y la similitud es un solo producto punto.
     
     Args:
         vector_consulta: Vector facial capturado
@@ -208,30 +316,40 @@ def verificar_usuario(
         umbral: Umbral mínimo de similitud
     
     Returns:
-        Dict con estado de verificación y similitud
+        Dict con estado de verificación, similitud y datos del usuario
     """
-    usuario = firebase_service.obtener_usuario_por_rut(rut_esperado)
+    entrada = cache_plantillas.obtener(rut_esperado)
     
-    if not usuario:
+    if not entrada:
         return {
             'verificado': False,
             'similitud': 0.0,
             'error': 'Usuario no encontrado'
         }
     
-    vector_usuario = usuario.get('vector_promedio') or usuario.get('vector_facial')
+    plantilla, usuario = entrada
+    
+    # Usuarios dados de baja (soft delete): igual que en la búsqueda 1:N
+    if not usuario.get('activo', True):
+        return {
+            'verificado': False,
+            'similitud': 0.0,
+            'error': 'Usuario inactivo'
+        }
     
-    if not vector_usuario:
+    if plantilla is None:
         return {
             'verificado': False,
             'similitud': 0.0,
             'error': 'Usuario sin vector facial'
         }
     
-    similitud = cosine_similarity(vector_consulta, vector_usuario)
+    consulta, _ = normalizar_consulta(vector_consulta)
+    similitud = max(0.0, min(1.0, float(np.dot(plantilla, consulta))))
     
     return {
         'verificado': similitud >= umbral,
         'similitud': similitud,
-        'nombre': usuario.get('nombre')
+        'nombre': usuario.get('nombre'),
+        'usuario': usuario
     }
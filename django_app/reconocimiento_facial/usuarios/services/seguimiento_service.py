@@ -0,0 +1,283 @@
+"""
+-----------------------------------------------------------------------------
+Archivo: seguimiento_service.py
+Descripcion: Pistas de rostro sobre cuadros consecutivos de una camara. Las
+             cajas se asocian entre cuadros por ID de seguimiento del SDK o
+             por IoU, el embedding se extrae solo cada TRACK_EXTRAER_CADA
+             cuadros o cuando la caja mejora, y cada pista mantiene la media
+             de sus embeddings. El reconocimiento compara la pista (no cada
+             cuadro), con menos extracciones y menos busquedas en la galeria.
+             Solo se extraen rostros que pasan el filtro de calidad. Es la
+             unica implementacion del seguimiento: EjecutorEmbeddings.mapear
+             (registro) la usa extrayendo en todos los cuadros.
+             En modo dual el seguimiento corre sobre el subflujo y solo se
+             pide un cuadro al flujo principal para cada extraccion.
+             La sesion LIGHT_TRACK y las pistas son por camara y se
+             conservan entre peticiones (obtener_seguimiento).
+Fecha de creacion: 16 de Octubre 2026
+Fecha de modificacion: 17 de Octubre 2026
+Autores:
+    Roberto Leal
+    William Tapia
+-----------------------------------------------------------------------------
+"""
+from collections import deque
+from concurrent.futures import Future
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+import threading
+import time
+import numpy as np
+
+from ..config import (
+    MIN_FACE_PIXEL_SIZE,
+    TRACK_EXTRAER_CADA,
+    TRACK_IOU_MINIMO,
+    TRACK_MAX_CUADROS_PERDIDA,
+    TRACK_MEJORA_AREA,
+    TRACK_PAUSA_MAXIMA,
+)
+from ..utils.logger import logger
+from .extraccion_service import EjecutorEmbeddings
+from .inspireface_service import inspireface_service
+
+Caja = Tuple[int, int, int, int]
+
+
+def _area(caja: Caja) -> float:
+    return max(0, caja[2] - caja[0]) * max(0, caja[3] - caja[1])
+
+
+def iou(a: Caja, b: Caja) -> float:
+    """Intersección sobre unión de dos cajas (x1, y1, x2, y2)."""
+    interseccion = _area((max(a[0], b[0]), max(a[1], b[1]), min(a[2], b[2]), min(a[3], b[3])))
+    union = _area(a) + _area(b) - interseccion
+    return interseccion / union if union > 0 else 0.0
+
+
+class Pista:
+    """Un rostro seguido entre cuadros, con la media de sus embeddings."""
+
+    def __init__(self, id_pista: int, caja: Caja, cuadro: int, track_id: Optional[int] = None):
+        self.id = id_pista
+        self.track_id = track_id
+        self.caja = caja
+        self.ultimo_cuadro = cuadro
+        self.ultima_extraccion: Optional[int] = None
+        self.area_extraida = 0.0  # Área de la mejor caja ya extraída
+        self.suma: Optional[np.ndarray] = None
+        self.muestras = 0
+
+    def debe_extraer(self, cuadro: int) -> bool:
+        """Extraer si la pista es nueva, pasaron K cuadros o la caja mejoró."""
+        return (
+            self.ultima_extraccion is None
+            or cuadro - self.ultima_extraccion >= TRACK_EXTRAER_CADA
+            or _area(self.caja) >= self.area_extraida * TRACK_MEJORA_AREA
+        )
+
+    def agregar(self, embedding, caja: Caja, cuadro: int):
+        """Suma el embedding (normalizado) a la media de la pista."""
+        vector = np.asarray(embedding, dtype=np.float32).ravel()
+        norma = float(np.linalg.norm(vector))
+        if norma == 0:
+            return
+        vector = vector / norma
+        self.suma = vector if self.suma is None else self.suma + vector
+        self.muestras += 1
+        self.area_extraida = max(self.area_extraida, _area(caja))
+        self.ultima_extraccion = cuadro
+
+    def media(self) -> Optional[np.ndarray]:
+        """Embedding medio normalizado de la pista (None sin muestras)."""
+        if self.suma is None:
+            return None
+        return self.suma / max(float(np.linalg.norm(self.suma)), 1e-12)
+
+
+class GestorPistas:
+    """Asocia las cajas de cada cuadro a pistas (ID del SDK o IoU)."""
+
+    def __init__(self):
+        self.pistas: Dict[int, Pista] = {}
+        self._siguiente_id = 0
+
+    def actualizar(self, rostros: List[Tuple[Caja, object]], cuadro: int) -> List[Pista]:
+        """
+        Asocia los rostros del cuadro (caja_original, rostro), ordenados del
+        mejor al peor, y descarta las pistas perdidas.
+
+        Returns:
+            La pista de cada rostro, en el mismo orden
+        """
+        libres = dict(self.pistas)
+        asignadas = []
+        for caja, face in rostros:
+            track_id = getattr(face, 'track_id', None)
+            pista = next(
+                (p for p in libres.values() if track_id is not None and p.track_id == track_id),
+                None
+            )
+            if pista is None and libres:
+                candidata = max(libres.values(), key=lambda p: iou(p.caja, caja))
+                if iou(candidata.caja, caja) >= TRACK_IOU_MINIMO:
+                    pista = candidata
+            if pista is None:
+                pista = Pista(self._siguiente_id, caja, cuadro, track_id)
+                self.pistas[pista.id] = pista
+                self._siguiente_id += 1
+            else:
+                libres.pop(pista.id, None)
+                pista.caja = caja
+                pista.ultimo_cuadro = cuadro
+                pista.track_id = track_id
+            asignadas.append(pista)
+
+        for id_pista, pista in list(self.pistas.items()):
+            if cuadro - pista.ultimo_cuadro > TRACK_MAX_CUADROS_PERDIDA:
+                del self.pistas[id_pista]
+        return asignadas
+
+
+class SeguimientoCamara:
+    """
+    Sesión LIGHT_TRACK y pistas de una cámara, reutilizadas entre peticiones.
+
+    La sesión se crea en el primer uso. Las pistas continúan mientras los
+    cuadros llegan sin pausas; tras TRACK_PAUSA_MAXIMA segundos sin cuadros
+    se descartan, para no sumar a la media de una pista a otra persona.
+    Un solo consumidor a la vez (lock).
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self._sesion = None
+        self.gestor = GestorPistas()
+        self.cuadro = 0  # Índice del siguiente cuadro (continúa entre peticiones)
+        self._ultimo_cuadro = 0.0
+
+    @property
+    def sesion(self):
+        if self._sesion is None:
+            self._sesion = inspireface_service.crear_sesion_seguimiento()
+        return self._sesion
+
+    def reanudar(self):
+        """Inicio de una petición: descarta las pistas si hubo una pausa."""
+        if time.time() - self._ultimo_cuadro > TRACK_PAUSA_MAXIMA:
+            self.gestor = GestorPistas()
+
+    def avanzar(self) -> int:
+        """Índice del cuadro actual, y registra su llegada."""
+        self._ultimo_cuadro = time.time()
+        self.cuadro += 1
+        return self.cuadro - 1
+
+
+_seguimientos: Dict[str, SeguimientoCamara] = {}
+_lock_seguimientos = threading.Lock()
+
+
+def obtener_seguimiento(camara: str) -> SeguimientoCamara:
+    """Estado de seguimiento compartido de la cámara (uno por URL en el proceso)."""
+    with _lock_seguimientos:
+        seguimiento = _seguimientos.get(camara)
+        if seguimiento is None:
+            seguimiento = _seguimientos[camara] = SeguimientoCamara()
+        return seguimiento
+
+
+def seguir_y_extraer(
+    cuadros: Iterable[np.ndarray],
+    ejecutor: EjecutorEmbeddings,
+    dual=None,
+    return_quality: bool = False,
+    todas: bool = False,
+    camara: Optional[str] = None
+) -> Iterator[Tuple[np.ndarray, Optional[Pista], object]]:
+    """
+    Sigue el rostro principal sobre cuadros consecutivos de una cámara y
+    extrae su embedding solo cuando la pista lo necesita (con todas=True,
+    en cada cuadro con rostro apto).
+
+    Genera (cuadro, pista, muestra) en orden, manteniendo hasta
+    `ejecutor.capacidad` extracciones en vuelo; pista es None si el cuadro
+    no tiene rostro y muestra es el resultado de get_face_embedding
+    (embedding, o (embedding, calidad) con return_quality) cuando el cuadro
+    agregó una muestra a la pista, o None si la media no cambió.
+
+    Con `dual` (FuenteDual) los cuadros son del subflujo y las pistas quedan
+    en sus coordenadas; cada extracción usa el cuadro del flujo principal,
+    que reemplaza al del subflujo en lo generado. El flujo principal se
+    suelta en los cuadros sin rostro y al terminar.
+
+    Con `camara` (URL de los cuadros) se reutiliza la sesión y las pistas
+    de esa cámara; si otra petición la está usando, o sin `camara`, se usa
+    un estado propio que se descarta al terminar.
+    """
+    seguimiento = obtener_seguimiento(camara) if camara else None
+    if seguimiento is None or not seguimiento.lock.acquire(blocking=False):
+        if seguimiento is not None:
+            logger.recognition(f"Seguimiento de {camara} en uso, se usa una sesión temporal")
+        seguimiento = SeguimientoCamara()
+        seguimiento.lock.acquire()
+    seguimiento.reanudar()
+    gestor = seguimiento.gestor
+    pendientes = deque()
+
+    def resolver(cuadro, pista, caja, indice, futuro: Optional[Future], imagen_caja):
+        if futuro is None:
+            return cuadro, pista, None
+        try:
+            muestra = ejecutor.resultado(futuro, cuadro, return_quality, imagen_caja)
+        except Exception as e:
+            logger.error(f"Error extrayendo embedding de la pista {pista.id}: {e}")
+            muestra = None
+        embedding = muestra[0] if return_quality and muestra is not None else muestra
+        if embedding is None:
+            return cuadro, pista, None
+        pista.agregar(embedding, caja, indice)
+        return cuadro, pista, muestra
+
+    try:
+        for cuadro in cuadros:
+            indice = seguimiento.avanzar()
+            tam_minimo = dual.tam_minimo_bajo(cuadro) if dual else MIN_FACE_PIXEL_SIZE
+            rostros = inspireface_service.detectar_en_video(seguimiento.sesion, cuadro, tam_minimo)
+            if not rostros:
+                if dual:
+                    dual.soltar_alto()
+                pendientes.append((cuadro, None, None, indice, None, None))
+            else:
+                pista = gestor.actualizar(rostros[:1], indice)[0]
+                futuro = caja = None
+                if todas or pista.debe_extraer(indice):
+                    if dual:
+                        # Cuadro del flujo principal solo ahora (None si el rostro
+                        # es chico para extraer o el cuadro no llega a tiempo)
+                        imagen, caja = dual.cuadro_alto(cuadro, pista.caja) or (None, None)
+                    else:
+                        imagen, caja = cuadro, pista.caja
+                    # Filtro de calidad antes de enviar: un cuadro borroso u oscuro se
+                    # omite y la pista vuelve a intentarlo en el cuadro siguiente
+                    # (el cuadro de respaldo del subflujo se mide con su propio mínimo)
+                    if imagen is not None and not inspireface_service.evaluar_calidad(
+                        imagen, caja, rostros[0][1],
+                        tam_minimo=tam_minimo if imagen is cuadro else MIN_FACE_PIXEL_SIZE
+                    ):
+                        # Marcar ahora para no reenviar la misma pista mientras está en vuelo
+                        pista.ultima_extraccion = indice
+                        pista.area_extraida = max(pista.area_extraida, _area(pista.caja))
+                        futuro = ejecutor.submit(imagen, return_quality, caja=caja)
+                        cuadro = imagen
+                pendientes.append((cuadro, pista, pista.caja, indice, futuro, caja))
+            if len(pendientes) >= ejecutor.capacidad:
+                yield resolver(*pendientes.popleft())
+        while pendientes:
+            yield resolver(*pendientes.popleft())
+    finally:
+        if dual:
+            dual.soltar_alto()
+        seguimiento.lock.release()
+        for *_, futuro, _ in pendientes:
+            if futuro is not None:
+                futuro.cancel()
@@ -0,0 +1,136 @@
+"""
+-----------------------------------------------------------------------------
+Archivo: snapshot_service.py
+Descripcion: Snapshot en disco de la galeria biometrica: un archivo .npy
+             por arreglo (plantillas, muestras, normas, indice aproximado y,
+             si se reordena en float32, las plantillas de referencia) mas
+             un JSON con los metadatos de usuarios y la marca de version.
+             Los workers lo abren con memmap, compartiendo paginas entre
+             procesos, y solo piden a Firestore los deltas posteriores.
+Fecha de creacion: 17 de Octubre 2026
+Fecha de modificacion: 17 de Octubre 2026
+Autores:
+    Roberto Leal
+    William Tapia
+-----------------------------------------------------------------------------
+"""
+from datetime import datetime
+from typing import Tuple
+import json
+import os
+import shutil
+import numpy as np
+
+from ..config import GALLERY_RERANK_CANDIDATOS, MATCHING_BACKEND
+from ..utils.cuantizacion import MatrizCuantizada
+from ..utils.logger import logger
+from .ann_service import IndiceIVF, IndiceCascada
+from .indice_service import IndiceGaleria
+
+# Metadatos JSON + un archivo .npy por arreglo
+ARCHIVO_METADATOS_SNAPSHOT = 'galeria.json'
+VERSION_FORMATO_SNAPSHOT = 2
+
+
+def guardar_snapshot(indice: IndiceGaleria, directorio: str, marca: str):
+    """
+    Guarda `indice` en `directorio` como archivos .npy (abribles con
+    memmap) más un JSON con metadatos de usuarios y la marca de versión.
+    Se escribe en un directorio temporal y se reemplaza al final, por lo
+    que un worker nunca lee un snapshot a medio escribir.
+    """
+    temporal = directorio.rstrip(os.sep) + '.tmp'
+    shutil.rmtree(temporal, ignore_errors=True)
+    os.makedirs(temporal)
+
+    arreglos = {
+        'normas': indice.normas,
+        'inicio_muestras': indice.inicio_muestras,
+        'referencia': indice.referencia
+    }
+    for nombre, matriz in (('matriz', indice.matriz), ('muestras', indice.muestras)):
+        if nombre == 'muestras' and indice.muestras is indice.matriz:
+            continue
+        if isinstance(matriz, MatrizCuantizada):
+            arreglos[nombre] = matriz.datos
+            arreglos[f'{nombre}_escalas'] = matriz.escalas
+        else:
+            arreglos[nombre] = np.asarray(matriz, dtype=np.float32)
+    if indice.ann is not None:
+        arreglos.update(indice.ann.arreglos())
+
+    for nombre, arreglo in arreglos.items():
+        if arreglo is not None:
+            np.save(os.path.join(temporal, f'{nombre}.npy'), np.ascontiguousarray(arreglo))
+
+    metadatos = {
+        'version_formato': VERSION_FORMATO_SNAPSHOT,
+        'marca': marca,
+        'creado': datetime.now().isoformat(),
+        'tipo': indice.matriz.tipo if isinstance(indice.matriz, MatrizCuantizada) else 'float32',
+        'dimension': indice.dimension,
+        'total': len(indice),
+        'ann': indice.ann.metadatos() if indice.ann is not None else None,
+        'usuarios': indice.usuarios
+    }
+    with open(os.path.join(temporal, ARCHIVO_METADATOS_SNAPSHOT), 'w', encoding='utf-8') as f:
+        json.dump(metadatos, f, ensure_ascii=False, default=str)
+
+    # Reemplazo del snapshot anterior. Los workers que ya lo tienen
+    # mapeado conservan sus archivos abiertos hasta recargar.
+    anterior = directorio.rstrip(os.sep) + '.old'
+    shutil.rmtree(anterior, ignore_errors=True)
+    if os.path.exists(directorio):
+        os.rename(directorio, anterior)
+    os.rename(temporal, directorio)
+    shutil.rmtree(anterior, ignore_errors=True)
+
+
+def abrir_snapshot(directorio: str) -> Tuple[IndiceGaleria, str]:
+    """
+    Abre un snapshot con np.load(mmap_mode='r'): las matrices no se copian
+    a la memoria del proceso y las páginas se comparten entre workers.
+
+    Returns:
+        Tupla (indice, marca_de_version)
+    """
+    with open(os.path.join(directorio, ARCHIVO_METADATOS_SNAPSHOT), encoding='utf-8') as f:
+        metadatos = json.load(f)
+    if metadatos.get('version_formato') != VERSION_FORMATO_SNAPSHOT:
+        raise ValueError(f"Formato de snapshot no soportado: {metadatos.get('version_formato')}")
+
+    def cargar(nombre):
+        ruta = os.path.join(directorio, f'{nombre}.npy')
+        return np.load(ruta, mmap_mode='r') if os.path.exists(ruta) else None
+
+    def matriz_de(nombre):
+        datos = cargar(nombre)
+        if datos is None or metadatos['tipo'] == 'float32':
+            return datos
+        return MatrizCuantizada(datos, cargar(f'{nombre}_escalas'))
+
+    matriz = matriz_de('matriz')
+    muestras = matriz_de('muestras')
+    indice = IndiceGaleria(
+        metadatos['usuarios'],
+        matriz,
+        np.asarray(cargar('normas')),
+        muestras if muestras is not None else matriz,
+        np.asarray(cargar('inicio_muestras')),
+        # Queda en disco: el reordenamiento lee solo las filas candidatas
+        cargar('referencia') if GALLERY_RERANK_CANDIDATOS > 0 else None
+    )
+
+    # Índice aproximado (IVF o cascada con su proyección versionada). Solo se
+    # restaura si es del backend configurado; si no, preparar_ann entrena
+    # el que corresponda (o ninguno) como con una carga desde Firestore
+    guardado = metadatos.get('ann') or {}
+    clase = {IndiceIVF.NOMBRE: IndiceIVF, IndiceCascada.NOMBRE: IndiceCascada}.get(MATCHING_BACKEND)
+    if clase is not None and guardado.get('backend') == MATCHING_BACKEND:
+        indice.ann = clase.desde_arreglos(cargar, guardado)
+    elif guardado:
+        logger.warning(
+            f"Snapshot con índice '{guardado.get('backend')}' y MATCHING_BACKEND = "
+            f"'{MATCHING_BACKEND}': se ignora el índice guardado"
+        )
+    return indice, metadatos['marca']
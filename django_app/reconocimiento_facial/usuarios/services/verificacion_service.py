@@ -0,0 +1,118 @@
+"""
+-----------------------------------------------------------------------------
+Archivo: verificacion_service.py
+Descripcion: Cache LRU de plantillas faciales por RUT para la verificacion
+             1:1. Cada entrada guarda la plantilla normalizada y los datos
+             basicos del usuario (sin la foto de perfil), de modo que
+             verificar es un solo producto punto sin consultar Firestore.
+             Las entradas se invalidan cuando el usuario se modifica
+             (observador de FirebaseService) y expiran tras
+             VERIFICACION_CACHE_TTL por cambios hechos en otros procesos.
+Fecha de creacion: 16 de Octubre 2026
+Fecha de modificacion: 17 de Octubre 2026
+Autores:
+    Roberto Leal
+    William Tapia
+-----------------------------------------------------------------------------
+"""
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+import threading
+import time
+import numpy as np
+
+from ..config import VERIFICACION_CACHE_TAMANO, VERIFICACION_CACHE_TTL
+from ..utils.logger import logger
+from ..utils.perezoso import ServicioPerezoso
+from .firebase_service import firebase_service
+from .indice_service import normalizar_consulta, vector_de_usuario
+
+# (plantilla normalizada o None si el usuario no tiene vector, datos del usuario)
+EntradaPlantilla = Tuple[Optional[np.ndarray], Dict[str, Any]]
+
+# Datos del usuario que se guardan en cada entrada (la foto se lee aparte, solo si se necesita)
+CAMPOS_CACHE = ('nombre', 'rut', 'jornada', 'activo')
+
+
+class CachePlantillas:
+    """
+    Cache LRU (singleton) RUT -> plantilla normalizada para verificación 1:1.
+
+    Los usuarios se leen de `fuente`: por defecto FirebaseService; cualquier
+    objeto con obtener_usuario_por_rut y registrar_observador_usuarios sirve
+    (por ejemplo, usuarios en memoria en los benchmarks). La fuente se fija
+    al crear el singleton: pedirlo después con otra fuente es un error, para
+    no medir ni verificar contra usuarios distintos de los indicados.
+    """
+    _instance = None
+    _initialized = False
+
+    def __new__(cls, fuente: Any = None):
+        if cls._instance is None:
+            cls._instance = super(CachePlantillas, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self, fuente: Any = None):
+        if self._initialized and fuente is not None and fuente is not self._fuente:
+            raise RuntimeError("CachePlantillas ya fue creada con otra fuente de usuarios")
+        if not self._initialized:
+            self._fuente = fuente if fuente is not None else firebase_service
+            self._entradas: 'OrderedDict[str, Tuple[float, EntradaPlantilla]]' = OrderedDict()
+            self._lock = threading.Lock()
+            self._generacion = 0  # Aumenta con cada invalidación
+            self.aciertos = 0
+            self.fallos = 0
+            self._fuente.registrar_observador_usuarios(self._on_usuario_modificado)
+            self._initialized = True
+
+    def obtener(self, rut: str) -> Optional[EntradaPlantilla]:
+        """
+        Retorna (plantilla, usuario) del RUT, leyendo Firestore solo si no
+        está en cache o la entrada expiró. None si el usuario no existe.
+        """
+        ahora = time.time()
+        with self._lock:
+            guardada = self._entradas.get(rut)
+            if guardada is not None and ahora - guardada[0] < VERIFICACION_CACHE_TTL:
+                self._entradas.move_to_end(rut)
+                self.aciertos += 1
+                return guardada[1]
+            self.fallos += 1
+            generacion = self._generacion
+
+        usuario = self._fuente.obtener_usuario_por_rut(rut)
+        if not usuario:
+            self.invalidar(rut)
+            return None
+
+        vector = vector_de_usuario(usuario)
+        plantilla = normalizar_consulta(vector)[0] if vector is not None else None
+        entrada = (plantilla, {campo: usuario.get(campo) for campo in CAMPOS_CACHE})
+
+        with self._lock:
+            # Si hubo una invalidación durante la lectura, no guardar datos posiblemente viejos
+            if generacion != self._generacion:
+                return entrada
+            self._entradas[rut] = (ahora, entrada)
+            self._entradas.move_to_end(rut)
+            while len(self._entradas) > VERIFICACION_CACHE_TAMANO:
+                self._entradas.popitem(last=False)
+        return entrada
+
+    def invalidar(self, rut: Optional[str] = None):
+        """Elimina la entrada del RUT (o todas si no se indica)."""
+        with self._lock:
+            self._generacion += 1
+            if rut is None:
+                self._entradas.clear()
+            else:
+                self._entradas.pop(rut, None)
+
+    def _on_usuario_modificado(self, rut, campos):
+        """Observador de escrituras de usuario en Firebase."""
+        self.invalidar(rut)
+        logger.matching(f"Plantilla de verificación invalidada: {rut}")
+
+
+# Instancia singleton global (se crea en la primera verificación)
+cache_plantillas = ServicioPerezoso(CachePlantillas)
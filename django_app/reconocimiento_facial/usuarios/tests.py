@@ -0,0 +1,953 @@
+"""
+-----------------------------------------------------------------------------
+Archivo: tests.py
+Descripcion: Pruebas de la aplicacion usuarios. No requieren camara ni
+             acceso a Firestore: usan galerias sinteticas reproducibles.
+             Se ejecutan con `python manage.py test usuarios` o `pytest`.
+Fecha de creacion: 17 de Octubre 2026
+Fecha de modificacion: 17 de Octubre 2026
+Autores:
+    Roberto Leal
+    William Tapia
+-----------------------------------------------------------------------------
+"""
+from unittest import TestCase, mock
+import json
+import os
+import subprocess
+import sys
+
+import numpy as np
+
+from .utils.cuantizacion import cuantizar, medir_deriva
+from .utils.galeria_sintetica import generar_consultas, generar_plantillas, usuarios_sinteticos
+
+
+def usuarios_con_vectores(cantidad, semilla=0, muestras=0):
+    """
+    Usuarios con vector_facial en listas (como los entrega Firestore), normas
+    distintas de 1, algunos inactivos y algunos sin vector. Con `muestras`
+    cada usuario recibe además hasta esa cantidad de vectores_faciales.
+    """
+    rng = np.random.default_rng(semilla)
+    plantillas = generar_plantillas(cantidad, semilla=semilla)
+    escalas = rng.uniform(5.0, 30.0, cantidad).astype(np.float32)
+    usuarios = usuarios_sinteticos(cantidad)
+    for i, usuario in enumerate(usuarios):
+        usuario['activo'] = i % 7 != 3
+        if i % 11 == 5:
+            continue
+        usuario['vector_facial'] = (plantillas[i] * escalas[i]).tolist()
+        if muestras:
+            # Entre 0 y `muestras` muestras por usuario, en ambos formatos guardados
+            propias = [
+                (plantillas[i] + 0.05 * rng.standard_normal(512, dtype=np.float32)).tolist()
+                for _ in range(i % (muestras + 1))
+            ]
+            usuario['vectores_faciales'] = [{'vector': m} for m in propias] if i % 2 else propias
+    return usuarios, plantillas
+
+
+class EncontrarMatchTests(TestCase):
+    """encontrar_match vectorizado contra el recorrido por usuario original."""
+
+    TAMANO = 400
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.usuarios, plantillas = usuarios_con_vectores(cls.TAMANO, semilla=11)
+        cls.consultas, _ = generar_consultas(plantillas, 20, semilla=12)
+        cls.consultas *= 20.0
+
+    def _por_recorrido(self, consulta, jornada):
+        from .services.matching_service import cosine_similarity, euclidean_distance
+
+        resultados = []
+        for usuario in self.usuarios:
+            if not usuario.get('activo', True) or (jornada and usuario.get('jornada') != jornada):
+                continue
+            vector = usuario.get('vector_promedio') or usuario.get('vector_facial')
+            if not vector:
+                continue
+            resultados.append({
+                'rut': usuario['rut'],
+                'similitud': cosine_similarity(consulta, vector),
+                'distancia': euclidean_distance(consulta, vector),
+            })
+        resultados.sort(key=lambda r: r['similitud'], reverse=True)
+        return resultados
+
+    def test_mismos_candidatos_que_el_recorrido(self):
+        from .config import MATCH_TOP_K, SIMILARITY_THRESHOLD_DEFAULT
+        from .services.matching_service import encontrar_match
+
+        for jornada in (None, 'D', 'V'):
+            for consulta in self.consultas:
+                esperados = self._por_recorrido(consulta, jornada)
+                resultado = encontrar_match(
+                    consulta, jornada_filtro=jornada, usuarios_cache=self.usuarios, modo='plantilla'
+                )
+                self.assertEqual(resultado.total_comparaciones, len(esperados))
+                self.assertEqual(
+                    [c['usuario']['rut'] for c in resultado.candidatos],
+                    [e['rut'] for e in esperados[:MATCH_TOP_K]]
+                )
+                for candidato, esperado in zip(resultado.candidatos, esperados):
+                    self.assertAlmostEqual(candidato['similitud'], esperado['similitud'], places=5)
+                    self.assertAlmostEqual(candidato['distancia'], esperado['distancia'], delta=1e-3)
+                self.assertEqual(resultado.match, esperados[0]['similitud'] >= SIMILARITY_THRESHOLD_DEFAULT)
+
+
+class BusquedaPorLotesTests(TestCase):
+    """buscar_lote / encontrar_matches_batch contra una búsqueda por consulta."""
+
+    TAMANO = 400
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.usuarios, plantillas = usuarios_con_vectores(cls.TAMANO, semilla=71, muestras=3)
+        cls.consultas, _ = generar_consultas(plantillas, 12, semilla=72)
+
+    def test_lote_igual_a_consultas_individuales(self):
+        from .services.indice_service import IndiceGaleria
+
+        indice = IndiceGaleria.desde_usuarios(self.usuarios)
+        for modo in ('plantilla', 'max', 'topk_media'):
+            for jornada in (None, 'D'):
+                lote, total = indice.buscar_lote(self.consultas, k=5, jornada=jornada, modo=modo)
+                for consulta, candidatos in zip(self.consultas, lote):
+                    individuales, total_individual = indice.buscar(consulta, k=5, jornada=jornada, modo=modo)
+                    self.assertEqual(total, total_individual)
+                    self.assertEqual(
+                        [c['usuario']['rut'] for c in candidatos],
+                        [c['usuario']['rut'] for c in individuales]
+                    )
+                    for a, b in zip(candidatos, individuales):
+                        self.assertAlmostEqual(a['similitud'], b['similitud'], places=5)
+
+    def test_matches_batch_no_repite_rut(self):
+        from .services.matching_service import encontrar_match, encontrar_matches_batch
+
+        # Dos rostros casi idénticos: solo el más parecido se queda con el RUT
+        consultas = np.vstack([self.consultas, self.consultas[:1] * 0.98 + self.consultas[1:2] * 0.02])
+        resultados = encontrar_matches_batch(consultas, umbral_similitud=0.3, usuarios_cache=self.usuarios)
+        self.assertEqual(len(resultados), len(consultas))
+
+        ruts = [r.usuario['rut'] for r in resultados if r.match]
+        self.assertEqual(len(ruts), len(set(ruts)))
+        for consulta, resultado in zip(consultas[:-1], resultados):
+            individual = encontrar_match(consulta, umbral_similitud=0.3, usuarios_cache=self.usuarios)
+            self.assertEqual(resultado.total_comparaciones, individual.total_comparaciones)
+            if resultado.match and individual.match:
+                self.assertLessEqual(resultado.similitud, individual.similitud + 1e-6)
+        self.assertEqual(encontrar_matches_batch(np.empty((0, 512), dtype=np.float32)), [])
+
+
+class SincronizacionDeltaTests(TestCase):
+    """GaleriaService aplica los deltas de Firestore sobre el índice publicado."""
+
+    TAMANO = 300
+
+    def setUp(self):
+        from .services import galeria_service
+
+        self.firebase = mock.Mock()
+        for parche in (
+            mock.patch.object(galeria_service, 'firebase_service', self.firebase),
+            mock.patch.object(galeria_service.GaleriaService, '_instance', None),
+            mock.patch.object(galeria_service.GaleriaService, '_initialized', False),
+        ):
+            parche.start()
+            self.addCleanup(parche.stop)
+
+        self.usuarios, _ = usuarios_con_vectores(self.TAMANO, semilla=21)
+        for usuario in self.usuarios:
+            usuario.update(fecha_actualizacion='2026-10-01T00:00:00', fecha_actualizacion_vector='v1')
+        self.firebase.listar_usuarios_galeria.return_value = self.usuarios
+        self.servicio = galeria_service.GaleriaService()
+        self.servicio.recargar()
+        self.rng = np.random.default_rng(22)
+
+    def _ruts(self, vector, **kwargs):
+        candidatos, _ = self.servicio.obtener_indice().buscar(vector, k=3, modo='plantilla', **kwargs)
+        return [c['usuario']['rut'] for c in candidatos]
+
+    def test_delta_agrega_reemplaza_y_quita(self):
+        con_vector = [u for u in self.usuarios if u.get('vector_facial') and u['activo']]
+        reemplazado, desactivado, cambia_jornada = con_vector[:3]
+        nuevo_vector = self.rng.standard_normal(512).tolist()
+        delta = [
+            dict(self.usuarios[0], rut='NUEVO-1', vector_facial=self.rng.standard_normal(512).tolist()),
+            dict(reemplazado, vector_facial=nuevo_vector, fecha_actualizacion_vector='v2'),
+            dict(desactivado, activo=False),
+            dict(cambia_jornada, jornada='V' if cambia_jornada['jornada'] == 'D' else 'D'),
+        ]
+        for usuario in delta:
+            usuario['fecha_actualizacion'] = '2026-10-02T00:00:00'
+        self.firebase.listar_usuarios_galeria.return_value = delta
+
+        antes = len(self.servicio.obtener_indice())
+        self.servicio.sincronizar()
+        # Solo se piden los documentos posteriores a la carga (menos el margen)
+        self.assertIsNotNone(self.firebase.listar_usuarios_galeria.call_args.kwargs['desde'])
+
+        indice = self.servicio.obtener_indice()
+        self.assertEqual(len(indice), antes + 1)
+        self.assertEqual(self._ruts(delta[0]['vector_facial'])[0], 'NUEVO-1')
+        self.assertEqual(self._ruts(nuevo_vector)[0], reemplazado['rut'])
+        self.assertNotEqual(self._ruts(reemplazado['vector_facial'])[0], reemplazado['rut'])
+        self.assertNotIn(desactivado['rut'], self._ruts(desactivado['vector_facial']))
+        jornada = delta[3]['jornada']
+        self.assertEqual(self._ruts(cambia_jornada['vector_facial'], jornada=jornada)[0], cambia_jornada['rut'])
+
+        # Reactivar es un cambio de solo metadatos: mismo índice, en sitio
+        self.firebase.listar_usuarios_galeria.return_value = [dict(desactivado, activo=True)]
+        self.servicio.sincronizar()
+        self.assertIs(self.servicio.obtener_indice(), indice)
+        self.assertEqual(self._ruts(desactivado['vector_facial'])[0], desactivado['rut'])
+
+
+class RecallAproximadoTests(TestCase):
+    """Recall@1 de los backends aproximados frente a la búsqueda exacta."""
+
+    TAMANO = 8000
+    CONSULTAS = 300
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        from .services.indice_service import IndiceGaleria
+
+        cls.plantillas = generar_plantillas(cls.TAMANO, semilla=31)
+        cls.consultas, _ = generar_consultas(cls.plantillas, cls.CONSULTAS, semilla=32)
+        cls.exacto = IndiceGaleria.desde_matriz(usuarios_sinteticos(cls.TAMANO), cls.plantillas)
+
+    def _recall(self, indice, jornada=None):
+        esperados, _ = self.exacto.buscar_lote(self.consultas, k=1, jornada=jornada, modo='plantilla')
+        obtenidos, _ = indice.buscar_lote(self.consultas, k=1, jornada=jornada, modo='plantilla')
+        return float(np.mean([
+            a[0]['usuario']['rut'] == b[0]['usuario']['rut'] for a, b in zip(esperados, obtenidos)
+        ]))
+
+    def _con_ann(self, clase):
+        import copy
+
+        indice = copy.copy(self.exacto)
+        indice.ann = clase.entrenar(indice.matriz)
+        return indice
+
+    def test_ivf(self):
+        from .services.ann_service import IndiceIVF
+
+        indice = self._con_ann(IndiceIVF)
+        self.assertGreaterEqual(self._recall(indice), 0.95)
+        self.assertGreaterEqual(self._recall(indice, jornada='V'), 0.95)
+
+        # Las inserciones se asignan a las listas existentes sin reentrenar
+        nuevo = dict(usuarios_sinteticos(1)[0], rut='NUEVO-IVF', vector_facial=self.consultas[0].tolist())
+        derivado = indice.aplicar_cambios([nuevo])
+        self.assertIs(derivado.ann.centroides, indice.ann.centroides)
+        candidatos, _ = derivado.buscar(self.consultas[0], k=1, modo='plantilla')
+        self.assertEqual(candidatos[0]['usuario']['rut'], 'NUEVO-IVF')
+
+    def test_cascada(self):
+        from .services.ann_service import IndiceCascada
+
+        indice = self._con_ann(IndiceCascada)
+        self.assertGreaterEqual(self._recall(indice), 0.99)
+        self.assertGreaterEqual(self._recall(indice, jornada='D'), 0.99)
+
+        # Los candidatos se reordenan con el coseno exacto en 512-d
+        esperados, _ = self.exacto.buscar_lote(self.consultas[:20], k=1, modo='plantilla')
+        obtenidos, _ = indice.buscar_lote(self.consultas[:20], k=1, modo='plantilla')
+        for a, b in zip(esperados, obtenidos):
+            if a[0]['usuario']['rut'] == b[0]['usuario']['rut']:
+                self.assertAlmostEqual(a[0]['similitud'], b[0]['similitud'], places=5)
+
+
+class MultiPlantillaTests(TestCase):
+    """Agregación vectorizada por usuario contra el puntaje muestra por muestra."""
+
+    TAMANO = 300
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.usuarios, plantillas = usuarios_con_vectores(cls.TAMANO, semilla=41, muestras=6)
+        cls.consultas, _ = generar_consultas(plantillas, 10, semilla=42)
+
+    def _por_usuario(self, consulta, modo):
+        from .config import MATCHING_TOPK_MUESTRAS
+        from .services.indice_service import muestras_de_usuario, vector_de_usuario
+
+        consulta = consulta / np.linalg.norm(consulta)
+        puntajes = {}
+        for usuario in self.usuarios:
+            if not usuario['activo'] or vector_de_usuario(usuario) is None:
+                continue
+            muestras = np.array(muestras_de_usuario(usuario) or [vector_de_usuario(usuario)], dtype=np.float32)
+            similitudes = np.sort(muestras @ consulta / np.linalg.norm(muestras, axis=1))[::-1]
+            puntajes[usuario['rut']] = (
+                similitudes[0] if modo == 'max' else similitudes[:MATCHING_TOPK_MUESTRAS].mean()
+            )
+        return puntajes
+
+    def test_max_y_topk_media(self):
+        from .services.indice_service import IndiceGaleria
+
+        indice = IndiceGaleria.desde_usuarios(self.usuarios)
+        self.assertGreater(len(indice.muestras), len(indice))
+        for modo in ('max', 'topk_media'):
+            resultados, total = indice.buscar_lote(self.consultas, k=10, modo=modo)
+            for consulta, candidatos in zip(self.consultas, resultados):
+                esperados = self._por_usuario(consulta, modo)
+                self.assertEqual(total, len(esperados))
+                mejores = sorted(esperados, key=esperados.get, reverse=True)[:10]
+                self.assertEqual([c['usuario']['rut'] for c in candidatos], mejores)
+                for candidato in candidatos:
+                    self.assertAlmostEqual(
+                        candidato['similitud'], max(0.0, float(esperados[candidato['usuario']['rut']])), places=5
+                    )
+
+
+class DerivaCuantizacionTests(TestCase):
+    """Deriva de similitud y coincidencia del top-1 de float16/int8 contra float32."""
+
+    TAMANO = 5000
+    CONSULTAS = 200
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.plantillas = generar_plantillas(cls.TAMANO, semilla=7)
+        cls.consultas, _ = generar_consultas(cls.plantillas, cls.CONSULTAS, semilla=8)
+
+    def test_float16(self):
+        deriva = medir_deriva(self.plantillas, cuantizar(self.plantillas, 'float16'), self.consultas)
+        self.assertLess(deriva['deriva_maxima'], 5e-4)
+        self.assertEqual(deriva['coincidencia_top1'], 1.0)
+        self.assertEqual(deriva['bytes_cuantizada'] * 2, deriva['bytes_referencia'])
+
+    def test_int8(self):
+        deriva = medir_deriva(self.plantillas, cuantizar(self.plantillas, 'int8'), self.consultas)
+        self.assertLess(deriva['deriva_maxima'], 5e-3)
+        self.assertLess(deriva['deriva_media'], 1e-3)
+        self.assertGreaterEqual(deriva['coincidencia_top1'], 0.99)
+        # 1 byte por dimensión más una escala float32 por fila
+        self.assertLessEqual(deriva['bytes_cuantizada'] * 3.9, deriva['bytes_referencia'])
+
+    def test_indice_int8_coincide_con_float32(self):
+        from .services import indice_service
+
+        usuarios = usuarios_sinteticos(self.TAMANO)
+        exacto = indice_service.IndiceGaleria.desde_matriz(usuarios, self.plantillas)
+        with mock.patch.object(indice_service, 'GALLERY_DTYPE', 'int8'):
+            cuantizado = indice_service.IndiceGaleria.desde_matriz(usuarios, self.plantillas)
+
+        esperados, _ = exacto.buscar_lote(self.consultas, k=1, modo='plantilla')
+        obtenidos, _ = cuantizado.buscar_lote(self.consultas, k=1, modo='plantilla')
+        coincidencias = np.mean([
+            a[0]['usuario']['rut'] == b[0]['usuario']['rut'] for a, b in zip(esperados, obtenidos)
+        ])
+        self.assertGreaterEqual(coincidencias, 0.99)
+        self.assertLessEqual(cuantizado.memoria_bytes() * 3.5, exacto.memoria_bytes())
+
+    def test_reordenamiento_desde_snapshot(self):
+        import shutil
+        import tempfile
+        from .services import indice_service, snapshot_service
+
+        usuarios = usuarios_sinteticos(self.TAMANO)
+        exacto = indice_service.IndiceGaleria.desde_matriz(usuarios, self.plantillas)
+        with mock.patch.object(indice_service, 'GALLERY_DTYPE', 'int8'):
+            cuantizado = indice_service.IndiceGaleria.desde_matriz(
+                usuarios, self.plantillas, conservar_referencia=True
+            )
+        directorio = os.path.join(tempfile.mkdtemp(), 'galeria')
+        self.addCleanup(shutil.rmtree, os.path.dirname(directorio), True)
+        snapshot_service.guardar_snapshot(cuantizado, directorio, 'marca')
+
+        # Desactivado por defecto: la referencia ni siquiera se abre
+        abierto, _ = snapshot_service.abrir_snapshot(directorio)
+        self.assertIsNone(abierto.referencia)
+
+        with mock.patch.object(snapshot_service, 'GALLERY_RERANK_CANDIDATOS', 20), \
+                mock.patch.object(indice_service, 'GALLERY_RERANK_CANDIDATOS', 20):
+            abierto, _ = snapshot_service.abrir_snapshot(directorio)
+            self.assertIsInstance(abierto.referencia, np.memmap)
+            self.assertEqual(abierto.memoria_bytes(), cuantizado.memoria_bytes() - cuantizado.referencia.nbytes)
+            esperados, _ = exacto.buscar_lote(self.consultas, k=5, modo='plantilla')
+            obtenidos, _ = abierto.buscar_lote(self.consultas, k=5, modo='plantilla')
+
+        for a, b in zip(esperados, obtenidos):
+            self.assertEqual([c['usuario']['rut'] for c in a], [c['usuario']['rut'] for c in b])
+            for x, y in zip(a, b):
+                self.assertAlmostEqual(x['similitud'], y['similitud'], places=6)
+
+
+class SnapshotTests(TestCase):
+    """Ida y vuelta del snapshot en disco y el índice compuesto snapshot + delta."""
+
+    TAMANO = 500
+
+    def setUp(self):
+        import shutil
+        import tempfile
+
+        self.directorio = os.path.join(tempfile.mkdtemp(), 'galeria')
+        self.addCleanup(shutil.rmtree, os.path.dirname(self.directorio), True)
+        self.usuarios, plantillas = usuarios_con_vectores(self.TAMANO, semilla=51, muestras=4)
+        self.consultas, _ = generar_consultas(plantillas, 20, semilla=52)
+
+    def _ruts(self, resultados):
+        return [[(c['usuario']['rut'], round(c['similitud'], 5)) for c in r] for r in resultados]
+
+    def test_ida_y_vuelta(self):
+        from .services import indice_service
+        from .services.snapshot_service import abrir_snapshot, guardar_snapshot
+
+        for tipo in ('float32', 'int8'):
+            with mock.patch.object(indice_service, 'GALLERY_DTYPE', tipo):
+                indice = indice_service.IndiceGaleria.desde_usuarios(self.usuarios)
+            guardar_snapshot(indice, self.directorio, f'marca-{tipo}')
+            abierto, marca = abrir_snapshot(self.directorio)
+
+            self.assertEqual(marca, f'marca-{tipo}')
+            self.assertEqual([u['rut'] for u in abierto.usuarios], indice.ruts)
+            self.assertEqual(abierto.particiones, indice.particiones)
+            np.testing.assert_array_equal(abierto.activos, indice.activos)
+            np.testing.assert_array_equal(abierto.inicio_muestras, indice.inicio_muestras)
+            datos = abierto.matriz if tipo == 'float32' else abierto.matriz.datos
+            self.assertIsInstance(datos, np.memmap)
+            for modo in ('plantilla', 'max'):
+                for jornada in (None, 'V'):
+                    esperados, total = indice.buscar_lote(self.consultas, k=5, jornada=jornada, modo=modo)
+                    obtenidos, total_abierto = abierto.buscar_lote(self.consultas, k=5, jornada=jornada, modo=modo)
+                    self.assertEqual(total, total_abierto)
+                    self.assertEqual(self._ruts(esperados), self._ruts(obtenidos))
+
+    def test_compuesto_igual_a_reconstruir(self):
+        from .services.compuesto_service import IndiceCompuesto
+        from .services.indice_service import IndiceGaleria
+        from .services.snapshot_service import abrir_snapshot, guardar_snapshot
+
+        guardar_snapshot(IndiceGaleria.desde_usuarios(self.usuarios), self.directorio, 'marca')
+        base, _ = abrir_snapshot(self.directorio)
+        rng = np.random.default_rng(53)
+        con_vector = [u for u in self.usuarios if u.get('vector_facial')]
+        cambios = [
+            dict(con_vector[0], vector_facial=self.consultas[0].tolist(), fecha_actualizacion_vector='v2'),
+            dict(con_vector[1], activo=False),
+            dict(con_vector[2], rut='NUEVO-SNAP', vector_facial=rng.standard_normal(512).tolist()),
+        ]
+        compuesto = IndiceCompuesto(base).aplicar_cambios(cambios)
+        por_rut = {u['rut']: u for u in self.usuarios + cambios}
+        reconstruido = IndiceGaleria.desde_usuarios(list(por_rut.values()))
+
+        self.assertEqual(len(compuesto), len(reconstruido))
+        self.assertIsInstance(compuesto.base.matriz, np.memmap)
+        for jornada in (None, 'D', 'V'):
+            esperados, total = reconstruido.buscar_lote(self.consultas, k=5, jornada=jornada, modo='plantilla')
+            obtenidos, total_compuesto = compuesto.buscar_lote(self.consultas, k=5, jornada=jornada, modo='plantilla')
+            self.assertEqual(total, total_compuesto)
+            self.assertEqual(self._ruts(esperados), self._ruts(obtenidos))
+
+
+class ParticionJornadaTests(TestCase):
+    """Filtro por jornada sobre particiones contiguas y activo como máscara en sitio."""
+
+    TAMANO = 400
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.usuarios, plantillas = usuarios_con_vectores(cls.TAMANO, semilla=61)
+        # Tres jornadas intercaladas: el índice debe agruparlas igual
+        for i, usuario in enumerate(cls.usuarios):
+            usuario['jornada'] = ('D', 'V', 'N')[i % 3]
+        cls.consultas, _ = generar_consultas(plantillas, 15, semilla=62)
+
+    def _elegibles(self, jornada):
+        from .services.indice_service import vector_de_usuario
+
+        return {
+            u['rut'] for u in self.usuarios
+            if u['activo'] and vector_de_usuario(u) is not None and (not jornada or u['jornada'] == jornada)
+        }
+
+    def test_particiones_contiguas_y_filtro(self):
+        from .services.indice_service import IndiceGaleria
+
+        indice = IndiceGaleria.desde_usuarios(self.usuarios)
+        self.assertEqual(set(indice.particiones), {'D', 'V', 'N'})
+        for jornada, (inicio, fin) in indice.particiones.items():
+            self.assertTrue(all(u['jornada'] == jornada for u in indice.usuarios[inicio:fin]))
+
+        completo, _ = indice.buscar_lote(self.consultas, k=len(indice), modo='plantilla')
+        for jornada in (None, 'D', 'V', 'N', 'X'):
+            elegibles = self._elegibles(jornada)
+            resultados, total = indice.buscar_lote(self.consultas, k=10, jornada=jornada, modo='plantilla')
+            self.assertEqual(total, len(elegibles))
+            for todos, candidatos in zip(completo, resultados):
+                # Mismo orden que filtrar después la búsqueda sobre toda la galería
+                esperados = [c['usuario']['rut'] for c in todos if c['usuario']['rut'] in elegibles][:10]
+                self.assertEqual([c['usuario']['rut'] for c in candidatos], esperados)
+
+    def test_activo_en_sitio(self):
+        from .services.indice_service import IndiceGaleria
+
+        indice = IndiceGaleria.desde_usuarios(self.usuarios)
+        matriz = indice.matriz
+        candidatos, total = indice.buscar(self.consultas[0], k=1, jornada='V', modo='plantilla')
+        rut = candidatos[0]['usuario']['rut']
+
+        self.assertTrue(indice.marcar_activo(rut, False))
+        self.assertIs(indice.matriz, matriz)
+        otros, total_sin = indice.buscar(self.consultas[0], k=5, jornada='V', modo='plantilla')
+        self.assertEqual(total_sin, total - 1)
+        self.assertNotIn(rut, [c['usuario']['rut'] for c in otros])
+
+        self.assertTrue(indice.marcar_activo(rut, True))
+        candidatos, _ = indice.buscar(self.consultas[0], k=1, jornada='V', modo='plantilla')
+        self.assertEqual(candidatos[0]['usuario']['rut'], rut)
+        self.assertFalse(indice.marcar_activo('NO-EXISTE', False))
+
+
+class ImportacionPerezosaTests(TestCase):
+    """
+    Importar los servicios y las vistas no carga modelos, no conecta a
+    Firestore, no inicia procesos ni importa los SDK pesados, y el arranque
+    (importaciones y comandos manage.py) se mantiene dentro de un presupuesto.
+    """
+
+    MODULOS = (
+        'ann_service', 'calentamiento_service', 'camara_service', 'compuesto_service',
+        'extraccion_service', 'firebase_service', 'fragmentos_service', 'galeria_service',
+        'indice_service', 'inspireface_service', 'matching_service', 'seguimiento_service',
+        'snapshot_service', 'verificacion_service',
+    )
+    SDK = ('cv2', 'firebase_admin', 'inspireface')
+    # Segundos: importar tras django.setup() y un comando manage.py completo.
+    # Holgados respecto de benchmark_arranque (~0.15 s y ~0.7 s en desarrollo)
+    PRESUPUESTO_IMPORTACION_S = 1.0
+    PRESUPUESTO_COMANDO_S = 5.0
+
+    def test_importar_servicios_no_inicializa(self):
+        # Proceso aparte: otras pruebas pueden haber creado servicios en este
+        paquete = __package__
+        codigo = f"""
+import importlib, json, os, sys
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'reconocimiento_facial.settings')
+import django
+django.setup()
+for modulo in {self.MODULOS!r}:
+    importlib.import_module('{paquete}.services.' + modulo)
+from {paquete} import views
+for modulo in views.__all__:
+    getattr(views, modulo)
+from {paquete}.services import (
+    camara_service, extraccion_service, firebase_service, galeria_service,
+    inspireface_service, seguimiento_service, verificacion_service,
+)
+print(json.dumps({{
+    'firebase': firebase_service.firebase_service.inicializado,
+    'inspireface': inspireface_service.inspireface_service.inicializado,
+    'galeria': galeria_service.galeria_service.inicializado,
+    'plantillas': verificacion_service.cache_plantillas.inicializado,
+    'extraccion': extraccion_service.ejecutor_embeddings._ejecutor is not None,
+    'camaras': len(camara_service._capturadores),
+    'seguimientos': len(seguimiento_service._seguimientos),
+    'sdk': [sdk for sdk in {self.SDK!r} if sdk in sys.modules],
+}}))
+"""
+        raiz = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        proceso = subprocess.run(
+            [sys.executable, '-c', codigo], cwd=raiz, capture_output=True, text=True, timeout=120
+        )
+        self.assertEqual(proceso.returncode, 0, proceso.stderr)
+        self.assertEqual(json.loads(proceso.stdout.splitlines()[-1]), {
+            'firebase': False, 'inspireface': False, 'galeria': False, 'plantillas': False,
+            'extraccion': False, 'camaras': 0, 'seguimientos': 0, 'sdk': [],
+        })
+
+    def test_tiempo_de_arranque(self):
+        # Mismos casos que benchmark_arranque; el mínimo de 3 procesos descarta el ruido
+        from .management.commands import benchmark_arranque as arranque
+
+        for caso in ('servicios', 'vistas'):
+            medidas = [
+                json.loads(arranque._ejecutar([
+                    '-c', arranque.SCRIPT_IMPORTACION,
+                    json.dumps(arranque.CASOS_IMPORTACION[caso]), json.dumps([])
+                ])[1].strip().splitlines()[-1])['importacion_s']
+                for _ in range(3)
+            ]
+            self.assertLess(min(medidas), self.PRESUPUESTO_IMPORTACION_S, caso)
+        for caso, argumentos in arranque.CASOS_COMANDO.items():
+            duracion = min(arranque._ejecutar(['manage.py'] + argumentos)[0] for _ in range(3))
+            self.assertLess(duracion, self.PRESUPUESTO_COMANDO_S, caso)
+
+
+class GaleriaFragmentadaTests(TestCase):
+    """Los deltas sobre una galería fragmentada reutilizan el segmento compartido."""
+
+    TAMANO = 2000
+
+    def setUp(self):
+        from .services import indice_service
+
+        parches = [
+            mock.patch.object(indice_service, 'GALLERY_SHARDS', 2),
+            mock.patch.object(indice_service, 'GALLERY_SHARDS_MIN_SIZE', 100),
+        ]
+        for parche in parches:
+            parche.start()
+            self.addCleanup(parche.stop)
+
+        self.usuarios = usuarios_sinteticos(self.TAMANO)
+        self.base = indice_service.IndiceGaleria.desde_matriz(
+            self.usuarios, generar_plantillas(self.TAMANO, semilla=3)
+        )
+        self.indice = self.base.preparar_fragmentos()
+        self.addCleanup(self.indice.fragmentos.liberar)
+        self.rng = np.random.default_rng(4)
+
+    def _cambios(self, usuarios, marca):
+        return [
+            dict(u, vector_facial=self.rng.standard_normal(512).tolist(), fecha_actualizacion_vector=marca)
+            for u in usuarios
+        ]
+
+    def test_delta_escribe_en_el_mismo_segmento(self):
+        cambios = self._cambios(
+            self.usuarios[:10] + [dict(self.usuarios[0], rut=f'NUEVO-{i}') for i in range(5)], 'a'
+        )
+        esperado = self.base.aplicar_cambios(cambios)
+        indice = self.indice.aplicar_cambios(cambios)
+
+        self.assertIs(indice.fragmentos, self.indice.fragmentos)
+        self.assertIs(indice.preparar_fragmentos(), indice)
+        consultas = np.array([c['vector_facial'] for c in cambios], dtype=np.float32)
+        for jornada in (None, 'D', 'V'):
+            a, total_a = esperado.buscar_lote(consultas, k=3, jornada=jornada, modo='plantilla')
+            b, total_b = indice.buscar_lote(consultas, k=3, jornada=jornada, modo='plantilla')
+            self.assertEqual(total_a, total_b)
+            self.assertEqual(
+                [[c['usuario']['rut'] for c in r] for r in a],
+                [[c['usuario']['rut'] for c in r] for r in b]
+            )
+
+    def test_version_anterior_conserva_su_galeria(self):
+        import gc
+
+        originales = np.array([self.base.matriz[self.base.fila_por_rut[u['rut']]] for u in self.usuarios[:10]])
+        antes, _ = self.indice.buscar_lote(originales, k=1, modo='plantilla')
+        indice = self.indice.aplicar_cambios(self._cambios(self.usuarios[:10], 'a'))
+        fragmentos = self.indice.fragmentos
+        capacidad = len(indice)
+
+        # La versión anterior sigue encontrando las plantillas reemplazadas
+        # y sus filas no se reutilizan mientras exista
+        despues, _ = self.indice.buscar_lote(originales, k=1, modo='plantilla')
+        self.assertEqual([r[0]['usuario']['rut'] for r in despues], [u['rut'] for u in self.usuarios[:10]])
+        self.assertEqual(
+            [r[0]['similitud'] for r in antes], [r[0]['similitud'] for r in despues]
+        )
+        reutilizables = fragmentos.filas_reutilizables(0, capacidad)
+        liberadas = [self.indice.fila_por_rut[u['rut']] for u in self.usuarios[:10]]
+        self.assertFalse(np.isin(liberadas, reutilizables).any())
+
+        nuevos, _ = indice.buscar_lote(originales, k=1, modo='plantilla')
+        self.assertNotEqual(nuevos[0][0]['usuario']['rut'], self.usuarios[0]['rut'])
+
+        del self.indice
+        gc.collect()
+        self.assertTrue(np.isin(liberadas, fragmentos.filas_reutilizables(0, capacidad)).all())
+
+    def test_fragmento_fijo_por_proceso(self):
+        from .services import fragmentos_service
+
+        with mock.patch.object(fragmentos_service, 'GALLERY_SHARDS', 2):
+            fragmentos_service.cerrar_ejecutores()
+            self.addCleanup(fragmentos_service.cerrar_ejecutores)
+            ejecutores = fragmentos_service.obtener_ejecutores()
+        pids = [[e.submit(os.getpid).result() for e in ejecutores] for _ in range(3)]
+        self.assertEqual(len(set(pids[0])), 2)
+        self.assertEqual(pids, [pids[0]] * 3)
+
+    def test_sin_huecos_se_reconstruye_y_se_libera(self):
+        import gc
+
+        libres = self.indice.fragmentos.filas_reutilizables(0, len(self.indice))
+        nuevos = [dict(self.usuarios[0], rut=f'NUEVO-{i}') for i in range(len(libres))]
+        reconstruido = self.indice.aplicar_cambios(self._cambios(nuevos, 'b'))
+        self.assertIsNone(reconstruido.fragmentos)
+
+        publicado = reconstruido.preparar_fragmentos()
+        self.addCleanup(publicado.fragmentos.liberar)
+
+        # El segmento anterior sigue abierto mientras alguien use su índice
+        ruta = self.indice.fragmentos.ruta
+        candidatos, _ = self.indice.buscar(self.base.matriz[0], k=1, modo='plantilla')
+        self.assertEqual(candidatos[0]['usuario']['rut'], self.base.ruts[0])
+        self.assertTrue(os.path.exists(ruta))
+
+        del self.indice, candidatos
+        gc.collect()
+        self.assertFalse(os.path.exists(ruta))
+        self.assertTrue(os.path.exists(publicado.fragmentos.ruta))
+
+
+class SeguimientoDualTests(TestCase):
+    """Sin flujo principal, el modo dual extrae del subflujo con su propio mínimo."""
+
+    class _Ejecutor:
+        capacidad = 1
+
+        def __init__(self):
+            self.enviados = []
+
+        def submit(self, cuadro, return_quality=False, caja=None):
+            from concurrent.futures import Future
+
+            self.enviados.append((cuadro, caja))
+            futuro = Future()
+            futuro.set_result(np.ones(512, dtype=np.float32))
+            return futuro
+
+        def resultado(self, futuro, cuadro, return_quality=False, caja=None):
+            return futuro.result()
+
+    def test_respaldo_del_subflujo_extrae(self):
+        from types import SimpleNamespace
+        from .config import MIN_FACE_PIXEL_SIZE
+        from .services import camara_service, seguimiento_service
+
+        alto = mock.Mock(conectado=False, resolucion=(1920, 1080), url='rtsp://alto')
+        dual = camara_service.FuenteDual(mock.Mock(url='rtsp://bajo'), alto)
+        cuadros = [np.zeros((360, 640, 3), dtype=np.uint8) for _ in range(3)]
+        tam_minimo = dual.tam_minimo_bajo(cuadros[0])
+        # Rostro mayor que el mínimo del subflujo pero menor que MIN_FACE_PIXEL_SIZE
+        caja = (100, 100, 140, 140)
+        self.assertLess(tam_minimo, 40)
+        self.assertLess(40, MIN_FACE_PIXEL_SIZE)
+
+        face = SimpleNamespace(track_id=1, detection_confidence=0.9)
+        sdk = mock.Mock()
+        sdk.detectar_en_video.return_value = [(caja, face)]
+        sdk.evaluar_calidad.return_value = None
+        ejecutor = self._Ejecutor()
+        with mock.patch.object(seguimiento_service, 'inspireface_service', sdk):
+            generados = list(seguimiento_service.seguir_y_extraer(cuadros, ejecutor, dual=dual, todas=True))
+
+        self.assertEqual(len(ejecutor.enviados), 3)
+        self.assertTrue(all(imagen is cuadro for (imagen, _), cuadro in zip(ejecutor.enviados, cuadros)))
+        self.assertTrue(all(muestra is not None for _, _, muestra in generados))
+        self.assertEqual(generados[-1][1].muestras, 3)
+        for llamada in sdk.evaluar_calidad.call_args_list:
+            self.assertEqual(llamada.kwargs['tam_minimo'], tam_minimo)
+        alto.soltar.assert_called()
+
+    def test_tam_minimo_del_filtro_de_calidad(self):
+        from types import SimpleNamespace
+        from .services.inspireface_service import InspireFaceService
+
+        imagen = np.zeros((360, 640, 3), dtype=np.uint8)
+        caja = (100, 100, 140, 140)
+        # Confianza baja: el rechazo siguiente al tamaño, sin llegar a OpenCV
+        face = SimpleNamespace(detection_confidence=0.0)
+        motivo = InspireFaceService._motivo_rechazo
+        self.assertEqual(motivo(None, imagen, caja, face), 'tamano')
+        self.assertEqual(motivo(None, imagen, caja, face, tam_minimo=30), 'confianza')
+
+
+class FuenteFFmpegTests(TestCase):
+    """Backend ffmpeg: préstamo de los buffers del pool y captura sin OpenCV."""
+
+    def _fuente(self, cuadros, buffers=2):
+        import io
+        from .services import camara_service
+
+        proceso = mock.Mock(stdout=io.BytesIO(b''.join(bytes([i]) * 24 for i in range(cuadros))))
+        proceso.poll.return_value = None
+        with mock.patch.object(camara_service.subprocess, 'Popen', return_value=proceso):
+            return camara_service.FuenteFFmpeg('rtsp://camara', resolucion=(4, 2), buffers=buffers)
+
+    def test_cuadro_retenido_no_se_sobrescribe(self):
+        import gc
+
+        fuente = self._fuente(6)
+        _, primero = fuente.read()
+        recorte = primero[:1, 1:3]
+        del primero
+        fuente.read()
+        _, tercero = fuente.read()  # Vuelve al buffer del primero, retenido por el recorte
+        self.assertEqual(fuente.buffers_reemplazados, 1)
+        self.assertTrue((recorte == 0).all())
+        self.assertTrue((tercero == 2).all())
+
+        del recorte, tercero
+        gc.collect()
+        fuente.read()
+        fuente.read()
+        self.assertEqual(fuente.buffers_reemplazados, 1)
+        ok, sexto = fuente.read()
+        self.assertTrue(ok)
+        self.assertEqual(sexto.shape, (2, 4, 3))
+        self.assertTrue((sexto == 5).all())
+        self.assertEqual(fuente.read(), (False, None))
+
+    def test_capturador_ffmpeg_sin_opencv(self):
+        from .services import camara_service
+
+        fuente = self._fuente(3)
+        capturador = camara_service.CapturadorRTSP('rtsp://camara', resolucion=(4, 2), backend='ffmpeg')
+        # cv2 = None en sys.modules: cualquier import de OpenCV falla
+        with mock.patch.dict(sys.modules, {'cv2': None}), \
+                mock.patch.object(capturador, '_abrir', return_value=fuente):
+            cuadro = capturador.siguiente(timeout=5)
+            capturador.soltar(0)
+        self.assertIsNotNone(cuadro)
+        self.assertEqual(cuadro.imagen.shape, (2, 4, 3))
+
+
+class CachePlantillasTests(TestCase):
+    """Verificación 1:1 contra la cache por RUT y su invalidación por escrituras."""
+
+    def setUp(self):
+        from .services import firebase_service, matching_service, verificacion_service
+
+        self.usuarios, self.plantillas = usuarios_con_vectores(20, semilla=31)
+        self.documentos = {u['rut']: dict(u, imagen='data:image/png;base64,AAAA') for u in self.usuarios}
+
+        # FirebaseService real (observadores y actualizar_usuario) sobre una base simulada
+        self.firebase = object.__new__(firebase_service.FirebaseService)
+        self.firebase._observadores = []
+        self.firebase.db = mock.Mock()
+        self.firebase.db.collection.return_value.document.side_effect = self._documento
+        self.firebase.obtener_usuario_por_rut = mock.Mock(side_effect=lambda rut: dict(self.documentos[rut]))
+
+        for parche in (
+            mock.patch.object(verificacion_service.CachePlantillas, '_instance', None),
+            mock.patch.object(verificacion_service.CachePlantillas, '_initialized', False),
+        ):
+            parche.start()
+            self.addCleanup(parche.stop)
+        self.cache = verificacion_service.CachePlantillas(self.firebase)
+        parche = mock.patch.object(matching_service, 'cache_plantillas', self.cache)
+        parche.start()
+        self.addCleanup(parche.stop)
+
+    def _documento(self, rut):
+        referencia = mock.Mock()
+        referencia.get.return_value.exists = True
+        referencia.update.side_effect = lambda campos: self.documentos[rut].update(campos)
+        return referencia
+
+    def _verificar(self, i, vector=None):
+        from .services.matching_service import verificar_usuario
+
+        return verificar_usuario(self.plantillas[i] if vector is None else vector, self.usuarios[i]['rut'])
+
+    def test_usuario_inactivo_no_se_verifica(self):
+        i = next(i for i, u in enumerate(self.usuarios) if not u['activo'] and u.get('vector_facial'))
+        resultado = self._verificar(i)
+        self.assertFalse(resultado['verificado'])
+        self.assertEqual(resultado['error'], 'Usuario inactivo')
+
+        self.assertTrue(self.firebase.actualizar_usuario(self.usuarios[i]['rut'], activo=True))
+        self.assertTrue(self._verificar(i)['verificado'])
+        self.assertTrue(self.firebase.eliminar_usuario(self.usuarios[i]['rut']))
+        self.assertEqual(self._verificar(i)['error'], 'Usuario inactivo')
+
+    def test_cambio_de_vector_invalida_la_entrada(self):
+        i = next(i for i, u in enumerate(self.usuarios) if u['activo'] and u.get('vector_facial'))
+        rut = self.usuarios[i]['rut']
+        self.assertTrue(self._verificar(i)['verificado'])
+        self.assertTrue(self._verificar(i)['verificado'])
+        self.assertEqual((self.cache.aciertos, self.cache.fallos), (1, 1))
+        self.assertNotIn('imagen', self.cache.obtener(rut)[1])
+
+        nuevo = self.plantillas[(i + 1) % len(self.plantillas)]
+        self.assertTrue(self.firebase.actualizar_vector_facial(rut, nuevo))
+        self.assertFalse(self._verificar(i)['verificado'])
+        self.assertTrue(self._verificar(i, nuevo)['verificado'])
+        self.assertEqual(self.firebase.obtener_usuario_por_rut.call_count, 2)
+
+    def test_otra_fuente_es_un_error(self):
+        from .services.verificacion_service import CachePlantillas
+
+        self.assertIs(CachePlantillas(), self.cache)
+        self.assertIs(CachePlantillas(self.firebase), self.cache)
+        with self.assertRaises(RuntimeError):
+            CachePlantillas(mock.Mock())
+
+
+class CapturaGrupalTests(TestCase):
+    """El modo grupal confirma en Luckfox dentro de un plazo y registra en un lote."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        import django
+
+        os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'reconocimiento_facial.settings')
+        django.setup()
+
+    def test_confirmados_en_un_lote_y_pendientes_tras_el_plazo(self):
+        import time
+        import types
+        from types import SimpleNamespace
+        from .views import reconocimiento_views as vistas
+
+        usuarios = usuarios_sinteticos(3)
+        resultados = [SimpleNamespace(match=True, usuario=u, similitud=0.9 - i / 10) for i, u in enumerate(usuarios)]
+        capturador = mock.Mock()
+        capturador.suscribir.return_value = iter([SimpleNamespace(imagen=np.zeros((4, 4, 3), dtype=np.uint8))])
+        sdk = mock.Mock()
+        sdk.get_multiple_embeddings.return_value = [(np.ones(512, dtype=np.float32), None)] * 3
+        firebase = mock.Mock()
+        firebase.obtener_usuario_por_rut.side_effect = lambda rut: dict(
+            next(u for u in usuarios if u['rut'] == rut), imagen='data:image/png;base64,AAAA'
+        )
+        firebase.registrar_asistencias_lote.side_effect = lambda evento, registros, metodo: [
+            {'rut_usuario': r['rut_usuario'], 'status': 'registrada'} for r in registros
+        ]
+
+        # Luckfox: el primero confirma; el segundo no responde y agota su plazo,
+        # que es todo lo que quedaba del grupo
+        plazos = []
+
+        def enviar(imagen, timeout=30):
+            plazos.append(timeout)
+            if len(plazos) == 1:
+                return True
+            time.sleep(timeout)
+            return False
+
+        luckfox = types.ModuleType('luckfox_client')
+        luckfox.generate_credential_image = mock.Mock()
+        luckfox.send_image_to_luckfox = enviar
+        with mock.patch.object(vistas, 'obtener_capturador', return_value=capturador), \
+                mock.patch.object(vistas, 'inspireface_service', sdk), \
+                mock.patch.object(vistas, 'encontrar_matches_batch', return_value=resultados), \
+                mock.patch.object(vistas, 'firebase_service', firebase), \
+                mock.patch.object(vistas, 'LUCKFOX_GRUPO_TIMEOUT', 0.3), \
+                mock.patch.object(vistas, 'LUCKFOX_GRUPO_TIMEOUT_USUARIO', 0.3), \
+                mock.patch.dict(sys.modules, {f'{__package__}.services.luckfox_client': luckfox}):
+            respuesta = json.loads(vistas._capturar_grupo('EVENTO-1').content)
+
+        self.assertEqual(len(plazos), 2)
+        self.assertTrue(all(plazo <= 0.3 for plazo in plazos))
+        firebase.registrar_asistencias_lote.assert_called_once_with(
+            'EVENTO-1', [{'rut_usuario': usuarios[0]['rut'], 'similitud': 0.9}], metodo='biometrico'
+        )
+        self.assertTrue(respuesta['success'] and respuesta['modo_grupal'] and respuesta['match'])
+        self.assertEqual(
+            [(r['usuario']['rut'], r['asistencia']) for r in respuesta['resultados']],
+            [(usuarios[0]['rut'], 'registrada'), (usuarios[1]['rut'], 'rechazada'), (usuarios[2]['rut'], 'pendiente')]
+        )
+        self.assertEqual(respuesta['resultados'][0]['usuario']['imagen'], 'data:image/png;base64,AAAA')
+        self.assertEqual((respuesta['rostros_detectados'], respuesta['rostros_sin_match']), (3, 0))
@@ -0,0 +1,158 @@
+"""
+-----------------------------------------------------------------------------
+Archivo: cuantizacion.py
+Descripcion: Almacenamiento compacto de matrices de plantillas faciales.
+             Soporta float16 e int8 simetrico con una escala por fila, con
+             producto por bloques directamente sobre los datos cuantizados
+             y medicion de la deriva de similitud respecto de float32.
+Fecha de creacion: 16 de Octubre 2026
+Fecha de modificacion: 16 de Octubre 2026
+Autores:
+    Roberto Leal
+    William Tapia
+-----------------------------------------------------------------------------
+"""
+from typing import Any, Dict, List, Optional, Union
+import numpy as np
+
+# Filas convertidas a float32 por bloque durante el producto (limita memoria temporal)
+BLOQUE_FILAS = 8192
+
+TIPOS_SOPORTADOS = ('float32', 'float16', 'int8')
+
+
+class MatrizCuantizada:
+    """
+    Matriz (N, D) guardada en float16 o int8.
+
+    En int8 cada fila i se reconstruye como `datos[i] * escalas[i]`, con
+    `escalas[i] = max|x_i| / 127`. Imita la parte de la interfaz de ndarray que
+    usa la galería: `shape`, `ndim`, indexación por filas, `@` y conversión
+    con `np.asarray`.
+    """
+
+    def __init__(self, datos: np.ndarray, escalas: Optional[np.ndarray] = None):
+        self.datos = datos
+        self.escalas = escalas
+
+    @classmethod
+    def desde_float32(cls, matriz: np.ndarray, tipo: str) -> 'MatrizCuantizada':
+        """Cuantiza una matriz float32 al tipo indicado ('float16' o 'int8')."""
+        if tipo == 'float16':
+            return cls(np.ascontiguousarray(matriz, dtype=np.float16))
+
+        if tipo == 'int8':
+            maximos = np.abs(matriz).max(axis=1) if matriz.size else np.zeros(matriz.shape[0], np.float32)
+            escalas = (np.where(maximos > 0, maximos, 1.0) / 127.0).astype(np.float32)
+            datos = np.clip(np.rint(matriz / escalas[:, None]), -127, 127).astype(np.int8)
+            return cls(np.ascontiguousarray(datos), escalas)
+
+        raise ValueError(f"Tipo de cuantización no soportado: {tipo}")
+
+    @property
+    def tipo(self) -> str:
+        return 'int8' if self.escalas is not None else 'float16'
+
+    @property
+    def shape(self):
+        return self.datos.shape
+
+    @property
+    def ndim(self) -> int:
+        return self.datos.ndim
+
+    @property
+    def nbytes(self) -> int:
+        return self.datos.nbytes + (self.escalas.nbytes if self.escalas is not None else 0)
+
+    def __len__(self) -> int:
+        return self.datos.shape[0]
+
+    def __getitem__(self, filas) -> 'MatrizCuantizada':
+        escalas = self.escalas[filas] if self.escalas is not None else None
+        return MatrizCuantizada(self.datos[filas], escalas)
+
+    def __array__(self, dtype=None, copy=None) -> np.ndarray:
+        matriz = self.a_float32()
+        return matriz if dtype is None else matriz.astype(dtype, copy=False)
+
+    def a_float32(self, inicio: int = 0, fin: Optional[int] = None) -> np.ndarray:
+        """Reconstruye (de-cuantiza) las filas [inicio, fin) en float32."""
+        bloque = self.datos[inicio:fin].astype(np.float32)
+        if self.escalas is not None:
+            bloque *= self.escalas[inicio:fin, None]
+        return bloque
+
+    def __matmul__(self, otro: np.ndarray) -> np.ndarray:
+        """
+        Producto con un vector (D,) o matriz (D, M) en float32, convirtiendo
+        por bloques. En int8 la escala se aplica al resultado de cada fila.
+        """
+        otro = np.asarray(otro, dtype=np.float32)
+        n = self.datos.shape[0]
+        salida = np.empty((n,) + otro.shape[1:], dtype=np.float32)
+
+        for inicio in range(0, n, BLOQUE_FILAS):
+            fin = min(inicio + BLOQUE_FILAS, n)
+            parcial = self.datos[inicio:fin].astype(np.float32) @ otro
+            if self.escalas is not None:
+                escalas = self.escalas[inicio:fin]
+                parcial *= escalas if parcial.ndim == 1 else escalas[:, None]
+            salida[inicio:fin] = parcial
+
+        return salida
+
+
+Matriz = Union[np.ndarray, MatrizCuantizada]
+
+
+def cuantizar(matriz: np.ndarray, tipo: str) -> Matriz:
+    """Retorna la matriz en el tipo de almacenamiento pedido ('float32' la deja igual)."""
+    if tipo == 'float32':
+        return matriz
+    return MatrizCuantizada.desde_float32(matriz, tipo)
+
+
+def tomar_filas(matriz: Matriz, filas: np.ndarray) -> Matriz:
+    """Copia contigua de las filas indicadas, conservando el tipo de almacenamiento."""
+    if isinstance(matriz, MatrizCuantizada):
+        return matriz[filas]
+    return np.ascontiguousarray(matriz[filas])
+
+
+def concatenar(matrices: List[Matriz]) -> Matriz:
+    """Concatena matrices por filas conservando el tipo de la primera."""
+    if not isinstance(matrices[0], MatrizCuantizada):
+        return np.concatenate([np.asarray(m, dtype=np.float32) for m in matrices])
+
+    tipo = matrices[0].tipo
+    partes = [m if isinstance(m, MatrizCuantizada) else MatrizCuantizada.desde_float32(m, tipo) for m in matrices]
+    datos = np.concatenate([p.datos for p in partes])
+    escalas = np.concatenate([p.escalas for p in partes]) if tipo == 'int8' else None
+    return MatrizCuantizada(datos, escalas)
+
+
+def medir_deriva(referencia: np.ndarray, cuantizada: Matriz, consultas: np.ndarray) -> Dict[str, Any]:
+    """
+    Compara similitudes de una matriz cuantizada contra la referencia float32.
+
+    Args:
+        referencia: Matriz float32 normalizada (N, D)
+        cuantizada: La misma matriz en almacenamiento compacto
+        consultas: Consultas normalizadas (Q, D)
+
+    Returns:
+        Dict con deriva máxima y media absoluta de similitud, y la fracción de
+        consultas cuyo top-1 coincide con el de float32
+    """
+    exactas = (referencia @ consultas.T).T
+    aproximadas = (cuantizada @ consultas.T).T
+    deriva = np.abs(exactas - aproximadas)
+
+    return {
+        'deriva_maxima': float(deriva.max()) if deriva.size else 0.0,
+        'deriva_media': float(deriva.mean()) if deriva.size else 0.0,
+        'coincidencia_top1': float(np.mean(exactas.argmax(axis=1) == aproximadas.argmax(axis=1))) if deriva.size else 1.0,
+        'bytes_referencia': int(referencia.nbytes),
+        'bytes_cuantizada': int(cuantizada.nbytes)
+    }
@@ -0,0 +1,89 @@
+"""
+-----------------------------------------------------------------------------
+Archivo: galeria_sintetica.py
+Descripcion: Generacion reproducible de galerias biometricas sinteticas
+             (vectores de 512 dimensiones L2-normalizados) para medir el
+             motor de matching sin camara ni Firestore. Las plantillas
+             tienen estructura de baja dimension intrinseca, como los
+             embeddings faciales reales, y las consultas son plantillas
+             de la galeria perturbadas con ruido.
+Fecha de creacion: 16 de Octubre 2026
+Fecha de modificacion: 16 de Octubre 2026
+Autores:
+    Roberto Leal
+    William Tapia
+-----------------------------------------------------------------------------
+"""
+from typing import Any, Dict, List, Tuple
+import numpy as np
+
+# Filas generadas por bloque (limita memoria temporal en galerías de millones)
+_BLOQUE_GENERACION = 65536
+
+
+def _normalizar(matriz: np.ndarray) -> np.ndarray:
+    normas = np.linalg.norm(matriz, axis=1, keepdims=True)
+    matriz /= np.where(normas > 0, normas, 1.0)
+    return matriz
+
+
+def generar_plantillas(
+    cantidad: int,
+    dimension: int = 512,
+    dimension_latente: int = 64,
+    ruido: float = 0.3,
+    semilla: int = 0
+) -> np.ndarray:
+    """
+    Genera `cantidad` plantillas normalizadas (cantidad, dimension) float32.
+
+    Cada plantilla es una combinación de `dimension_latente` direcciones
+    fijas más ruido isotrópico, de modo que la galería concentra su varianza
+    en pocas componentes (como los embeddings de InspireFace).
+    """
+    rng = np.random.default_rng(semilla)
+    mezcla = rng.standard_normal((dimension_latente, dimension)).astype(np.float32)
+    mezcla /= np.sqrt(dimension_latente)
+
+    plantillas = np.empty((cantidad, dimension), dtype=np.float32)
+    for inicio in range(0, cantidad, _BLOQUE_GENERACION):
+        fin = min(inicio + _BLOQUE_GENERACION, cantidad)
+        latentes = rng.standard_normal((fin - inicio, dimension_latente), dtype=np.float32)
+        bloque = latentes @ mezcla
+        bloque += ruido * rng.standard_normal(bloque.shape, dtype=np.float32)
+        plantillas[inicio:fin] = _normalizar(bloque)
+    return plantillas
+
+
+def generar_consultas(
+    plantillas: np.ndarray,
+    cantidad: int,
+    ruido: float = 0.6,
+    semilla: int = 1
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Consultas normalizadas a partir de plantillas elegidas al azar más ruido
+    (otra captura del mismo rostro).
+
+    Returns:
+        Tupla (consultas (cantidad, D), filas de origen en la galería)
+    """
+    rng = np.random.default_rng(semilla)
+    filas = rng.choice(plantillas.shape[0], cantidad, replace=cantidad > plantillas.shape[0])
+    escala = ruido / np.sqrt(plantillas.shape[1])
+    consultas = plantillas[filas] + escala * rng.standard_normal((cantidad, plantillas.shape[1]), dtype=np.float32)
+    return _normalizar(consultas.astype(np.float32)), filas
+
+
+def usuarios_sinteticos(cantidad: int, jornadas: Tuple[str, ...] = ('D', 'V')) -> List[Dict[str, Any]]:
+    """Metadatos de usuario (sin vectores) para una galería sintética."""
+    return [
+        {
+            'rut': f'SINT-{i:07d}',
+            'nombre': f'Usuario sintético {i}',
+            'carrera': 'Sintética',
+            'jornada': jornadas[i % len(jornadas)],
+            'activo': True
+        }
+        for i in range(cantidad)
+    ]
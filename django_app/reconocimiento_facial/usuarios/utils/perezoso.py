@@ -0,0 +1,55 @@
+"""
+-----------------------------------------------------------------------------
+Archivo: perezoso.py
+Descripcion: Proxy de inicializacion diferida para los servicios singleton.
+             Importar un modulo de servicios ya no carga los modelos de
+             InspireFace ni abre la conexion a Firestore: el servicio se
+             crea en el primer acceso a uno de sus atributos (o al
+             calentar el proceso con `manage.py calentar`).
+Fecha de creacion: 17 de Octubre 2026
+Fecha de modificacion: 17 de Octubre 2026
+Autores:
+    Roberto Leal
+    William Tapia
+-----------------------------------------------------------------------------
+"""
+from typing import Any, Callable
+import threading
+
+
+class ServicioPerezoso:
+    """
+    Proxy que crea el servicio con `fabrica()` en el primer acceso.
+
+    Los atributos se delegan al servicio real, de modo que los módulos
+    siguen usando `from .x_service import x_service` sin cambios.
+    """
+
+    def __init__(self, fabrica: Callable[[], Any]):
+        self._fabrica = fabrica
+        self._servicio = None
+        self._lock = threading.Lock()
+
+    def obtener(self) -> Any:
+        """Retorna el servicio, creándolo si aún no existe."""
+        servicio = self._servicio
+        if servicio is None:
+            with self._lock:
+                if self._servicio is None:
+                    self._servicio = self._fabrica()
+                servicio = self._servicio
+        return servicio
+
+    @property
+    def inicializado(self) -> bool:
+        """True si el servicio ya fue creado en este proceso."""
+        return self._servicio is not None
+
+    def __getattr__(self, nombre: str) -> Any:
+        # Solo se invoca para atributos que no son del proxy
+        return getattr(self.obtener(), nombre)
+
+    def __repr__(self) -> str:
+        nombre = getattr(self._fabrica, '__name__', repr(self._fabrica))
+        estado = 'inicializado' if self.inicializado else 'pendiente'
+        return f"<ServicioPerezoso {nombre} ({estado})>"
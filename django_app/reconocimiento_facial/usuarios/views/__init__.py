@@ -1,17 +1,8 @@
 # Este paquete contiene las vistas organizadas por funcionalidad
-
-from . import (
-    usuario_views,
-    evento_views,
-    asistencia_views,
-    reconocimiento_views,
-    luckfox_views,
-    firebase_views,
-    web_views,
-    usuario_api_views,
-    luckfox_stream_limpio,
-    admin_views
-)
+#
+# Los modulos se importan en el primer acceso (PEP 562): importar el paquete
+# no carga cv2, InspireFace ni openpyxl. urls.py los importa al resolver rutas.
+import importlib
 
 __all__ = [
     'usuario_views',
@@ -25,3 +16,11 @@ __all__ = [
     'luckfox_stream_limpio',
     'admin_views'
 ]
+
+
+def __getattr__(nombre):
+    if nombre in __all__:
+        modulo = importlib.import_module(f'.{nombre}', __name__)
+        globals()[nombre] = modulo
+        return modulo
+    raise AttributeError(f"module {__name__!r} has no attribute {nombre!r}")
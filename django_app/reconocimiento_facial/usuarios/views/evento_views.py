@@ -6,7 +6,7 @@ Descripcion: Controlador CRUD para gestion de eventos academicos.
              Actualiza automaticamente el estado (pendiente/activo/finalizado)
              segun fecha y hora. Exporta planillas de asistencia a Excel.
 Fecha de creacion: 01 de Noviembre 2025
-Fecha de modificacion: 20 de Diciembre 2025
+Fecha de modificacion: 17 de Octubre 2026
 Autores:
     Roberto Leal
     William Tapia
@@ -19,8 +19,6 @@ from django.http import HttpResponse
 from ..services.firebase_service import firebase_service
 from ..decorators import admin_required
 from datetime import datetime
-from openpyxl import Workbook
-from openpyxl.styles import Font, Alignment, Border, Side, PatternFill
 
 
 
@@ -266,6 +264,10 @@ def eliminar_evento(request, evento_id):
 @admin_required
 def descargar_planilla_evento(request, evento_id):
     """Descarga un archivo Excel con la lista de asistentes al evento."""
+    # openpyxl solo se carga al exportar, no al iniciar cada proceso
+    from openpyxl import Workbook
+    from openpyxl.styles import Font, Alignment, Border, Side, PatternFill
+    
     try:
         # Obtener datos del evento
         evento = firebase_service.obtener_evento(evento_id)
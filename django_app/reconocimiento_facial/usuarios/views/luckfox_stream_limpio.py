@@ -3,9 +3,10 @@
 Archivo: luckfox_stream_limpio.py
 Descripcion: Stream RTSP sin deteccion facial para captura de foto de
              perfil. Transmite video limpio sin recuadros de deteccion
-             para obtener imagenes de alta calidad.
+             para obtener imagenes de alta calidad. Los cuadros provienen
+             del capturador RTSP compartido de la camara.
 Fecha de creacion: 08 de Diciembre 2025
-Fecha de modificacion: 20 de Diciembre 2025
+Fecha de modificacion: 17 de Octubre 2026
 Autores:
     Roberto Leal
     William Tapia
@@ -13,8 +14,9 @@ Autores:
 """
 
 from django.http import StreamingHttpResponse
-import cv2
-import time
+
+from ..config import RTSP_URL_HIGH
+from ..services.camara_service import obtener_capturador
 
 def luckfox_stream_limpio(request):
     """
@@ -22,24 +24,15 @@ def luckfox_stream_limpio(request):
     Solo para captura de foto de perfil (imagen limpia).
     """
     def generate():
-        cap = None
+        import cv2
+
         try:
             print("📹 Iniciando stream limpio (sin detección)")
             
-            # Conectar al RTSP en alta calidad
-            cap = cv2.VideoCapture('rtsp://172.32.0.93/live/0', cv2.CAP_FFMPEG)
-            cap.set(cv2.CAP_PROP_BUFFERSIZE, 300)
-            cap.set(cv2.CAP_PROP_FPS, 30)
-            
-            while True:
-                ret, frame = cap.read()
-                
-                if not ret:
-                    time.sleep(0.01)
-                    continue
-                
+            # Capturador compartido en alta calidad (sin conexión RTSP propia)
+            for cuadro in obtener_capturador(RTSP_URL_HIGH).suscribir():
                 # Redimensionar a 1280x720 HD (SIN detección)
-                frame_resized = cv2.resize(frame, (1280, 720), interpolation=cv2.INTER_LINEAR)
+                frame_resized = cv2.resize(cuadro.imagen, (1280, 720), interpolation=cv2.INTER_LINEAR)
                 
                # Codificar a JPEG con calidad 92
                 ret, buffer = cv2.imencode('.jpg', frame_resized, [
@@ -60,9 +53,7 @@ def luckfox_stream_limpio(request):
         except Exception as e:
             print(f"❌ Error en stream limpio: {e}")
         finally:
-            if cap is not None:
-                cap.release()
-                print("📹 Stream limpio liberado")
+            print("📹 Stream limpio liberado")
     
     return StreamingHttpResponse(
         generate(),
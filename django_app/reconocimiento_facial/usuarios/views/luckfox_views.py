@@ -5,8 +5,14 @@ Descripcion: Controlador de captura biometrica y streaming de video.
              Gestiona la captura de 100 frames para registro de usuarios,
              extraccion de vectores faciales, transmision de stream RTSP
              al navegador, y guardado de usuarios en Firebase.
+             Los embeddings de registro se extraen en paralelo en el pool
+             de procesos de extraccion y se acumulan en una matriz float32
+             preasignada (sin listas de Python). Los cuadros provienen del
+             capturador RTSP compartido de la camara (sin reconectar por
+             peticion). OpenCV se importa en las funciones que codifican
+             JPEG, no al importar el modulo.
 Fecha de creacion: 20 de Octubre 2025
-Fecha de modificacion: 20 de Diciembre 2025
+Fecha de modificacion: 17 de Octubre 2026
 Autores:
     Roberto Leal
     William Tapia
@@ -19,8 +25,10 @@ from django.views.decorators.http import require_http_methods
 from django.views.decorators.csrf import csrf_exempt
 import json
 from ..services.firebase_service import firebase_service
+from ..services.extraccion_service import ejecutor_embeddings
 from ..services.inspireface_service import inspireface_service
-import cv2
+from ..services.camara_service import obtener_capturador, obtener_fuente_dual
+from ..config import CAMERA_DUAL_STREAM, DIMENSION_EMBEDDING, RTSP_URL_HIGH
 import base64
 import time
 import numpy as np
@@ -31,10 +39,6 @@ LUCKFOX_IP = '172.32.0.93'
 LUCKFOX_PORT = 8080
 SOCKET_TIMEOUT = 10
 
-# Configuración RTSP
-RTSP_URL_HIGH = f'rtsp://{LUCKFOX_IP}/live/0'
-RTSP_URL_LOW = f'rtsp://{LUCKFOX_IP}/live/1'
-
 # Variable global para compartir progreso de captura
 capture_progress = {
     'active': False,
@@ -73,11 +77,13 @@ def capturar_rostro_luckfox(request):
         
         print(f"📸 Iniciando captura InspireFace para: {nombre}")
         
-        # Conectar al stream RTSP
-        cap = cv2.VideoCapture(RTSP_URL_HIGH, cv2.CAP_FFMPEG)
-        cap.set(cv2.CAP_PROP_BUFFERSIZE, 1) # Buffer mínimo para reducir latencia
+        # Capturador compartido de la cámara: ya decodifica de forma continua,
+        # sin handshake RTSP ni cuadros descartados por captura. En modo dual se
+        # sigue el rostro en el subflujo y solo se recorta del flujo principal
+        dual = obtener_fuente_dual() if CAMERA_DUAL_STREAM else None
+        capturador = dual.bajo if dual else obtener_capturador(RTSP_URL_HIGH)
         
-        if not cap.isOpened():
+        if capturador.ultimo() is None:
             with progress_lock:
                 capture_progress['active'] = False
                 capture_progress['status'] = 'error'
@@ -86,89 +92,85 @@ def capturar_rostro_luckfox(request):
                 'message': 'No se pudo conectar al stream RTSP'
             }, status=500)
         
-        embeddings_list = []
         best_frame = None
         frames_capturados = 0
         total_frames = 100  # 100 capturas para vector muy robusto
+        # Matriz preasignada: cada embedding float32 se copia a su fila
+        embeddings_array = np.empty((total_frames, DIMENSION_EMBEDDING), dtype=np.float32)
         intentos = 0
         max_intentos = 300  # Margen amplio
         
         print(f"🎥 Capturando {total_frames} vectores con InspireFace...")
         
-        # Limpieza de buffer (2 frames para sincronización)
-        print("⏱️ Sincronizando cámara...")
-        for _ in range(2):
-            cap.read()
-            
         print("📸 ¡Iniciando captura!")
         
-        while frames_capturados < total_frames and intentos < max_intentos:
-            ret, frame = cap.read()
-            intentos += 1
-            
-            if not ret:
-                continue
-            
-            # Redimensionar a Full HD 1080p para calidad óptima
-            frame = cv2.resize(frame, (1920, 1080), interpolation=cv2.INTER_LINEAR)
-            
-            try:
-                # Generar embedding con InspireFace
-                embedding = inspireface_service.get_face_embedding(frame)
+        def cuadros():
+            nonlocal intentos
+            # Cuadros nuevos del capturador (Full HD 1080p, o el subflujo en modo dual)
+            for cuadro in capturador.suscribir():
+                if intentos >= max_intentos:
+                    break
+                intentos += 1
+                yield cuadro.imagen
+        
+        # Los embeddings se generan en paralelo (un proceso InspireFace por núcleo)
+        # mientras se siguen leyendo cuadros; los resultados llegan en orden.
+        # Cuadros consecutivos: el rostro se sigue entre cuadros en vez de detectarlo en cada uno
+        calidad_inicial = inspireface_service.estadisticas_calidad()
+        resultados = ejecutor_embeddings.mapear(cuadros(), seguimiento=True, dual=dual, camara=capturador.url)
+        try:
+            for frame, embedding in resultados:
+                if embedding is None:
+                    continue
                 
-                if embedding:
-                    
-                    embeddings_list.append(embedding)
-                    frames_capturados += 1
-                    
-                    # Guardamos el último frame válido como foto de perfil
-                    best_frame = frame
-                    
-                    print(f"✅ Captura {frames_capturados}/{total_frames} OK")
-                    
-                    # Actualizar progreso
-                    with progress_lock:
-                        capture_progress['current'] = frames_capturados
+                embeddings_array[frames_capturados] = embedding
+                frames_capturados += 1
                 
-            except Exception as e:
-                # print(f"⚠️ No se detectó rostro: {e}")
-                pass
+                # Guardamos el último frame válido como foto de perfil
+                best_frame = frame
                 
- 
+                print(f"✅ Captura {frames_capturados}/{total_frames} OK")
+                
+                # Actualizar progreso
+                with progress_lock:
+                    capture_progress['current'] = frames_capturados
+                
+                if frames_capturados >= total_frames:
+                    break
+        finally:
+            resultados.close()
         
-        cap.release()
+        # Cuadros descartados por el filtro de calidad durante esta captura
+        calidad = inspireface_service.estadisticas_calidad(calidad_inicial)
+        print(f"📊 Filtro de calidad: {calidad}")
+        
+        embeddings_array = embeddings_array[:frames_capturados]
         
         # Verificar mínimo de capturas
-        if len(embeddings_list) < 5:
+        if frames_capturados < 5:
             with progress_lock:
                 capture_progress['active'] = False
                 capture_progress['status'] = 'error'
             return JsonResponse({
                 'success': False,
-                'message': f'No se pudo detectar el rostro claramente. Intente mejorar la iluminación.'
+                'message': f'No se pudo detectar el rostro claramente. Intente mejorar la iluminación.',
+                'rechazos_calidad': calidad['rechazos']
             }, status=400)
         
         with progress_lock:
             capture_progress['status'] = 'completed'
         
-        print(f"🎉 Captura completada: {len(embeddings_list)} vectores")
+        print(f"🎉 Captura completada: {frames_capturados} vectores")
         
         # ==========================================
         # FILTRADO DE OUTLIERS Y PROMEDIO ROBUSTO
         # ==========================================
         
-        embeddings_array = np.array(embeddings_list)
-        
         # 1. Calcular vector mediano inicial (más robusto que promedio)
         vector_mediano = np.median(embeddings_array, axis=0)
         
-        # 2. Calcular distancias de cada vector al mediano
-        distancias = []
-        for vec in embeddings_array:
-            # Distancia euclidiana
-            d = np.linalg.norm(vec - vector_mediano)
-            distancias.append(d)
-        distancias = np.array(distancias)
+        # 2. Calcular distancias (euclidianas) de cada vector al mediano
+        distancias = np.linalg.norm(embeddings_array - vector_mediano, axis=1)
         
         # 3. Calcular MAD (Median Absolute Deviation)
         mad = np.median(np.abs(distancias - np.median(distancias)))
@@ -186,11 +188,12 @@ def capturar_rostro_luckfox(request):
         print(f"🧹 Limpieza: {len(embeddings_array)} -> {len(vectores_limpios)} vectores (Eliminados: {len(embeddings_array) - len(vectores_limpios)})")
         
         # 5. Calcular promedio final de los vectores limpios
+        # (float32; firebase_service lo convierte a lista al guardar)
         if len(vectores_limpios) > 0:
-            vector_final = np.mean(vectores_limpios, axis=0).tolist()
+            vector_final = np.mean(vectores_limpios, axis=0)
         else:
             # Fallback si filtramos todo (raro)
-            vector_final = np.mean(embeddings_array, axis=0).tolist()
+            vector_final = np.mean(embeddings_array, axis=0)
         
         print(f"✅ Vector promedio calculado: {len(vector_final)} dimensiones")
         
@@ -204,6 +207,7 @@ def capturar_rostro_luckfox(request):
         if guardar and all(k in data for k in ['nombre', 'rut', 'carrera']):
             try:
                 import os
+                import cv2
                 from django.conf import settings
                 
                 rut = data['rut'].replace('-', '_')
@@ -303,89 +307,36 @@ import threading
 camera_lock = threading.Lock()
 
 def luckfox_stream(request):
-    """Stream RTSP con detección de rostros y latencia mínima."""
+    """Stream RTSP (MJPEG) desde el capturador compartido de la cámara."""
     def stream_generator():
-        cap = None
-        retry_count = 0
-        max_retries = 3
-        
-        # Cargar clasificador de rostros
-        face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
-        
-        while retry_count < max_retries:
-            try:
-                if cap is not None:
-                    cap.release()
-                
-                print(f"🔌 Conectando a RTSP (intento {retry_count + 1}/{max_retries})...")
-                
-                # ALTA CALIDAD del stream, redimensionar a HD
-                rtsp_url = RTSP_URL_HIGH  # 2592x1944 (máxima calidad)
-                
-                # Configuración optimizada
-                cap = cv2.VideoCapture(rtsp_url, cv2.CAP_FFMPEG)
-                
-                # OPTIMIZACIONES DE LATENCIA (sin perder calidad de imagen):
-                cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)  # Buffer mínimo (reduce retraso)
-                cap.set(cv2.CAP_PROP_FPS, 30)        # 30 FPS para fluidez
-                
-                if not cap.isOpened():
-                    print(f"❌ No se pudo abrir RTSP")
-                    retry_count += 1
-                    continue
-                
-                print(f"✅ Conectado: {rtsp_url} → redimensionando a 1920x1080 FHD")
+        import cv2
 
-                retry_count = 0
-                
-                frame_count = 0
-                error_count = 0
+        # El capturador mantiene la conexión y se reconecta solo; varios
+        # navegadores comparten la misma decodificación. El stream termina si
+        # no llegan cuadros en RTSP_CONNECTION_TIMEOUT segundos.
+        capturador = obtener_capturador(RTSP_URL_HIGH)
+        print(f"✅ Stream desde capturador compartido: {RTSP_URL_HIGH} (1920x1080 FHD)")
+        
+        try:
+            for cuadro in capturador.suscribir():
+                # El stream es "limpio": la detección se hace en el endpoint de reconocimiento
                 
-                while True:
-                    ret, frame = cap.read()
-                    
-                    if not ret:
-                        error_count += 1
-                        if error_count > 5:
-                            print("🔄 Reconectando...")
-                            break
-                        continue
-                    
-                    error_count = 0
-                    frame_count += 1
-                    
-                    # REDIMENSIONAR a Full HD 1080p (1920x1080)
-                    # Usamos INTER_LINEAR que es más rápido para streaming en tiempo real
-                    frame = cv2.resize(frame, (1920, 1080), interpolation=cv2.INTER_LINEAR)
-                    
-                    # YA NO DETECTAMOS ROSTROS AQUÍ PARA MAYOR FLUIDEZ
-                    # El stream es "limpio" y la detección se hace en el endpoint de reconocimiento
-                    
-                    # Codificar con MÁXIMA calidad
-                    ret, buffer = cv2.imencode('.jpg', frame, [
-                        cv2.IMWRITE_JPEG_QUALITY, 95,  # ← Calidad 95 (excelente)
-                        cv2.IMWRITE_JPEG_OPTIMIZE, 0   # Sin optimización (rápido)
-                    ])
+                # Codificar con MÁXIMA calidad
+                ret, buffer = cv2.imencode('.jpg', cuadro.imagen, [
+                    cv2.IMWRITE_JPEG_QUALITY, 95,  # ← Calidad 95 (excelente)
+                    cv2.IMWRITE_JPEG_OPTIMIZE, 0   # Sin optimización (rápido)
+                ])
 
-                    if not ret:
-                        continue
-                    
-                    # if frame_count % 100 == 0:
-                    #    print(f"📊 Frames: {frame_count}")
-                    
-                    frame_bytes = buffer.tobytes()
-                    yield (b'--frame\r\n'
-                           b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
-                    
-            except Exception as e:
-                print(f"❌ Error RTSP: {e}")
-                retry_count += 1
-                if retry_count < max_retries:
-                    time.sleep(2)
-            finally:
-                if cap is not None and retry_count >= max_retries:
-                    cap.release()
-                    print("🔌 RTSP cerrado")
+                if not ret:
+                    continue
+                
+                frame_bytes = buffer.tobytes()
+                yield (b'--frame\r\n'
+                       b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
+        except Exception as e:
+            print(f"❌ Error RTSP: {e}")
+        finally:
+            print("🔌 Stream cerrado")
 
     return StreamingHttpResponse(stream_generator(),
                                  content_type='multipart/x-mixed-replace; boundary=frame')
@@ -404,28 +355,19 @@ def capturar_foto_perfil(request):
     try:
         print("📸 Capturando foto de perfil...")
         
-        # Conectar al RTSP
-        cap = cv2.VideoCapture(RTSP_URL_HIGH, cv2.CAP_FFMPEG)
-        cap.set(cv2.CAP_PROP_BUFFERSIZE, 300)
+        # Cuadro reciente del capturador compartido: la cámara ya está
+        # conectada y estabilizada, no se descartan cuadros
+        cuadro = obtener_capturador(RTSP_URL_HIGH).ultimo()
         
-        if not cap.isOpened():
+        if cuadro is None:
             return JsonResponse({
                 'success': False,
                 'error': 'No se pudo conectar al stream RTSP'
             }, status=500)
         
-        # Buffer cleanup - limpiar más frames para asegurar imagen estable
-        print("🔄 Limpiando buffer (30 frames)...") 
-        
-        # Descartar 30 frames para asegurar que la cámara se haya estabilizado
-        for i in range(30):
-            cap.read()
+        frame = cuadro.imagen
         
-        # Ahora capturar el frame real
-        ret, frame = cap.read()
-        cap.release()
-        
-        if not ret or frame is None:
+        if frame is None:
             return JsonResponse({
                 'success': False,
                 'error': 'No se pudo capturar frame válido'
@@ -447,10 +389,10 @@ def capturar_foto_perfil(request):
                 'error': f'Frame capturado está muy claro (brillo: {frame_mean:.1f}), intenta de nuevo'
             }, status=500)
         
-        # Redimensionar a Full HD 1080p
-        frame = cv2.resize(frame, (1920, 1080), interpolation=cv2.INTER_LINEAR)
-        
+        # El capturador entrega Full HD 1080p
         # Codificar a JPEG con calidad 95 para Firebase
+        import cv2
+
         ret, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 95])
 
         
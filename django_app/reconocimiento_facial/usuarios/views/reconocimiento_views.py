@@ -3,10 +3,23 @@
 Archivo: reconocimiento_views.py
 Descripcion: Controlador principal de reconocimiento facial en tiempo real.
              Captura frames del stream RTSP, detecta rostros con InspireFace,
-             busca coincidencias en Firebase, envia credenciales a Luckfox,
+             busca coincidencias en la galeria biometrica en memoria,
+             envia credenciales a Luckfox,
              y registra asistencias confirmadas por el usuario.
+             Incluye un modo grupal que registra todos los rostros
+             reconocidos y confirmados en Luckfox de un cuadro con una
+             escritura por lotes (las confirmaciones tienen un plazo total,
+             LUCKFOX_GRUPO_TIMEOUT), y un modo de verificacion 1:1 contra
+             la plantilla cacheada del RUT.
+             El modo individual sigue el rostro entre cuadros, extrae
+             embeddings en paralelo en el pool de procesos de extraccion y
+             compara la media de la pista contra la galeria.
+             Los cuadros se toman del capturador RTSP compartido de la
+             camara (sin reconexion ni cuadros descartados por peticion).
+             Con CAMERA_DUAL_STREAM el modo individual sigue el rostro en el
+             subflujo y recorta del flujo principal solo para extraer.
 Fecha de creacion: 25 de Octubre 2025
-Fecha de modificacion: 20 de Diciembre 2025
+Fecha de modificacion: 17 de Octubre 2026
 Autores:
     Roberto Leal
     William Tapia
@@ -18,16 +31,23 @@ from django.http import JsonResponse
 from django.contrib import messages
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
-import cv2
 import numpy as np
 from ..services.firebase_service import firebase_service
-from ..services.matching_service import encontrar_match
+from ..services.matching_service import encontrar_match, encontrar_matches_batch, verificar_usuario
 from ..services.inspireface_service import inspireface_service
+from ..services.extraccion_service import ejecutor_embeddings
+from ..services.seguimiento_service import seguir_y_extraer
+from ..services.camara_service import obtener_capturador, obtener_fuente_dual
+from ..config import (
+    CAMERA_DUAL_STREAM,
+    LUCKFOX_GRUPO_TIMEOUT,
+    LUCKFOX_GRUPO_TIMEOUT_USUARIO,
+    RTSP_URL_HIGH,
+)
 from ..decorators import encargado_or_admin
 
-# Configuración RTSP
-RTSP_URL_HIGH = "rtsp://172.32.0.93/live/0"
-RTSP_URL_LOW = "rtsp://172.32.0.93/live/1"
+# Umbral de similitud para aceptar un match en el reconocimiento en vivo
+UMBRAL_RECONOCIMIENTO = 0.45
 
 
 def entrenar_modelo(request):
@@ -63,6 +83,210 @@ def reconocer_usuario(request, evento_id):
     return render(request, 'reconocimiento_facial.html', context)
 
 
+def _capturar_grupo(evento_id):
+    """
+    Modo grupal: reconoce todos los rostros del cuadro, pide a cada usuario
+    reconocido la misma confirmación en Luckfox que el modo individual y
+    registra a los confirmados en una sola escritura por lotes.
+
+    Las confirmaciones comparten un plazo de LUCKFOX_GRUPO_TIMEOUT segundos
+    (hasta LUCKFOX_GRUPO_TIMEOUT_USUARIO cada una), así un grupo no retiene
+    la petición por el timeout completo de cada integrante: quienes no
+    alcanzan a confirmar quedan 'pendiente' y pueden marcar de nuevo.
+
+    Recorre frames hasta el timeout o hasta un frame en que todos los rostros
+    detectados tengan match. Los rostros de un mismo frame se comparan contra
+    la galería en un solo lote y nunca se asignan al mismo RUT.
+    """
+    import time
+    TIMEOUT_SEGUNDOS = 2.0
+
+    capturador = obtener_capturador(RTSP_URL_HIGH)
+    if capturador.ultimo() is None:
+        return JsonResponse({'success': False, 'error': 'No se pudo conectar al stream RTSP'}, status=500)
+
+    reconocidos = {}  # rut -> MatchResult con mayor similitud
+    max_rostros = 0
+
+    tiempo_inicio = time.time()
+    for cuadro in capturador.suscribir(timeout=TIMEOUT_SEGUNDOS):
+        if (time.time() - tiempo_inicio) >= TIMEOUT_SEGUNDOS:
+            break
+
+        # El capturador entrega cuadros Full HD 1080p
+        rostros = inspireface_service.get_multiple_embeddings(cuadro.imagen)
+        if not rostros:
+            continue
+
+        resultados = encontrar_matches_batch(
+            [embedding for embedding, _ in rostros],
+            umbral_similitud=UMBRAL_RECONOCIMIENTO
+        )
+        for resultado in resultados:
+            if not resultado.match:
+                continue
+            rut = resultado.usuario['rut']
+            if rut not in reconocidos or resultado.similitud > reconocidos[rut].similitud:
+                reconocidos[rut] = resultado
+
+        max_rostros = max(max_rostros, len(rostros))
+        sin_match = sum(1 for r in resultados if not r.match)
+        print(f"  👥 {len(rostros)} rostros, {len(rostros) - sin_match} con match")
+
+        if sin_match == 0:
+            break
+
+    if max_rostros == 0:
+        return JsonResponse({'success': False, 'no_face': True, 'message': 'No se pudo detectar rostro en los intentos realizados'})
+
+    # Confirmación en Luckfox de cada usuario reconocido, uno a la vez y
+    # dentro del plazo del grupo
+    usuarios = {}
+    no_registrados = []
+    limite = time.time() + LUCKFOX_GRUPO_TIMEOUT
+    for rut, resultado in reconocidos.items():
+        restante = limite - time.time()
+        if restante <= 0:
+            no_registrados.append({
+                'usuario': resultado.usuario,
+                'similitud': float(resultado.similitud),
+                'asistencia': 'pendiente'
+            })
+            continue
+        usuario, confirmado = _confirmar_en_luckfox(
+            resultado.usuario, timeout=min(LUCKFOX_GRUPO_TIMEOUT_USUARIO, restante)
+        )
+        if confirmado:
+            usuarios[rut] = usuario
+        else:
+            no_registrados.append({
+                'usuario': usuario,
+                'similitud': float(resultado.similitud),
+                'asistencia': 'rechazada'
+            })
+
+    registros = [
+        {'rut_usuario': rut, 'similitud': float(reconocidos[rut].similitud)}
+        for rut in usuarios
+    ]
+    estados = firebase_service.registrar_asistencias_lote(evento_id, registros, metodo='biometrico')
+
+    resultados_json = [
+        {
+            'usuario': usuarios[estado['rut_usuario']],
+            'similitud': float(reconocidos[estado['rut_usuario']].similitud),
+            'asistencia': estado['status']
+        }
+        for estado in estados
+    ] + no_registrados
+    pendientes = sum(1 for r in no_registrados if r['asistencia'] == 'pendiente')
+    print(
+        f"✅ MODO GRUPAL: {len(estados)} asistencias procesadas, "
+        f"{len(no_registrados) - pendientes} rechazadas en Luckfox, {pendientes} pendientes"
+    )
+
+    return JsonResponse({
+        'success': True,
+        'modo_grupal': True,
+        'match': bool(estados),
+        'resultados': resultados_json,
+        'rostros_detectados': max_rostros,
+        # Rostros del cuadro más poblado que ningún match de la ventana cubrió
+        'rostros_sin_match': max(0, max_rostros - len(reconocidos))
+    })
+
+
+def _confirmar_en_luckfox(usuario, timeout=30):
+    """
+    Muestra la credencial del usuario en la pantalla Luckfox y espera su
+    confirmación hasta `timeout` segundos. La galería no guarda la foto de
+    perfil: se lee solo el documento del usuario a confirmar.
+
+    Returns:
+        Tupla (usuario completo, confirmado)
+    """
+    from ..services.luckfox_client import generate_credential_image, send_image_to_luckfox
+
+    usuario = firebase_service.obtener_usuario_por_rut(usuario['rut']) or usuario
+    print(f"🖥️ Solicitando confirmación en Luckfox para: {usuario['nombre']}")
+
+    # Generar imagen de credencial
+    credencial_img = generate_credential_image(
+        nombre=usuario['nombre'],
+        rut=usuario['rut'],
+        carrera=usuario.get('carrera', 'N/A'),
+        jornada=usuario.get('jornada', 'D'),
+        foto_base64=usuario.get('imagen')
+    )
+
+    # Enviar y esperar confirmación
+    confirmado = send_image_to_luckfox(credencial_img, timeout=timeout)
+    if confirmado:
+        print(f"✅ Usuario confirmó en pantalla Luckfox")
+    else:
+        print(f"❌ Usuario rechazó confirmación en pantalla Luckfox")
+    return usuario, confirmado
+
+
+def _verificar_rut(rut):
+    """
+    Modo verificación 1:1: compara cada rostro capturado solo contra la
+    plantilla del RUT esperado (cache por RUT, un producto punto), sin
+    búsqueda 1:N ni lectura de Firestore por frame. Las respuestas tienen
+    los mismos campos que el modo AUTO (match, sin match, sin rostro).
+    """
+    import time
+    TIMEOUT_SEGUNDOS = 2.0
+
+    capturador = obtener_capturador(RTSP_URL_HIGH)
+    if capturador.ultimo() is None:
+        return JsonResponse({'success': False, 'error': 'No se pudo conectar al stream RTSP'}, status=500)
+
+    mejor = None
+    tiempo_inicio = time.time()
+    for cuadro in capturador.suscribir(timeout=TIMEOUT_SEGUNDOS):
+        if (time.time() - tiempo_inicio) >= TIMEOUT_SEGUNDOS:
+            break
+
+        # El capturador entrega cuadros Full HD 1080p
+        vector_actual = inspireface_service.get_face_embedding(cuadro.imagen, filtrar_calidad=True)
+        if vector_actual is None:
+            continue
+
+        verificacion = verificar_usuario(vector_actual, rut, umbral=UMBRAL_RECONOCIMIENTO)
+        if verificacion.get('error'):
+            print(f"❌ VERIFICACIÓN 1:1 para {rut}: {verificacion['error']}")
+            return JsonResponse({'success': False, 'match': False, 'message': 'No coincide con el usuario esperado'})
+
+        if mejor is None or verificacion['similitud'] > mejor['similitud']:
+            mejor = verificacion
+        if verificacion['verificado']:
+            break
+
+    if mejor is None:
+        return JsonResponse({'success': False, 'no_face': True, 'message': 'No se pudo detectar rostro en los intentos realizados'})
+
+    if mejor['verificado']:
+        print(f"✅ VERIFICACIÓN 1:1: {mejor['nombre']} ({mejor['similitud']:.2f})")
+        # La cache no guarda la foto de perfil: leer solo el documento verificado
+        usuario = firebase_service.obtener_usuario_por_rut(rut) or mejor['usuario']
+        return JsonResponse({
+            'success': True, 'match': True,
+            'usuario': usuario,
+            'similitud': float(mejor['similitud'])
+        })
+
+    print(f"❌ VERIFICACIÓN 1:1 fallida para {rut} (mejor: {mejor['similitud']:.2f})")
+    return JsonResponse({
+        'success': True,
+        'match': False,
+        'similitud_maxima': float(mejor['similitud']),
+        'mejor_nombre': mejor['nombre'] or "Desconocido",
+        'umbral': UMBRAL_RECONOCIMIENTO,
+        'message': 'No se encontró un match suficientemente confiable'
+    })
+
+
 @csrf_exempt
 @require_http_methods(["POST"])
 @encargado_or_admin
@@ -70,14 +294,17 @@ def capturar_y_reconocer(request):
     """
     Captura frames del RTSP, detecta rostro y busca match con criterio de persistencia.
     Criterio: Intentar hasta 5 veces, si 2 veces coincide el mismo usuario, se confirma.
+    Con modo_grupal=true registra a todos los rostros reconocidos del cuadro
+    que confirmen en Luckfox y retorna una lista de resultados.
     """
     evento_id = request.POST.get('evento_id')
     solo_detectar = request.POST.get('solo_detectar', 'false').lower() == 'true'
     verificar_rut = request.POST.get('verificar_rut')
+    modo_grupal = request.POST.get('modo_grupal', 'false').lower() == 'true'
     
     print(f"\n{'='*60}")
     print(f"🎯 NUEVA CAPTURA - Evento: {evento_id}")
-    print(f"   Modo: {'SOLO_DETECTAR' if solo_detectar else 'VERIFICACIÓN' if verificar_rut else 'AUTO'}")
+    print(f"   Modo: {'SOLO_DETECTAR' if solo_detectar else 'VERIFICACIÓN' if verificar_rut else 'GRUPAL' if modo_grupal else 'AUTO'}")
     print(f"{'='*60}")
     
     if not evento_id:
@@ -88,8 +315,14 @@ def capturar_y_reconocer(request):
         return JsonResponse({'error': 'Evento no encontrado'}, status=404)
     
     try:
-        # 1. Pre-cargar usuarios para eficiencia (evitar consultas repetidas en el loop)
-        usuarios_db = firebase_service.listar_usuarios()
+        if verificar_rut:
+            return _verificar_rut(verificar_rut)
+        
+        if modo_grupal:
+            return _capturar_grupo(evento_id)
+        
+        # 1. La galería biométrica ya está en memoria (galeria_service) y se
+        #    sincroniza por deltas, no se descargan los usuarios en cada captura
         
         # 2. Configuración del ciclo de reconocimiento con timeout
         import time
@@ -100,55 +333,57 @@ def capturar_y_reconocer(request):
         
         print(f"🔄 Iniciando búsqueda continua (timeout: {TIMEOUT_SEGUNDOS}s)")
         
-        cap = cv2.VideoCapture(RTSP_URL_HIGH, cv2.CAP_FFMPEG)
-        cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        # Capturador compartido de la cámara: la búsqueda arranca sobre un
+        # cuadro reciente, sin reconexión RTSP ni cuadros de sincronización.
+        # En modo dual se sigue el rostro en el subflujo (barato de decodificar)
+        # y el flujo principal solo se convierte cuando hay que extraer
+        dual = obtener_fuente_dual() if CAMERA_DUAL_STREAM else None
+        capturador = dual.bajo if dual else obtener_capturador(RTSP_URL_HIGH)
         
-        if not cap.isOpened():
+        if capturador.ultimo() is None:
             return JsonResponse({'success': False, 'error': 'No se pudo conectar al stream RTSP'}, status=500)
         
+        resultados = None
+        calidad_inicial = inspireface_service.estadisticas_calidad()
         try:
-            # Sincronizar buffer (mínimo)
-            cap.read()
-            
             tiempo_inicio = time.time()
             intento = 0
             
             # Loop continuo con timeout en lugar de intentos fijos
-            while (time.time() - tiempo_inicio) < TIMEOUT_SEGUNDOS:
-                # Intentar capturar y procesar un frame
-                ret, frame_temp = cap.read()
-                if not ret: 
-                    continue
-                
-                # Redimensionar a Full HD 1080p para consistencia y velocidad
-                frame_temp = cv2.resize(frame_temp, (1920, 1080), interpolation=cv2.INTER_LINEAR)
-                
+            def cuadros():
+                # Cuadros nuevos del capturador (Full HD 1080p, o el subflujo en modo dual)
+                for cuadro in capturador.suscribir(timeout=TIMEOUT_SEGUNDOS):
+                    if (time.time() - tiempo_inicio) >= TIMEOUT_SEGUNDOS:
+                        break
+                    yield cuadro.imagen
+            
+            # El rostro se sigue entre cuadros (detección completa solo periódica) y
+            # su embedding se extrae cada pocos cuadros en el pool de procesos: mientras
+            # se busca el match, los cuadros siguientes ya se están procesando.
+            # Usamos BGR directo para coincidir con el formato de registro (luckfox_views.py)
+            resultados = seguir_y_extraer(cuadros(), ejecutor_embeddings, dual=dual, camara=capturador.url)
+            for frame_temp, pista, muestra in resultados:
                 # DEBUG: Confirmar resolución
                 if intento == 0:
                     print(f"📏 Resolución de análisis: {frame_temp.shape[1]}x{frame_temp.shape[0]}")
                 
-                frame = None
-                
-                # InspireFace detection + embedding
-                # Usamos BGR directo para coincidir con el formato de registro (luckfox_views.py)
-                vector_actual = inspireface_service.get_face_embedding(frame_temp)
-                
-                if vector_actual:
-                    frame = frame_temp
-            
-                if frame is None:
+                if pista is None:
                     print(f"  ⚠️ Intento {intento+1}: No se detectó rostro (InspireFace)")
                     intento += 1
                     continue
                 
-                # Buscar match
+                # Mismo rostro sin muestra nueva: la media de la pista no cambió
+                if muestra is None:
+                    continue
+                
+                # Buscar match con la media de la pista
                 # Usamos umbral 0.45 para ser más permisivo
-                resultado = encontrar_match(vector_actual, umbral_similitud=0.45, usuarios_cache=usuarios_db)
+                resultado = encontrar_match(pista.media(), umbral_similitud=UMBRAL_RECONOCIMIENTO)
                 
                 if resultado.match:
                     rut = resultado.usuario['rut']
                     
-                    print(f"  ✅ Intento {intento+1}: Match con {resultado.usuario['nombre']} (Similitud: {resultado.similitud:.2f})")
+                    print(f"  ✅ Intento {intento+1}: Match con {resultado.usuario['nombre']} (Similitud: {resultado.similitud:.2f}, pista {pista.id}: {pista.muestras} muestras)")
                     
                     # Actualizar mejor resultado global
                     if mejor_resultado_global is None or resultado.similitud > mejor_resultado_global.similitud:
@@ -166,7 +401,9 @@ def capturar_y_reconocer(request):
                 intento += 1
                         
         finally:
-            cap.release()
+            if resultados is not None:
+                resultados.close()
+            print(f"📊 Filtro de calidad: {inspireface_service.estadisticas_calidad(calidad_inicial)}")
             
         # 3. Procesar resultado final
         resultado_final = match_confirmado if match_confirmado else mejor_resultado_global
@@ -182,16 +419,6 @@ def capturar_y_reconocer(request):
         if match_confirmado:
             print(f"✅ MATCH FINAL CONFIRMADO: {mejor_match['nombre']}")
             
-            if verificar_rut:
-                if mejor_match['rut'] == verificar_rut:
-                    return JsonResponse({
-                        'success': True, 'match': True,
-                        'usuario': mejor_match,
-                        'similitud': float(mejor_similitud)
-                    })
-                else:
-                    return JsonResponse({'success': False, 'match': False, 'message': 'No coincide con el usuario esperado'})
-            
             # if solo_detectar:
             #     return JsonResponse({
             #         'success': True, 'match': True,
@@ -201,32 +428,15 @@ def capturar_y_reconocer(request):
             #     })
             
             # CONFIRMACIÓN EN LUCKFOX
-            from ..services.luckfox_client import generate_credential_image, send_image_to_luckfox
-            
-            print(f"🖥️ Solicitando confirmación en Luckfox para: {mejor_match['nombre']}")
-            
-            # Generar imagen de credencial
-            credencial_img = generate_credential_image(
-                nombre=mejor_match['nombre'],
-                rut=mejor_match['rut'],
-                carrera=mejor_match.get('carrera', 'N/A'),
-                jornada=mejor_match.get('jornada', 'D'),
-                foto_base64=mejor_match.get('imagen')
-            )
-            
-            # Enviar y esperar confirmación
-            confirmado = send_image_to_luckfox(credencial_img)
+            mejor_match, confirmado = _confirmar_en_luckfox(mejor_match)
             
             if not confirmado:
-                print(f"❌ Usuario rechazó confirmación en pantalla Luckfox")
                 return JsonResponse({
                     'success': False, 
                     'match': True, 
                     'usuario': mejor_match,
                     'message': 'Usuario rechazó la confirmación en el dispositivo'
                 })
-            
-            print(f"✅ Usuario confirmó en pantalla Luckfox")
 
             # Registrar asistencia
             try: